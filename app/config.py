@@ -4,13 +4,68 @@ from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     anthropic_api_key: str = ""
+    anthropic_base_url: str = ""
     claude_model: str = "claude-opus-4-20250514"
+    # Comma-separated models tried in order when the primary model fails.
+    claude_fallback_models: str = ""
+    # Prompt-cache breakpoints are only sent once the prefix they close reaches
+    # the model's minimum cacheable length (2048 for Haiku models).
+    claude_cache_min_tokens: int = 1024
+    llm_hedge_percentile: float = 95
+    llm_hedge_min_samples: int = 20
+    llm_hedge_delay: float = 30
     database_url: str = "sqlite+aiosqlite:///./data/gatsby.db"
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_cache_mb: int = 64
+    sqlite_mmap_mb: int = 256
+    read_model_ttl: float = 300
+    db_pool_size: int = 10
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = 1800
+    embedded_postgres_dir: str = ""
     gutenberg_url: str = "https://www.gutenberg.org/ebooks/64317.txt.utf-8"
+    gutenberg_url_template: str = "https://www.gutenberg.org/ebooks/{id}.txt.utf-8"
+    gutenberg_cache_dir: str = "./data/gutenberg"
+    gutenberg_cache_ttl_hours: float = 720
+    ingest_concurrency: int = 4
+    import_dir: str = "./data/import"
     base_dir: Path = Path(__file__).resolve().parent.parent
     rate_limit_default: str = "30/minute"
     rate_limit_extraction: str = "5/minute"
     rate_limit_pdf: str = "10/minute"
+    extraction_concurrency: int = 3
+    extraction_window_words: int = 3000
+    extraction_window_overlap: int = 200
+    extraction_streaming: bool = True
+    # "claude", "record" (call Claude and append every exchange to the
+    # cassette) or "replay" (answer from the cassette only, offline).
+    llm_provider: str = "claude"
+    llm_cassette_path: str = "./data/llm_cassette.jsonl"
+    llm_replay_latency: str = "recorded"
+    llm_replay_latency_median: float = 2.0
+    llm_replay_latency_sigma: float = 0.6
+    llm_replay_speedup: float = 1.0
+    llm_replay_seed: int = 0
+    llm_cache_enabled: bool = True
+    llm_cache_path: str = "./data/llm_cache.db"
+    llm_cache_max_mb: int = 256
+    llm_cache_max_age_days: float = 30
+    llm_requests_per_minute: int = 0
+    llm_input_tokens_per_minute: int = 0
+    llm_output_tokens_per_minute: int = 0
+    llm_max_retries: int = 6
+    llm_max_backoff: float = 60
+    batch_poll_interval: float = 60
+    organize_clusters: int = 40
+    organize_examples: int = 3
+    job_workers: int = 2
+    job_poll_interval: float = 5
+    job_heartbeat_interval: float = 15
+    job_stale_after: float = 60
+    job_event_retention: float = 86400
 
     model_config = {"env_file": ".env", "env_file_encoding": "utf-8"}
 
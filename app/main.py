@@ -1,3 +1,4 @@
+import asyncio
 from contextlib import asynccontextmanager
 from pathlib import Path
 
@@ -12,7 +13,9 @@ from starlette.middleware.cors import CORSMiddleware
 
 from app.config import settings
 from app.models.database import create_tables
-from app.routers import ingest, metaphors, topics, paper, translations
+from app.routers import ingest, metaphors, topics, paper, translations, llm, batches, jobs
+from app.services.batches import run_poller
+from app.services.jobs import run_workers
 
 BASE_DIR = Path(__file__).resolve().parent
 
@@ -20,7 +23,15 @@ BASE_DIR = Path(__file__).resolve().parent
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await create_tables()
+    poller = asyncio.create_task(run_poller()) if settings.batch_poll_interval > 0 else None
+    workers = asyncio.create_task(run_workers())
     yield
+    # Wait for the tasks to unwind so no job is still using the database when
+    # the process exits.
+    tasks = [t for t in (workers, poller) if t]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
 
 
 limiter = Limiter(key_func=get_remote_address, default_limits=[settings.rate_limit_default])
@@ -46,6 +57,9 @@ app.include_router(metaphors.router)
 app.include_router(topics.router)
 app.include_router(paper.router)
 app.include_router(translations.router)
+app.include_router(llm.router)
+app.include_router(batches.router)
+app.include_router(jobs.router)
 
 
 @app.get("/", response_class=HTMLResponse)
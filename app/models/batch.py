@@ -0,0 +1,20 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import JSON, Column, DateTime, Integer, String, Text
+
+from app.models.database import Base
+
+
+class LLMBatch(Base):
+    __tablename__ = "llm_batches"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    batch_id = Column(String(100), nullable=False)
+    kind = Column(String(50), nullable=False)
+    status = Column(String(50), default="submitted")
+    # custom_id -> what the result is written back to (chapter id, section id, ...)
+    targets = Column(JSON, default=dict)
+    params = Column(JSON, default=dict)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    completed_at = Column(DateTime(timezone=True), nullable=True)
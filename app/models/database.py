@@ -1,9 +1,71 @@
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy import event, inspect, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
 
 from app.config import settings
 
-engine = create_async_engine(settings.database_url, echo=False)
+
+def sqlite_pragmas() -> dict[str, str | int]:
+    return {
+        "journal_mode": settings.sqlite_journal_mode,
+        "synchronous": settings.sqlite_synchronous,
+        "busy_timeout": settings.sqlite_busy_timeout_ms,
+        # Negative cache_size is in KiB rather than pages.
+        "cache_size": -settings.sqlite_cache_mb * 1024,
+        "mmap_size": settings.sqlite_mmap_mb * 1024 * 1024,
+        "temp_store": "MEMORY",
+    }
+
+
+def configure_sqlite(engine: AsyncEngine, pragmas: dict[str, str | int]):
+    # Applied to every new pool connection. WAL lets readers run alongside the
+    # job workers' writes, and busy_timeout makes a writer wait for the lock
+    # instead of failing with "database is locked".
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_pragmas(dbapi_connection, _record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def database_url() -> str:
+    if not settings.embedded_postgres_dir:
+        return settings.database_url
+    # Local stand-in for a Postgres server: pgserver ships the binaries and
+    # runs one server per data directory, shared by every worker process.
+    try:
+        import pgserver
+    except ImportError as e:
+        raise RuntimeError("EMBEDDED_POSTGRES_DIR needs the 'embedded-postgres' extra") from e
+    server = pgserver.get_server(settings.embedded_postgres_dir)
+    return server.get_uri().replace("postgresql://", "postgresql+asyncpg://", 1)
+
+
+def _engine_options(url: str) -> dict:
+    if url.startswith("sqlite"):
+        return {}
+    # Each uvicorn worker has its own pool, so the server sees up to
+    # workers * (pool_size + max_overflow) connections.
+    options = {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": True,
+    }
+    if url.startswith("postgresql+asyncpg"):
+        # JIT compilation costs more than it saves on short OLTP queries.
+        options["connect_args"] = {"server_settings": {"application_name": "metaphorizer", "jit": "off"}}
+    return options
+
+
+_url = database_url()
+engine = create_async_engine(_url, echo=False, **_engine_options(_url))
+configure_sqlite(engine, sqlite_pragmas())
 async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 
@@ -16,6 +78,33 @@ async def get_db():
         yield session
 
 
+def _add_missing_columns(conn):
+    # create_all never alters existing tables; add nullable columns introduced
+    # since the database was created so older databases keep working.
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing and column.nullable:
+                ddl = column.type.compile(conn.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {ddl}"))
+
+
+# Arbitrary key for the advisory lock that serializes schema setup.
+SCHEMA_LOCK_KEY = 0x6D657461
+
+
 async def create_tables():
+    from app.models.migrations import run_migrations
+
     async with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            # Every uvicorn worker runs this at startup. The first one creates
+            # and migrates the schema; the others wait here, then find it done.
+            # Released when the transaction ends.
+            await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
+        await conn.run_sync(run_migrations)
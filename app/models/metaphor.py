@@ -1,22 +1,70 @@
-from sqlalchemy import Boolean, Column, Float, ForeignKey, Integer, String, Text
-from sqlalchemy.orm import relationship
+import zlib
+from datetime import datetime, timezone
+
+from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, LargeBinary, String, Text
+from sqlalchemy.orm import deferred, relationship
 
 from app.models.database import Base
 
 
+class Book(Base):
+    __tablename__ = "books"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    gutenberg_id = Column(Integer, unique=True, nullable=True)
+    # Local imports: path under IMPORT_DIR, or "archive.zip!member"
+    source_key = Column(String(500), unique=True, nullable=True)
+    title = Column(String(500), default="")
+    author = Column(String(200), default="")
+    source_url = Column(String(500), default="")
+    # sha256 of a downloaded source, or size/mtime (CRC for zip members) of a
+    # local one; re-ingesting an unchanged source is a no-op
+    source_hash = Column(String(64), nullable=True)
+    ingested_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+    chapters = relationship("Chapter", back_populates="book")
+
+
 class Chapter(Base):
     __tablename__ = "chapters"
 
     id = Column(Integer, primary_key=True)
-    number = Column(String(10), nullable=False)
+    book_id = Column(Integer, ForeignKey("books.id"), nullable=True, index=True)
+    # Roman, digit or spelled-out label, prefixed with the part for books in
+    # parts ("2.Twenty-One").
+    number = Column(String(40), nullable=False)
     title = Column(String(200), default="")
-    text = Column(Text, nullable=False)
     word_count = Column(Integer, default=0)
     processed = Column(Boolean, default=False)
-
+    # sha256 of the sanitized text and of the extraction prompt/model/settings
+    # at the time the chapter was last extracted
+    content_hash = Column(String(64), nullable=True)
+    extraction_version = Column(String(64), nullable=True)
+    # Compressed normalized text + offset map, see services/quote_index.py
+    quote_index = deferred(Column(LargeBinary, nullable=True))
+
+    book = relationship("Book", back_populates="chapters")
     metaphors = relationship("Metaphor", back_populates="chapter")
 
 
+class ChapterText(Base):
+    # Chapter bodies live apart from the chapter rows so that listing or
+    # counting chapters never reads them; see services/chapter_text.py.
+    __tablename__ = "chapter_texts"
+
+    chapter_id = Column(Integer, ForeignKey("chapters.id"), primary_key=True)
+    # zlib-compressed UTF-8
+    data = Column(LargeBinary, nullable=False)
+
+    @staticmethod
+    def pack(text: str) -> bytes:
+        return zlib.compress(text.encode("utf-8"), 6)
+
+    @staticmethod
+    def unpack(data: bytes) -> str:
+        return zlib.decompress(data).decode("utf-8")
+
+
 class Topic(Base):
     __tablename__ = "topics"
 
@@ -33,7 +81,7 @@ class Subtopic(Base):
     __tablename__ = "subtopics"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    topic_id = Column(Integer, ForeignKey("topics.id"), nullable=False)
+    topic_id = Column(Integer, ForeignKey("topics.id"), nullable=False, index=True)
     name = Column(String(200), nullable=False)
     description = Column(Text, default="")
     sort_order = Column(Integer, default=0)
@@ -44,6 +92,12 @@ class Subtopic(Base):
 
 class Metaphor(Base):
     __tablename__ = "metaphors"
+    __table_args__ = (
+        # Chapter listings are ordered by position within the chapter.
+        Index("ix_metaphors_chapter_position", "chapter_id", "quote_start", "id"),
+        Index("ix_metaphors_topic_selected", "topic_id", "selected"),
+        Index("ix_metaphors_selected_confidence", "selected", "confidence"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     chapter_id = Column(Integer, ForeignKey("chapters.id"), nullable=False)
@@ -52,10 +106,13 @@ class Metaphor(Base):
     meaning = Column(Text, nullable=False)
     suggested_topic = Column(String(200), default="")
     topic_id = Column(Integer, ForeignKey("topics.id"), nullable=True)
-    subtopic_id = Column(Integer, ForeignKey("subtopics.id"), nullable=True)
+    subtopic_id = Column(Integer, ForeignKey("subtopics.id"), nullable=True, index=True)
     selected = Column(Boolean, default=True)
     user_notes = Column(Text, nullable=True)
-    confidence = Column(Float, default=0.0)
+    confidence = Column(Float, default=0.0, index=True)
+    quote_start = Column(Integer, nullable=True)
+    quote_end = Column(Integer, nullable=True)
+    quote_verified = Column(Boolean, default=False)
 
     chapter = relationship("Chapter", back_populates="metaphors")
     topic = relationship("Topic", back_populates="metaphors")
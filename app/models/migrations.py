@@ -0,0 +1,140 @@
+import logging
+from datetime import datetime, timezone
+from typing import Callable
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Connection
+
+from app.models import batch, job, paper  # noqa: F401  (register every table on Base.metadata)
+from app.models.database import Base
+from app.models.metaphor import ChapterText
+
+logger = logging.getLogger(__name__)
+
+# Applied versions are recorded here. The table lives outside Base.metadata
+# so create_all never treats it as part of the application schema.
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String(200), nullable=False),
+    Column("applied_at", DateTime(timezone=True), nullable=False),
+)
+
+
+def _move_chapter_text(conn: Connection):
+    # Chapter bodies used to be an inline chapters.text column; copy them into
+    # chapter_texts (compressed) and drop the column.
+    inspector = inspect(conn)
+    if not inspector.has_table("chapters"):
+        return
+    if "text" not in {c["name"] for c in inspector.get_columns("chapters")}:
+        return
+    rows = conn.execute(text(
+        "SELECT id, text FROM chapters WHERE id NOT IN (SELECT chapter_id FROM chapter_texts)"
+    )).all()
+    if rows:
+        conn.execute(
+            ChapterText.__table__.insert(),
+            [{"chapter_id": chapter_id, "data": ChapterText.pack(body or "")} for chapter_id, body in rows],
+        )
+    conn.execute(text("ALTER TABLE chapters DROP COLUMN text"))
+
+
+def _create_indexes(*names: str) -> Callable[[Connection], None]:
+    # create_all only creates indexes together with their table, so indexes
+    # declared on existing tables are created here.
+    def migrate(conn: Connection):
+        indexes = {index.name: index for table in Base.metadata.sorted_tables for index in table.indexes}
+        for name in names:
+            indexes[name].create(conn, checkfirst=True)
+    return migrate
+
+
+FTS_COLUMNS = ("exact_quote", "explanation", "meaning", "user_notes")
+
+
+def _metaphor_fts(conn: Connection):
+    # External-content FTS5 index over metaphors, kept in step by triggers so
+    # ORM writes and bulk statements alike are indexed. SQLite only.
+    if conn.dialect.name != "sqlite":
+        return
+    if not conn.execute(text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")).scalar():
+        logger.warning("SQLite was built without FTS5; metaphor search is disabled")
+        return
+    cols = ", ".join(FTS_COLUMNS)
+    new = ", ".join(f"new.{c}" for c in FTS_COLUMNS)
+    old = ", ".join(f"old.{c}" for c in FTS_COLUMNS)
+    conn.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS metaphors_fts USING fts5({cols}, "
+        "content='metaphors', content_rowid='id', tokenize='porter unicode61')"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS metaphors_fts_insert AFTER INSERT ON metaphors BEGIN "
+        f"INSERT INTO metaphors_fts(rowid, {cols}) VALUES (new.id, {new}); END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS metaphors_fts_delete AFTER DELETE ON metaphors BEGIN "
+        f"INSERT INTO metaphors_fts(metaphors_fts, rowid, {cols}) VALUES ('delete', old.id, {old}); END"
+    ))
+    # Only edits to indexed columns touch the index; selection and topic
+    # changes are far more frequent.
+    conn.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS metaphors_fts_update AFTER UPDATE OF {cols} ON metaphors BEGIN "
+        f"INSERT INTO metaphors_fts(metaphors_fts, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO metaphors_fts(rowid, {cols}) VALUES (new.id, {new}); END"
+    ))
+    conn.execute(text("INSERT INTO metaphors_fts(metaphors_fts) VALUES ('rebuild')"))
+
+
+def _metaphor_search_index(conn: Connection):
+    # PostgreSQL counterpart of metaphors_fts: a GIN index over the weighted
+    # tsvector that services/search.py queries.
+    if conn.dialect.name != "postgresql":
+        return
+    from app.services.search import pg_document
+
+    document = pg_document().compile(conn)
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_metaphors_search ON metaphors USING gin (({document}))"))
+
+
+def _widen_chapter_number(conn: Connection):
+    # Spelled-out labels with a part prefix outgrew VARCHAR(10). SQLite does
+    # not enforce VARCHAR lengths, so only other databases need the change.
+    if conn.dialect.name == "sqlite":
+        return
+    conn.execute(text("ALTER TABLE chapters ALTER COLUMN number TYPE VARCHAR(40)"))
+
+
+MIGRATIONS: list[tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "move chapter text to chapter_texts", _move_chapter_text),
+    (2, "metaphor, subtopic and paper section indexes", _create_indexes(
+        "ix_metaphors_chapter_position",
+        "ix_metaphors_topic_selected",
+        "ix_metaphors_selected_confidence",
+        "ix_metaphors_confidence",
+        "ix_metaphors_subtopic_id",
+        "ix_subtopics_topic_id",
+        "ix_paper_sections_paper_order",
+    )),
+    (3, "full-text index over metaphors", _metaphor_fts),
+    (4, "full-text index over metaphors (PostgreSQL)", _metaphor_search_index),
+    (5, "widen chapters.number", _widen_chapter_number),
+]
+
+
+def run_migrations(conn: Connection) -> list[int]:
+    # Runs after create_all, so every migration must also work on a freshly
+    # created schema.
+    schema_migrations.create(conn, checkfirst=True)
+    applied = set(conn.execute(select(schema_migrations.c.version)).scalars())
+    ran = []
+    for version, name, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        migrate(conn)
+        conn.execute(schema_migrations.insert().values(
+            version=version, name=name, applied_at=datetime.now(timezone.utc),
+        ))
+        ran.append(version)
+    return ran
@@ -1,6 +1,6 @@
 from datetime import datetime, timezone
 
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, Text
 from sqlalchemy.orm import relationship
 
 from app.models.database import Base
@@ -14,13 +14,14 @@ class Paper(Base):
     author = Column(String(200), default="")
     status = Column(String(50), default="draft")
     target_pages = Column(Integer, default=10)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
 
     sections = relationship("PaperSection", back_populates="paper", order_by="PaperSection.sort_order")
 
 
 class PaperSection(Base):
     __tablename__ = "paper_sections"
+    __table_args__ = (Index("ix_paper_sections_paper_order", "paper_id", "sort_order"),)
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     paper_id = Column(Integer, ForeignKey("papers.id"), nullable=False)
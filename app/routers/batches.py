@@ -0,0 +1,50 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.batch import LLMBatch
+from app.models.database import get_db
+from app.services import batches
+
+router = APIRouter()
+
+
+def _batch_out(b: LLMBatch) -> dict:
+    return {
+        "id": b.id, "batch_id": b.batch_id, "kind": b.kind, "status": b.status,
+        "requests": len(b.targets or {}), "params": b.params, "error": b.error,
+        "created_at": b.created_at, "completed_at": b.completed_at,
+    }
+
+
+@router.post("/api/extract/batch")
+async def submit_extraction_batch(db: AsyncSession = Depends(get_db)):
+    try:
+        batch = await batches.submit_extraction(db)
+    except ValueError as e:
+        return {"error": str(e)}
+    return {"status": "ok", "batch": _batch_out(batch)}
+
+
+@router.post("/api/paper/{paper_id}/translate/{lang}/batch")
+async def submit_translation_batch(paper_id: int, lang: str, db: AsyncSession = Depends(get_db)):
+    try:
+        batch = await batches.submit_translation(db, paper_id, lang)
+    except ValueError as e:
+        return {"error": str(e)}
+    return {"status": "ok", "batch": _batch_out(batch)}
+
+
+@router.get("/api/batches")
+async def list_batches(db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(LLMBatch).order_by(LLMBatch.id.desc()))
+    return [_batch_out(b) for b in result.scalars().all()]
+
+
+@router.post("/api/batches/{batch_id}/poll")
+async def poll_batch(batch_id: int, db: AsyncSession = Depends(get_db)):
+    batch = await db.get(LLMBatch, batch_id)
+    if not batch:
+        return {"error": "Not found"}
+    await batches.poll(db, batch)
+    return {"status": "ok", "batch": _batch_out(batch)}
@@ -1,33 +1,103 @@
-from fastapi import APIRouter, Depends, Request
+from pathlib import Path
+
+from fastapi import APIRouter, Depends, File, Query, Request, UploadFile
 from fastapi.responses import HTMLResponse
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.database import get_db
-from app.services import gutenberg
+from app.models.metaphor import Book, Chapter
+from app.schemas.metaphor import ChapterOut
+from app.services import gutenberg, local_import, read_models
 
 router = APIRouter()
 
 
-@router.post("/api/ingest")
-async def ingest_text(db: AsyncSession = Depends(get_db)):
-    chapters = await gutenberg.ingest(db)
+UPLOAD_CHUNK = 1 << 20
+
+
+def _ingest_out(chapters, errors) -> dict:
     return {
-        "status": "ok",
+        "status": "ok" if not errors else "partial",
         "chapters": [
-            {"id": c.id, "number": c.number, "title": c.title, "word_count": c.word_count}
+            {"id": c.id, "book_id": c.book_id, "number": c.number, "title": c.title, "word_count": c.word_count}
             for c in chapters
         ],
+        "errors": {str(key): error for key, error in errors.items()},
     }
 
 
+@router.post("/api/ingest")
+async def ingest_text(
+    book_ids: list[int] = Query(default=[]),
+    refresh: bool = False,
+    db: AsyncSession = Depends(get_db),
+):
+    chapters, errors = await gutenberg.ingest(db, book_ids or None, refresh)
+    return _ingest_out(chapters, errors)
+
+
+@router.post("/api/ingest/local")
+async def ingest_local(
+    path: list[str] = Query(default=[]),
+    refresh: bool = False,
+    db: AsyncSession = Depends(get_db),
+):
+    # Paths are relative to IMPORT_DIR; without any, the whole directory is imported.
+    try:
+        paths = [local_import.resolve(p) for p in path]
+    except ValueError as e:
+        return {"error": str(e)}
+    chapters, errors = await local_import.import_local(db, paths or None, refresh)
+    return _ingest_out(chapters, errors)
+
+
+@router.post("/api/ingest/upload")
+async def ingest_upload(
+    files: list[UploadFile] = File(...),
+    refresh: bool = False,
+    db: AsyncSession = Depends(get_db),
+):
+    upload_dir = local_import.import_root() / "uploads"
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for upload in files:
+        name = Path(upload.filename or "").name
+        if not name.lower().endswith(local_import.SUFFIXES):
+            return {"error": f"Unsupported file type: {name or 'unnamed'}"}
+        # Copied in chunks so large archives never sit in memory.
+        path = upload_dir / name
+        with path.open("wb") as out:
+            while chunk := await upload.read(UPLOAD_CHUNK):
+                out.write(chunk)
+        paths.append(path)
+    chapters, errors = await local_import.import_local(db, paths, refresh)
+    return _ingest_out(chapters, errors)
+
+
+@router.get("/api/chapters")
+async def list_chapters(db: AsyncSession = Depends(get_db)):
+    result = await db.execute(
+        select(Chapter.id, Chapter.number, Chapter.title, Chapter.word_count, Chapter.processed)
+        .order_by(Chapter.book_id, Chapter.id)
+    )
+    counts = await read_models.metaphors_per_chapter.get(db)
+    return [
+        ChapterOut(
+            id=row.id, number=row.number, title=row.title or "", word_count=row.word_count or 0,
+            processed=bool(row.processed), metaphor_count=counts.get(row.id, 0),
+        )
+        for row in result.all()
+    ]
+
+
 @router.get("/ingest", response_class=HTMLResponse)
 async def ingest_page(request: Request, db: AsyncSession = Depends(get_db)):
-    from sqlalchemy import select
-    from app.models.metaphor import Chapter
-
-    result = await db.execute(select(Chapter).order_by(Chapter.id))
+    result = await db.execute(select(Chapter).order_by(Chapter.book_id, Chapter.id))
     chapters = result.scalars().all()
+    result = await db.execute(select(Book.id, Book.title))
+    books = dict(result.all())
 
     return request.app.state.templates.TemplateResponse(
-        "ingest.html", {"request": request, "chapters": chapters}
+        "ingest.html", {"request": request, "chapters": chapters, "books": books}
     )
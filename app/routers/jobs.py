@@ -0,0 +1,65 @@
+import json
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.database import async_session, get_db
+from app.models.job import Job
+from app.services import jobs
+
+router = APIRouter()
+
+
+def _job_out(j: Job) -> dict:
+    return {
+        "id": j.id, "kind": j.kind, "status": j.status, "params": j.params,
+        "progress": j.progress, "error": j.error, "created_at": j.created_at,
+        "started_at": j.started_at, "finished_at": j.finished_at,
+    }
+
+
+@router.get("/api/jobs")
+async def list_jobs(status: str | None = None, db: AsyncSession = Depends(get_db)):
+    query = select(Job).order_by(Job.id.desc()).limit(100)
+    if status is not None:
+        query = query.where(Job.status == status)
+    result = await db.execute(query)
+    return [_job_out(j) for j in result.scalars().all()]
+
+
+@router.get("/api/jobs/{job_id}")
+async def get_job(job_id: int, db: AsyncSession = Depends(get_db)):
+    job = await db.get(Job, job_id)
+    if not job:
+        return {"error": "Not found"}
+    return _job_out(job)
+
+
+@router.post("/api/jobs/{job_id}/cancel")
+async def cancel_job(job_id: int, db: AsyncSession = Depends(get_db)):
+    job = await db.get(Job, job_id)
+    if not job:
+        return {"error": "Not found"}
+    job = await jobs.cancel(db, job)
+    return {"status": "ok", "job": _job_out(job)}
+
+
+@router.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: int, request: Request, after: int = 0):
+    # EventSource reconnects with Last-Event-ID, so a dropped connection picks
+    # up where it left off instead of replaying the whole job.
+    last_id = request.headers.get("last-event-id")
+    if last_id and last_id.isdigit():
+        after = int(last_id)
+
+    async def event_gen():
+        async for event_id, data in jobs.follow(job_id, after):
+            yield f"id: {event_id}\ndata: {json.dumps(data)}\n\n"
+        async with async_session() as db:
+            job = await db.get(Job, job_id)
+        final = {"status": "done", "job_status": job.status if job else None, "error": job.error if job else None}
+        yield f"data: {json.dumps(final)}\n\n"
+
+    return StreamingResponse(event_gen(), media_type="text/event-stream")
@@ -0,0 +1,20 @@
+from fastapi import APIRouter
+
+from app.services.llm_provider import get_provider
+
+router = APIRouter()
+
+
+@router.get("/api/llm/stats")
+async def llm_stats():
+    stats = getattr(get_provider(), "stats", None)
+    return stats() if stats else {}
+
+
+@router.post("/api/llm/cache/clear")
+async def clear_llm_cache():
+    cache = getattr(get_provider(), "cache", None)
+    if cache is None:
+        return {"error": "LLM cache is disabled"}
+    await cache.clear()
+    return {"status": "ok"}
@@ -1,20 +1,20 @@
-import json
-
 from fastapi import APIRouter, Depends, Query, Request
 from fastapi.responses import HTMLResponse, StreamingResponse
-from sqlalchemy import select, func
+from sqlalchemy import and_, false, func, or_, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models.database import get_db
-from app.models.metaphor import Chapter, Metaphor, Topic
-from app.schemas.metaphor import MetaphorOut, MetaphorUpdate
-from app.services import extractor
+from app.models.database import async_session, get_db
+from app.models.metaphor import Chapter, Metaphor, Subtopic, Topic
+from app.schemas.metaphor import (
+    DedupRequest, MetaphorBulkUpdate, MetaphorOut, MetaphorSearchHit, MetaphorUpdate,
+)
+from app.services import chapter_text, dedup, extractor, jobs, quote_index, search
 from app.services.prompt_guard import sanitize_user_input
 
 router = APIRouter()
 
 
-@router.post("/api/extract/{chapter_id}")
+@router.post("/api/extract/{chapter_id:int}")
 async def extract_chapter(chapter_id: int, db: AsyncSession = Depends(get_db)):
     chapter = await db.get(Chapter, chapter_id)
     if not chapter:
@@ -23,15 +23,96 @@ async def extract_chapter(chapter_id: int, db: AsyncSession = Depends(get_db)):
     return {"status": "ok", "count": len(metaphors)}
 
 
-@router.get("/api/extract/stream")
-async def extract_all_stream(db: AsyncSession = Depends(get_db)):
-    async def event_gen():
-        async for chapter_num, status in extractor.extract_all(db):
-            data = json.dumps({"chapter": chapter_num, "status": status})
-            yield f"data: {data}\n\n"
-        yield f"data: {json.dumps({'status': 'done'})}\n\n"
+@router.post("/api/extract/all")
+async def extract_all(db: AsyncSession = Depends(get_db)):
+    job = await jobs.enqueue(db, "extract")
+    return {"status": "ok", "job_id": job.id}
+
+
+@router.get("/api/extract/stale")
+async def list_stale_chapters(db: AsyncSession = Depends(get_db)):
+    chapters = await extractor.stale_chapters(db)
+    return [{"id": c.id, "number": c.number, "processed": c.processed} for c in chapters]
+
+
+@router.post("/api/extract/refresh")
+async def reextract_stale(db: AsyncSession = Depends(get_db)):
+    job = await jobs.enqueue(db, "reextract")
+    return {"status": "ok", "job_id": job.id}
+
+
+# Sort orders for /api/metaphors: (column, descending) pairs, always ending
+# in a unique column so keyset pagination has a total order.
+SORTS = {
+    "position": [(Metaphor.chapter_id, False), (Metaphor.quote_start, False), (Metaphor.id, False)],
+    "id": [(Metaphor.id, False)],
+    "newest": [(Metaphor.id, True)],
+    "confidence": [(Metaphor.confidence, True), (Metaphor.id, False)],
+}
+STREAM_CHUNK = 500
+
 
-    return StreamingResponse(event_gen(), media_type="text/event-stream")
+def _filters(chapter_id=None, topic_id=None, selected=None, min_confidence=None, unassigned=False):
+    conditions = []
+    if chapter_id is not None:
+        conditions.append(Metaphor.chapter_id == chapter_id)
+    if topic_id is not None:
+        conditions.append(Metaphor.topic_id == topic_id)
+    if unassigned:
+        conditions.append(Metaphor.topic_id.is_(None))
+    if selected is not None:
+        conditions.append(Metaphor.selected == selected)
+    if min_confidence is not None:
+        conditions.append(Metaphor.confidence >= min_confidence)
+    return conditions
+
+
+def _metaphor_query(chapter_id, topic_id, selected, min_confidence):
+    # One projection joined to the chapter and topic names, instead of
+    # loading each row's chapter and topic separately.
+    query = (
+        select(
+            Metaphor.id, Metaphor.chapter_id, func.coalesce(Chapter.number, "").label("chapter_number"),
+            Metaphor.exact_quote, Metaphor.explanation, Metaphor.meaning, Metaphor.suggested_topic,
+            Metaphor.topic_id, Topic.name.label("topic_name"), Metaphor.subtopic_id, Metaphor.selected,
+            Metaphor.user_notes, Metaphor.confidence, Metaphor.quote_start, Metaphor.quote_end,
+            func.coalesce(Metaphor.quote_verified, False).label("quote_verified"),
+        )
+        .outerjoin(Chapter, Chapter.id == Metaphor.chapter_id)
+        .outerjoin(Topic, Topic.id == Metaphor.topic_id)
+        .where(*_filters(chapter_id, topic_id, selected, min_confidence))
+    )
+    return query
+
+
+def _order(keys):
+    # NULLs first ascending and last descending, as SQLite does by default,
+    # spelled out so the keyset predicate holds on every backend.
+    return [col.desc().nulls_last() if desc else col.asc().nulls_first() for col, desc in keys]
+
+
+def _after(keys, values):
+    # Rows strictly after `values` in the given order:
+    # (k1 > v1) OR (k1 = v1 AND k2 > v2) OR ...
+    clauses, equal = [], []
+    for (col, desc), value in zip(keys, values):
+        if value is None:
+            beyond = None if desc else col.is_not(None)
+            same = col.is_(None)
+        else:
+            beyond = or_(col < value, col.is_(None)) if desc else col > value
+            same = col == value
+        if beyond is not None:
+            clauses.append(and_(*equal, beyond))
+        equal.append(same)
+    if not clauses:
+        return false()
+    # Redundant, but a plain range on the leading column lets the database
+    # seek to the cursor in the index instead of scanning up to it.
+    (first, desc), value = keys[0], values[0]
+    if value is not None and not desc:
+        return and_(first >= value, or_(*clauses))
+    return or_(*clauses)
 
 
 @router.get("/api/metaphors")
@@ -40,35 +121,153 @@ async def list_metaphors(
     topic_id: int | None = None,
     selected: bool | None = None,
     min_confidence: float | None = None,
+    sort: str = "position",
+    after_id: int | None = None,
+    limit: int | None = Query(None, ge=1, le=1000),
     db: AsyncSession = Depends(get_db),
 ):
-    query = select(Metaphor)
-    if chapter_id is not None:
-        query = query.where(Metaphor.chapter_id == chapter_id)
-    if topic_id is not None:
-        query = query.where(Metaphor.topic_id == topic_id)
-    if selected is not None:
-        query = query.where(Metaphor.selected == selected)
-    if min_confidence is not None:
-        query = query.where(Metaphor.confidence >= min_confidence)
+    # With `limit`, returns one page and the cursor for the next; without it,
+    # streams every matching row as a JSON array.
+    keys = SORTS.get(sort)
+    if keys is None:
+        return {"error": f"sort must be one of {', '.join(SORTS)}"}
+    query = _metaphor_query(chapter_id, topic_id, selected, min_confidence).order_by(*_order(keys))
 
-    result = await db.execute(query.order_by(Metaphor.chapter_id, Metaphor.id))
-    metaphors = result.scalars().all()
+    if after_id is not None:
+        cursor = (await db.execute(select(*(col for col, _ in keys)).where(Metaphor.id == after_id))).first()
+        if cursor is None:
+            return {"error": "after_id not found"}
+        query = query.where(_after(keys, cursor))
+
+    if limit is None:
+        return StreamingResponse(_stream_metaphors(query), media_type="application/json")
+
+    rows = (await db.execute(query.limit(limit + 1))).all()
+    items = [MetaphorOut(**row._mapping) for row in rows[:limit]]
+    return {"items": items, "next_after_id": items[-1].id if len(rows) > limit else None}
+
+
+async def _stream_metaphors(query):
+    # Rows are serialized as the cursor yields them; the generator has its own
+    # session because the request's is closed once the response starts.
+    async with async_session() as db:
+        result = await db.stream(query)
+        yield "["
+        first = True
+        async for rows in result.partitions(STREAM_CHUNK):
+            chunk = ",".join(MetaphorOut(**row._mapping).model_dump_json() for row in rows)
+            yield chunk if first else "," + chunk
+            first = False
+        yield "]"
 
-    out = []
-    for m in metaphors:
-        chapter = await db.get(Chapter, m.chapter_id)
-        topic = await db.get(Topic, m.topic_id) if m.topic_id else None
-        out.append(MetaphorOut(
-            id=m.id, chapter_id=m.chapter_id,
-            chapter_number=chapter.number if chapter else "",
-            exact_quote=m.exact_quote, explanation=m.explanation,
-            meaning=m.meaning, suggested_topic=m.suggested_topic,
-            topic_id=m.topic_id, topic_name=topic.name if topic else None,
-            subtopic_id=m.subtopic_id, selected=m.selected,
-            user_notes=m.user_notes, confidence=m.confidence,
-        ))
-    return out
+
+@router.get("/api/metaphors/search")
+async def search_metaphors(
+    q: str,
+    chapter_id: int | None = None,
+    topic_id: int | None = None,
+    selected: bool | None = None,
+    min_confidence: float | None = None,
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_db),
+):
+    if not search.fts_query(q):
+        return {"error": "Search query is empty"}
+    query = await search.search_query(db, _metaphor_query(chapter_id, topic_id, selected, min_confidence), q)
+    if query is None:
+        return {"error": "Full-text search is not available on this database"}
+
+    rows = (await db.execute(query.limit(limit).offset(offset))).all()
+    items = [
+        MetaphorSearchHit(**{**row._mapping, "snippet": search.highlight_html(row.snippet)})
+        for row in rows
+    ]
+    return {"query": q, "items": items, "next_offset": offset + limit if len(items) == limit else None}
+
+
+@router.post("/api/metaphors/bulk")
+async def bulk_update_metaphors(req: MetaphorBulkUpdate, db: AsyncSession = Depends(get_db)):
+    # One UPDATE in one transaction for the whole selection, instead of a
+    # toggle/assign/PATCH request per row.
+    if (req.ids is None) == (req.filter is None):
+        return {"error": "Give either ids or filter"}
+
+    values = {}
+    if req.selected is not None:
+        values["selected"] = req.selected
+    if req.unassign:
+        if req.topic_id is not None or req.subtopic_id is not None:
+            return {"error": "unassign cannot be combined with topic_id or subtopic_id"}
+        values.update(topic_id=None, subtopic_id=None)
+    elif req.subtopic_id is not None:
+        subtopic = await db.get(Subtopic, req.subtopic_id)
+        if not subtopic:
+            return {"error": "Subtopic not found"}
+        if req.topic_id is not None and req.topic_id != subtopic.topic_id:
+            return {"error": "Subtopic belongs to another topic"}
+        values.update(topic_id=subtopic.topic_id, subtopic_id=subtopic.id)
+    elif req.topic_id is not None:
+        if not await db.get(Topic, req.topic_id):
+            return {"error": "Topic not found"}
+        values.update(topic_id=req.topic_id, subtopic_id=None)
+    if req.user_notes is not None:
+        values["user_notes"] = sanitize_user_input(req.user_notes)
+    if not values:
+        return {"error": "Nothing to update"}
+
+    if req.ids is not None:
+        where = [Metaphor.id.in_(req.ids)]
+    else:
+        where = _filters(**req.filter.model_dump(exclude={"all"}))
+        if not where and not req.filter.all:
+            return {"error": "Filter has no conditions; set filter.all to update every metaphor"}
+    result = await db.execute(
+        update(Metaphor).where(*where).values(**values).execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return {"status": "ok", "updated": result.rowcount}
+
+
+@router.post("/api/metaphors/verify")
+async def verify_metaphors(chapter_id: int | None = None, db: AsyncSession = Depends(get_db)):
+    counts = await quote_index.verify_metaphors(db, chapter_id)
+    return {"status": "ok", **counts}
+
+
+@router.post("/api/metaphors/dedup")
+async def dedup_metaphors(req: DedupRequest, db: AsyncSession = Depends(get_db)):
+    if req.action not in ("deselect", "merge"):
+        return {"error": "action must be 'deselect' or 'merge'"}
+    if not 0.0 < req.threshold <= 1.0:
+        return {"error": "threshold must be in (0, 1]"}
+    return await dedup.deduplicate(
+        db, threshold=req.threshold, action=req.action, dry_run=req.dry_run,
+        chapter_id=req.chapter_id, selected_only=req.selected_only,
+    )
+
+
+@router.get("/api/metaphors/{metaphor_id}/context")
+async def metaphor_context(
+    metaphor_id: int,
+    chars: int = Query(300, ge=0, le=5000),
+    db: AsyncSession = Depends(get_db),
+):
+    m = await db.get(Metaphor, metaphor_id)
+    if not m:
+        return {"error": "Not found"}
+    if m.quote_start is None:
+        return {"error": "Quote was not located in the chapter text"}
+
+    text = await chapter_text.load_text(db, m.chapter_id)
+    start, end = m.quote_start, m.quote_end
+    return {
+        "before": text[max(0, start - chars):start],
+        "quote": text[start:end],
+        "after": text[end:end + chars],
+        "start": start,
+        "end": end,
+    }
 
 
 @router.patch("/api/metaphors/{metaphor_id}")
@@ -115,7 +314,9 @@ async def review_page(request: Request, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(Chapter).order_by(Chapter.id))
     chapters = result.scalars().all()
 
-    result = await db.execute(select(Metaphor).order_by(Metaphor.chapter_id, Metaphor.id))
+    result = await db.execute(
+        select(Metaphor).order_by(Metaphor.chapter_id, Metaphor.quote_start, Metaphor.id)
+    )
     metaphors = result.scalars().all()
 
     topics = set()
@@ -1,30 +1,23 @@
-import json
-
 from fastapi import APIRouter, Depends, Request
-from fastapi.responses import HTMLResponse, Response, StreamingResponse
+from fastapi.responses import HTMLResponse, Response
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.database import get_db
 from app.models.paper import Paper, PaperSection
 from app.schemas.paper import PaperConfig
-from app.services import writer
+from app.services import jobs
 from app.services.pdf_renderer import render_pdf
 
 router = APIRouter()
 
 
 @router.post("/api/paper/generate")
-async def generate_paper_stream(config: PaperConfig, db: AsyncSession = Depends(get_db)):
-    async def event_gen():
-        async for paper_id, section_name, status in writer.generate_paper(
-            db, config.title, config.author, config.target_pages
-        ):
-            data = json.dumps({"paper_id": paper_id, "section": section_name, "status": status})
-            yield f"data: {data}\n\n"
-        yield f"data: {json.dumps({'status': 'done'})}\n\n"
-
-    return StreamingResponse(event_gen(), media_type="text/event-stream")
+async def generate_paper(config: PaperConfig, db: AsyncSession = Depends(get_db)):
+    job = await jobs.enqueue(db, "paper", {
+        "title": config.title, "author": config.author, "target_pages": config.target_pages,
+    })
+    return {"status": "ok", "job_id": job.id}
 
 
 @router.get("/api/paper/{paper_id}")
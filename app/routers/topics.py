@@ -2,13 +2,13 @@ import json
 
 from fastapi import APIRouter, Depends, Request
 from fastapi.responses import HTMLResponse
-from sqlalchemy import select, func
+from sqlalchemy import case, func, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.database import get_db
 from app.models.metaphor import Metaphor, Topic, Subtopic
 from app.schemas.metaphor import TopicCreate, TopicOut
-from app.services import organizer
+from app.services import organizer, read_models
 
 router = APIRouter()
 
@@ -23,17 +23,15 @@ async def auto_organize(db: AsyncSession = Depends(get_db)):
 async def list_topics(db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(Topic).order_by(Topic.sort_order))
     topics = result.scalars().all()
+    counts = await read_models.metaphors_per_topic.get(db)
 
-    out = []
-    for t in topics:
-        count = await db.execute(
-            select(func.count(Metaphor.id)).where(Metaphor.topic_id == t.id)
-        )
-        out.append(TopicOut(
+    return [
+        TopicOut(
             id=t.id, name=t.name, description=t.description,
-            sort_order=t.sort_order, metaphor_count=count.scalar() or 0,
-        ))
-    return out
+            sort_order=t.sort_order, metaphor_count=counts.get(t.id, 0),
+        )
+        for t in topics
+    ]
 
 
 @router.post("/api/topics")
@@ -61,11 +59,14 @@ async def update_topic(topic_id: int, data: TopicCreate, db: AsyncSession = Depe
 
 @router.post("/api/topics/reorder")
 async def reorder_topics(topic_ids: list[int], db: AsyncSession = Depends(get_db)):
-    for i, tid in enumerate(topic_ids):
-        topic = await db.get(Topic, tid)
-        if topic:
-            topic.sort_order = i
-    await db.commit()
+    # A single UPDATE ... CASE; ids that are not topics are ignored.
+    if topic_ids:
+        order = {tid: i for i, tid in enumerate(topic_ids)}
+        await db.execute(
+            update(Topic).where(Topic.id.in_(order)).values(sort_order=case(order, value=Topic.id))
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
     return {"status": "ok"}
 
 
@@ -94,15 +95,15 @@ async def topics_page(request: Request, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(Topic).order_by(Topic.sort_order))
     topics = result.scalars().all()
 
-    topics_data = []
-    for t in topics:
-        metaphors_result = await db.execute(
-            select(Metaphor).where(Metaphor.topic_id == t.id).order_by(Metaphor.id)
-        )
-        topics_data.append({
-            "topic": t,
-            "metaphors": metaphors_result.scalars().all(),
-        })
+    # All assigned metaphors in one query, grouped here rather than queried
+    # topic by topic.
+    by_topic: dict[int, list[Metaphor]] = {t.id: [] for t in topics}
+    result = await db.execute(
+        select(Metaphor).where(Metaphor.topic_id.is_not(None)).order_by(Metaphor.topic_id, Metaphor.id)
+    )
+    for m in result.scalars().all():
+        by_topic.setdefault(m.topic_id, []).append(m)
+    topics_data = [{"topic": t, "metaphors": by_topic[t.id]} for t in topics]
 
     unassigned_result = await db.execute(
         select(Metaphor).where(Metaphor.topic_id == None, Metaphor.selected == True)
@@ -3,13 +3,39 @@ from pydantic import BaseModel
 
 class LLMRequest(BaseModel):
     system: str = ""
+    # Static instructions sent ahead of the prompt in the same user turn. With
+    # cache_prefix set, everything up to and including it is a cacheable prefix.
+    prefix: str = ""
     prompt: str
     max_tokens: int = 4096
     temperature: float = 0.3
+    use_cache: bool = True
+    cache_system: bool = False
+    cache_prefix: bool = False
+    # Latency-sensitive calls may be duplicated to a fallback backend when the
+    # primary is slow; see RoutingProvider.
+    hedge: bool = False
 
 
 class LLMResponse(BaseModel):
     content: str
     input_tokens: int = 0
     output_tokens: int = 0
+    cache_read_input_tokens: int = 0
+    cache_creation_input_tokens: int = 0
     model: str = ""
+    stop_reason: str = ""
+
+
+class LLMBatchItem(BaseModel):
+    custom_id: str
+    request: LLMRequest
+    tool_name: str | None = None
+    tool_schema: dict | None = None
+
+
+class LLMBatchResult(BaseModel):
+    custom_id: str
+    response: LLMResponse | None = None
+    structured: dict | None = None
+    error: str | None = None
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class MetaphorExtracted(BaseModel):
@@ -27,11 +27,20 @@ class MetaphorOut(BaseModel):
     selected: bool
     user_notes: str | None = None
     confidence: float
+    quote_start: int | None = None
+    quote_end: int | None = None
+    quote_verified: bool = False
 
     class Config:
         from_attributes = True
 
 
+class MetaphorSearchHit(MetaphorOut):
+    rank: float
+    # HTML: matched terms wrapped in <mark>, everything else escaped
+    snippet: str = ""
+
+
 class MetaphorUpdate(BaseModel):
     explanation: str | None = None
     meaning: str | None = None
@@ -41,6 +50,37 @@ class MetaphorUpdate(BaseModel):
     subtopic_id: int | None = None
 
 
+class MetaphorFilter(BaseModel):
+    chapter_id: int | None = None
+    topic_id: int | None = None
+    unassigned: bool = False
+    selected: bool | None = None
+    min_confidence: float | None = None
+    # A filter without conditions matches every metaphor; bulk updates only
+    # accept that when it is asked for explicitly.
+    all: bool = False
+
+
+class MetaphorBulkUpdate(BaseModel):
+    # Target either explicit ids or every metaphor matching `filter`.
+    ids: list[int] | None = Field(None, max_length=10000)
+    filter: MetaphorFilter | None = None
+    selected: bool | None = None
+    topic_id: int | None = None
+    subtopic_id: int | None = None
+    # Clears topic and subtopic; cannot be combined with topic_id.
+    unassign: bool = False
+    user_notes: str | None = None
+
+
+class DedupRequest(BaseModel):
+    threshold: float = 0.7
+    action: str = "deselect"
+    dry_run: bool = True
+    chapter_id: int | None = None
+    selected_only: bool = False
+
+
 class ChapterOut(BaseModel):
     id: int
     number: str
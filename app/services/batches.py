@@ -0,0 +1,92 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.batch import LLMBatch
+from app.models.database import async_session
+from app.services import extractor, translator
+from app.services.llm_provider import BatchProvider, get_provider
+
+logger = logging.getLogger(__name__)
+
+
+def _batch_provider() -> BatchProvider:
+    provider = get_provider()
+    if not isinstance(provider, BatchProvider):
+        raise ValueError("The configured LLM provider does not support message batches")
+    return provider
+
+
+async def _submit(db: AsyncSession, kind: str, items, targets: dict, params: dict) -> LLMBatch:
+    if not items:
+        raise ValueError("Nothing to submit")
+
+    batch_id = await _batch_provider().submit_batch(items)
+    batch = LLMBatch(batch_id=batch_id, kind=kind, targets=targets, params=params)
+    db.add(batch)
+    await db.commit()
+    await db.refresh(batch)
+    return batch
+
+
+async def submit_extraction(db: AsyncSession) -> LLMBatch:
+    # Chapters already waiting in an open batch are not submitted twice.
+    result = await db.execute(
+        select(LLMBatch).where(LLMBatch.kind == "extract", LLMBatch.status == "submitted")
+    )
+    in_flight = {cid for b in result.scalars().all() for cid in b.targets.values()}
+
+    items, targets = await extractor.build_batch(db, exclude=in_flight)
+    return await _submit(db, "extract", items, targets, {})
+
+
+async def submit_translation(db: AsyncSession, paper_id: int, lang: str) -> LLMBatch:
+    items, targets = await translator.build_batch(db, paper_id, lang)
+    return await _submit(db, "translate", items, targets, {"paper_id": paper_id, "lang": lang})
+
+
+async def poll(db: AsyncSession, batch: LLMBatch) -> bool:
+    if batch.status != "submitted":
+        return True
+
+    results = await _batch_provider().batch_results(batch.batch_id)
+    if results is None:
+        return False
+
+    if batch.kind == "extract":
+        errors = await extractor.store_batch_results(db, batch.targets, results)
+    elif batch.kind == "translate":
+        errors = await translator.store_batch_results(db, batch.params["lang"], batch.targets, results)
+    else:
+        errors = [f"Unknown batch kind {batch.kind}"]
+
+    batch.status = "failed" if errors and len(errors) >= len(batch.targets) else "complete"
+    batch.error = "\n".join(errors) or None
+    batch.completed_at = datetime.now(timezone.utc)
+    await db.commit()
+    return True
+
+
+async def poll_pending(db: AsyncSession) -> int:
+    result = await db.execute(
+        select(LLMBatch).where(LLMBatch.status == "submitted").order_by(LLMBatch.id)
+    )
+    finished = 0
+    for batch in result.scalars().all():
+        if await poll(db, batch):
+            finished += 1
+    return finished
+
+
+async def run_poller():
+    while True:
+        await asyncio.sleep(settings.batch_poll_interval)
+        try:
+            async with async_session() as db:
+                await poll_pending(db)
+        except Exception:
+            logger.exception("Batch polling failed")
@@ -0,0 +1,28 @@
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.metaphor import ChapterText
+
+
+async def load_text(db: AsyncSession, chapter_id: int) -> str:
+    result = await db.execute(select(ChapterText.data).where(ChapterText.chapter_id == chapter_id))
+    data = result.scalar()
+    return ChapterText.unpack(data) if data is not None else ""
+
+
+async def load_texts(db: AsyncSession, chapter_ids: list[int]) -> dict[int, str]:
+    if not chapter_ids:
+        return {}
+    result = await db.execute(
+        select(ChapterText.chapter_id, ChapterText.data).where(ChapterText.chapter_id.in_(chapter_ids))
+    )
+    return {chapter_id: ChapterText.unpack(data) for chapter_id, data in result.all()}
+
+
+async def store_bodies(db: AsyncSession, bodies: dict[int, bytes]):
+    # Takes already-compressed bodies (see ChapterText.pack), so ingestion can
+    # compress in its worker processes. Does not commit.
+    if not bodies:
+        return
+    await db.execute(delete(ChapterText).where(ChapterText.chapter_id.in_(list(bodies))))
+    await db.execute(insert(ChapterText), [{"chapter_id": k, "data": v} for k, v in bodies.items()])
@@ -1,67 +1,280 @@
-import json
+import asyncio
+import itertools
 
 import anthropic
 
 from app.config import settings
-from app.schemas.llm import LLMRequest, LLMResponse
+from app.schemas.llm import LLMBatchItem, LLMBatchResult, LLMRequest, LLMResponse
+from app.services.json_stream import ArrayItemParser
+from app.services.llm_provider import TruncatedResponseError
+from app.services.rate_limiter import RateLimiter, retry_after
+
+CACHE_BREAKPOINT = {"type": "ephemeral"}
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
 
 
 class ClaudeProvider:
-    def __init__(self):
-        self.client = anthropic.AsyncAnthropic(api_key=settings.anthropic_api_key)
-        self.model = settings.claude_model
+    def __init__(self, model: str | None = None):
+        self.client = anthropic.AsyncAnthropic(
+            api_key=settings.anthropic_api_key,
+            base_url=settings.anthropic_base_url or None,
+            # Retries are scheduled by the rate limiter so that backoff is
+            # shared across concurrent calls instead of per request.
+            max_retries=0,
+        )
+        self.model = model or settings.claude_model
+        self.limiter = RateLimiter(
+            requests_per_minute=settings.llm_requests_per_minute,
+            input_tokens_per_minute=settings.llm_input_tokens_per_minute,
+            output_tokens_per_minute=settings.llm_output_tokens_per_minute,
+            max_retries=settings.llm_max_retries,
+            max_backoff=settings.llm_max_backoff,
+        )
+        self.usage = {
+            "requests": 0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "cache_read_input_tokens": 0,
+            "cache_creation_input_tokens": 0,
+        }
 
-    async def complete(self, request: LLMRequest) -> LLMResponse:
-        kwargs = {
+    def _params(self, request: LLMRequest, tool_name: str | None = None, tool_schema: dict | None = None) -> dict:
+        params = {
             "model": self.model,
             "max_tokens": request.max_tokens,
             "temperature": request.temperature,
-            "messages": [{"role": "user", "content": request.prompt}],
         }
+        if tool_name:
+            params.update(self._tool_params(tool_name, tool_schema or {}))
+
+        # Cache breakpoints mark the end of a reusable prefix; the API caches
+        # tools, system and messages up to the last marked block. A prefix
+        # below the model's minimum cacheable length is never cached, so it is
+        # sent without a breakpoint.
+        prefix_chars = len(str(params.get("tools", "")))
         if request.system:
-            kwargs["system"] = request.system
+            prefix_chars += len(request.system)
+            system = {"type": "text", "text": request.system}
+            if request.cache_system and self._cacheable(prefix_chars):
+                system["cache_control"] = CACHE_BREAKPOINT
+            params["system"] = [system]
+
+        content = []
+        if request.prefix:
+            prefix_chars += len(request.prefix)
+            prefix = {"type": "text", "text": request.prefix}
+            if request.cache_prefix and self._cacheable(prefix_chars):
+                prefix["cache_control"] = CACHE_BREAKPOINT
+            content.append(prefix)
+        content.append({"type": "text", "text": request.prompt})
+        params["messages"] = [{"role": "user", "content": content}]
 
-        response = await self.client.messages.create(**kwargs)
+        return params
+
+    def _cacheable(self, chars: int) -> bool:
+        # Same four-characters-per-token estimate as _estimate_input_tokens.
+        return chars // 4 >= settings.claude_cache_min_tokens
+
+    def _record_usage(self, usage) -> dict:
+        counts = {
+            "input_tokens": usage.input_tokens,
+            "output_tokens": usage.output_tokens,
+            "cache_read_input_tokens": usage.cache_read_input_tokens or 0,
+            "cache_creation_input_tokens": usage.cache_creation_input_tokens or 0,
+        }
+        self.usage["requests"] += 1
+        for key, value in counts.items():
+            self.usage[key] += value
+        return counts
+
+    def _tool_params(self, tool_name: str, tool_schema: dict) -> dict:
+        return {
+            "tools": [{
+                "name": tool_name,
+                "description": f"Record the {tool_name} results",
+                "input_schema": tool_schema,
+            }],
+            "tool_choice": {"type": "tool", "name": tool_name},
+        }
+
+    def _to_response(self, message) -> LLMResponse:
+        usage = self._record_usage(message.usage)
 
         content = ""
-        for block in response.content:
+        for block in message.content:
             if block.type == "text":
                 content += block.text
 
         return LLMResponse(
             content=content,
-            input_tokens=response.usage.input_tokens,
-            output_tokens=response.usage.output_tokens,
-            model=response.model,
+            model=message.model,
+            stop_reason=message.stop_reason or "",
+            **usage,
         )
 
+    def _tool_input(self, message, tool_name: str, max_tokens: int) -> dict:
+        if message.stop_reason == "max_tokens":
+            raise TruncatedResponseError(f"{tool_name} output truncated at max_tokens={max_tokens}")
+
+        for block in message.content:
+            if block.type == "tool_use" and block.name == tool_name:
+                return block.input
+
+        raise ValueError(f"No tool use block found for {tool_name}")
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float | None:
+        if isinstance(error, anthropic.APIStatusError):
+            if error.status_code not in RETRYABLE_STATUS:
+                return None
+            return self.limiter.backoff(
+                attempt, retry_after(error.response.headers), throttled=error.status_code == 429
+            )
+        if isinstance(error, anthropic.APIConnectionError):
+            return self.limiter.backoff(attempt, None, throttled=False)
+        return None
+
+    async def _create(self, request: LLMRequest, kwargs: dict):
+        estimate = _estimate_input_tokens(kwargs)
+        for attempt in itertools.count():
+            reservation = await self.limiter.acquire(estimate, request.max_tokens)
+            try:
+                raw = await self.client.messages.with_raw_response.create(**kwargs)
+            except anthropic.APIError as e:
+                self.limiter.release(reservation)
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                self.limiter.release(reservation)
+                raise
+
+            message = raw.parse()
+            self.limiter.release(reservation, *_billed_tokens(message.usage))
+            self.limiter.observe(raw.headers)
+            return message
+
+    async def _retrying(self, call):
+        # Batch endpoints are not metered by tokens, but still get retried.
+        for attempt in itertools.count():
+            try:
+                return await call()
+            except anthropic.APIError as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+
+    async def complete(self, request: LLMRequest) -> LLMResponse:
+        response = await self._create(request, self._params(request))
+        return self._to_response(response)
+
     async def complete_structured(
         self,
         request: LLMRequest,
         tool_name: str,
         tool_schema: dict,
     ) -> dict:
-        tools = [{
-            "name": tool_name,
-            "description": f"Record the {tool_name} results",
-            "input_schema": tool_schema,
-        }]
+        kwargs = self._params(request, tool_name, tool_schema)
 
-        kwargs = {
-            "model": self.model,
-            "max_tokens": request.max_tokens,
-            "temperature": request.temperature,
-            "messages": [{"role": "user", "content": request.prompt}],
-            "tools": tools,
-            "tool_choice": {"type": "tool", "name": tool_name},
-        }
-        if request.system:
-            kwargs["system"] = request.system
+        response = await self._create(request, kwargs)
+        self._record_usage(response.usage)
+        return self._tool_input(response, tool_name, request.max_tokens)
 
-        response = await self.client.messages.create(**kwargs)
+    async def stream_structured(
+        self,
+        request: LLMRequest,
+        tool_name: str,
+        tool_schema: dict,
+        item_key: str,
+    ):
+        kwargs = self._params(request, tool_name, tool_schema)
 
-        for block in response.content:
-            if block.type == "tool_use" and block.name == tool_name:
-                return block.input
+        estimate = _estimate_input_tokens(kwargs)
+        for attempt in itertools.count():
+            parser = ArrayItemParser(item_key)
+            yielded = False
+            reservation = await self.limiter.acquire(estimate, request.max_tokens)
+            try:
+                async with self.client.messages.stream(**kwargs) as stream:
+                    self.limiter.observe(stream.response.headers)
+                    async for event in stream:
+                        if event.type == "content_block_delta" and event.delta.type == "input_json_delta":
+                            for item in parser.feed(event.delta.partial_json):
+                                yielded = True
+                                yield item
+                    message = await stream.get_final_message()
+                self.limiter.release(reservation, *_billed_tokens(message.usage))
+            except anthropic.APIError as e:
+                self.limiter.release(reservation)
+                # Items already handed to the caller cannot be taken back, so
+                # only a stream that failed before its first item is retried.
+                delay = None if yielded else self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            finally:
+                # Also covers a caller that stops consuming early.
+                self.limiter.release(reservation)
+            break
 
-        raise ValueError(f"No tool use block found for {tool_name}")
+        self._record_usage(message.usage)
+        if message.stop_reason == "max_tokens":
+            raise TruncatedResponseError(
+                f"{tool_name} output truncated at max_tokens={request.max_tokens}"
+            )
+
+    async def submit_batch(self, items: list[LLMBatchItem]) -> str:
+        requests = []
+        for item in items:
+            params = self._params(item.request, item.tool_name, item.tool_schema)
+            requests.append({"custom_id": item.custom_id, "params": params})
+
+        batch = await self._retrying(lambda: self.client.messages.batches.create(requests=requests))
+        return batch.id
+
+    async def batch_results(self, batch_id: str) -> list[LLMBatchResult] | None:
+        batch = await self._retrying(lambda: self.client.messages.batches.retrieve(batch_id))
+        if batch.processing_status != "ended":
+            return None
+
+        results = []
+        async for entry in await self._retrying(lambda: self.client.messages.batches.results(batch_id)):
+            if entry.result.type != "succeeded":
+                error = entry.result.type
+                if entry.result.type == "errored":
+                    error = f"errored: {entry.result.error.error.message}"
+                results.append(LLMBatchResult(custom_id=entry.custom_id, error=error))
+                continue
+
+            message = entry.result.message
+            response = self._to_response(message)
+            structured = None
+            for block in message.content:
+                if block.type == "tool_use":
+                    structured = block.input
+                    break
+            results.append(LLMBatchResult(
+                custom_id=entry.custom_id,
+                response=response,
+                structured=structured,
+                error="truncated" if response.stop_reason == "max_tokens" else None,
+            ))
+        return results
+
+    def stats(self) -> dict:
+        return {"usage": dict(self.usage), "rate_limit": self.limiter.stats()}
+
+
+def _estimate_input_tokens(kwargs: dict) -> int:
+    # Roughly four characters per token over everything that is sent; the
+    # estimate is corrected from the reported usage once the call returns.
+    chars = len(str(kwargs.get("system", ""))) + len(str(kwargs["messages"])) + len(str(kwargs.get("tools", "")))
+    return chars // 4 + 1
+
+
+def _billed_tokens(usage) -> tuple[int, int]:
+    # Cache reads do not count toward the input-token rate limit.
+    return usage.input_tokens + (usage.cache_creation_input_tokens or 0), usage.output_tokens
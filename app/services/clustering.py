@@ -0,0 +1,157 @@
+import math
+from collections import Counter
+from dataclasses import dataclass
+
+import numpy as np
+
+from app.services.dedup import words
+
+# TF-IDF rows are projected onto this many random directions (a
+# Johnson-Lindenstrauss sketch), so memory stays n * SKETCH_DIM however large
+# the vocabulary is.
+SKETCH_DIM = 128
+MAX_TERMS = 20000
+MAX_ITERATIONS = 30
+# Documents projected per step; bounds the temporary array.
+PROJECT_ROWS = 1024
+STOPWORDS = frozenset(
+    "a about after all also an and any are as at be been but by can could did do does for from had has "
+    "have he her him his how i if in into is it its just like may me more most my no not now of on one "
+    "only or other our out over same she so some such than that the their them then there these they "
+    "this those through to too up upon us very was we were what when where which while who whom why "
+    "will with would you your".split()
+)
+
+
+@dataclass
+class Cluster:
+    id: int
+    member_ids: list[int]
+    # Members closest to the centroid, best first.
+    example_ids: list[int]
+    keywords: list[str]
+    centroid: np.ndarray
+
+
+def tokens(text: str) -> list[str]:
+    return [w for w in words(text) if len(w) > 2 and w not in STOPWORDS and not w.isdigit()]
+
+
+def _tfidf(docs: list[str]) -> tuple[np.ndarray, np.ndarray, np.ndarray, list[str]]:
+    # Sparse L2-normalized TF-IDF as (row, column, weight) arrays, rows in
+    # document order.
+    counts = [Counter(tokens(doc)) for doc in docs]
+    df = Counter(term for c in counts for term in c)
+    n = len(docs)
+    # Terms seen once say nothing about similarity, and terms in most
+    # documents separate nothing; both limits only make sense for a corpus.
+    min_df, max_df = (2, 0.5 * n) if n > 50 else (1, n)
+    vocab = [t for t, f in df.most_common() if min_df <= f <= max_df][:MAX_TERMS]
+    index = {t: i for i, t in enumerate(vocab)}
+    idf = np.array([math.log((1 + n) / (1 + df[t])) + 1 for t in vocab], dtype=np.float32)
+
+    rows, cols, tf = [], [], []
+    for row, c in enumerate(counts):
+        for term, count in c.items():
+            col = index.get(term)
+            if col is not None:
+                rows.append(row)
+                cols.append(col)
+                tf.append(count)
+    rows = np.array(rows, dtype=np.int64)
+    cols = np.array(cols, dtype=np.int64)
+    weights = (1 + np.log(np.array(tf, dtype=np.float32))) * idf[cols]
+    norms = np.sqrt(np.bincount(rows, weights=weights ** 2, minlength=n))
+    weights /= norms[rows]
+    return rows, cols, weights.astype(np.float32), vocab
+
+
+def _sketch(n: int, rows, cols, weights, vocab_size: int, rng: np.random.Generator) -> np.ndarray:
+    projection = rng.standard_normal((vocab_size, SKETCH_DIM), dtype=np.float32)
+    x = np.zeros((n, SKETCH_DIM), dtype=np.float32)
+    # rows is sorted, so each document's entries are one contiguous run.
+    indptr = np.searchsorted(rows, np.arange(n + 1))
+    for start in range(0, n, PROJECT_ROWS):
+        stop = min(n, start + PROJECT_ROWS)
+        lo, hi = indptr[start], indptr[stop]
+        if lo == hi:
+            continue
+        contrib = weights[lo:hi, None] * projection[cols[lo:hi]]
+        # Documents without terms have empty runs and keep a zero row.
+        docs = start + np.flatnonzero(indptr[start + 1:stop + 1] > indptr[start:stop])
+        x[docs] = np.add.reduceat(contrib, indptr[docs] - lo, axis=0)
+    return _normalize(x)
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / np.where(norms == 0, 1, norms)
+
+
+def _kmeans(x: np.ndarray, k: int, rng: np.random.Generator) -> np.ndarray:
+    # Spherical k-means (cosine similarity on unit rows), k-means++ seeding.
+    n = len(x)
+    centroids = np.empty((k, x.shape[1]), dtype=np.float32)
+    centroids[0] = x[rng.integers(n)]
+    distance = 1 - x @ centroids[0]
+    for i in range(1, k):
+        p = np.clip(distance, 0, None)
+        total = p.sum()
+        centroids[i] = x[rng.choice(n, p=p / total) if total > 0 else rng.integers(n)]
+        distance = np.minimum(distance, 1 - x @ centroids[i])
+
+    labels = np.full(n, -1)
+    for _ in range(MAX_ITERATIONS):
+        similarity = x @ centroids.T
+        new_labels = similarity.argmax(axis=1)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        assignment = np.zeros((k, n), dtype=np.float32)
+        assignment[labels, np.arange(n)] = 1
+        sums = assignment @ x
+        empty = np.flatnonzero(np.bincount(labels, minlength=k) == 0)
+        if len(empty):
+            # An emptied cluster restarts at a point its centroid fits worst.
+            worst = np.argsort(similarity[np.arange(n), labels])[:len(empty)]
+            sums[empty] = x[worst]
+        centroids = _normalize(sums)
+    return labels
+
+
+def cluster(docs: list[tuple[int, str]], k: int, examples: int = 3, keywords: int = 6) -> list[Cluster]:
+    # Groups similar documents into at most k clusters, largest first. CPU
+    # only and deterministic for the same input.
+    if not docs:
+        return []
+    ids = [doc_id for doc_id, _ in docs]
+    rng = np.random.default_rng(0)
+    rows, cols, weights, vocab = _tfidf([text for _, text in docs])
+    x = _sketch(len(docs), rows, cols, weights, len(vocab), rng)
+    k = max(1, min(k, len(docs)))
+    labels = _kmeans(x, k, rng)
+
+    # Summed TF-IDF weight of each term per cluster, for the keyword lists.
+    term_weight = np.bincount(
+        labels[rows] * len(vocab) + cols, weights=weights, minlength=k * len(vocab)
+    ).reshape(k, len(vocab)) if vocab else np.zeros((k, 0))
+
+    clusters = []
+    for label in range(k):
+        members = np.flatnonzero(labels == label)
+        if not len(members):
+            continue
+        centroid = _normalize(x[members].sum(axis=0, keepdims=True))[0]
+        closest = members[np.argsort(-(x[members] @ centroid), kind="stable")[:examples]]
+        top_terms = np.argsort(-term_weight[label], kind="stable")[:keywords]
+        clusters.append(Cluster(
+            id=0,
+            member_ids=[ids[i] for i in members],
+            example_ids=[ids[i] for i in closest],
+            keywords=[vocab[t] for t in top_terms if term_weight[label, t] > 0],
+            centroid=centroid,
+        ))
+    clusters.sort(key=lambda c: -len(c.member_ids))
+    for i, c in enumerate(clusters, start=1):
+        c.id = i
+    return clusters
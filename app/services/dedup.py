@@ -0,0 +1,183 @@
+import zlib
+from itertools import combinations
+
+import numpy as np
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.metaphor import Metaphor
+from app.services.quote_index import CHAR_MAP
+
+NUM_PERM = 128
+SHINGLE_WORDS = 3
+PRIME = (1 << 31) - 1
+# SQLite caps bound parameters per statement; stay well below it.
+ID_CHUNK = 500
+
+_rng = np.random.default_rng(1)
+_A = _rng.integers(1, PRIME, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, PRIME, NUM_PERM, dtype=np.uint64)
+
+# Same folding as quote matching, but as one str.translate so tokenizing tens
+# of thousands of rows stays cheap; dashes and punctuation separate words.
+_SEPARATORS = "-\"'.,;:!?()[]…"
+_FOLD = str.maketrans({
+    **{k: (" " if v in _SEPARATORS else v) for k, v in CHAR_MAP.items()},
+    **{ch: " " for ch in _SEPARATORS},
+})
+
+
+def words(text: str) -> list[str]:
+    return text.lower().translate(_FOLD).split()
+
+
+def shingles(text: str) -> set[int]:
+    tokens = words(text)
+    if len(tokens) <= SHINGLE_WORDS:
+        return {zlib.crc32(" ".join(tokens).encode("utf-8"))} if tokens else set()
+    return {
+        zlib.crc32(" ".join(tokens[i:i + SHINGLE_WORDS]).encode("utf-8"))
+        for i in range(len(tokens) - SHINGLE_WORDS + 1)
+    }
+
+
+def signature(hashes: set[int]) -> np.ndarray:
+    # Values are 32-bit and coefficients < 2^31, so a * x + b fits in uint64.
+    x = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+    return ((_A[:, None] * x[None, :] + _B[:, None]) % PRIME).min(axis=1)
+
+
+def _bands_for(threshold: float) -> tuple[int, int]:
+    # Pick the band layout whose S-curve midpoint (1/b)^(1/r) is closest to
+    # the requested similarity threshold.
+    options = [(NUM_PERM // r, r) for r in range(1, NUM_PERM + 1) if NUM_PERM % r == 0]
+    return min(options, key=lambda br: abs((1 / br[0]) ** (1 / br[1]) - threshold))
+
+
+def find_clusters(docs: list[tuple[int, str]], threshold: float) -> list[list[int]]:
+    ids, sets, signatures = [], [], []
+    for doc_id, text in docs:
+        s = shingles(text)
+        if s:
+            ids.append(doc_id)
+            sets.append(s)
+            signatures.append(signature(s))
+    if not ids:
+        return []
+
+    # Aim the LSH curve below the threshold: extra candidates only cost an
+    # exact Jaccard check, while a missed pair is a duplicate left behind.
+    bands, rows = _bands_for(threshold * 0.8)
+    matrix = np.vstack(signatures)
+    parent = list(range(len(ids)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    checked: set[tuple[int, int]] = set()
+    for band in range(bands):
+        buckets: dict[bytes, list[int]] = {}
+        for i, key in enumerate(matrix[:, band * rows:(band + 1) * rows]):
+            buckets.setdefault(key.tobytes(), []).append(i)
+
+        for members in buckets.values():
+            # Every pair in a bucket is a candidate; pairs without the first
+            # member can be similar even when neither matches it. Only LSH
+            # candidates reach the exact Jaccard check, which is what keeps
+            # the whole pass sub-quadratic.
+            for i, j in combinations(members, 2):
+                ri, rj = find(i), find(j)
+                if ri == rj or (i, j) in checked:
+                    continue
+                checked.add((i, j))
+                jaccard = len(sets[i] & sets[j]) / len(sets[i] | sets[j])
+                if jaccard >= threshold:
+                    parent[rj] = ri
+
+    groups: dict[int, list[int]] = {}
+    for i in range(len(ids)):
+        groups.setdefault(find(i), []).append(ids[i])
+    return [sorted(g) for g in groups.values() if len(g) > 1]
+
+
+def _keeper_rank(row) -> tuple:
+    # Prefer the row the user has already curated, then the most confident.
+    curated = bool(row.user_notes) or row.topic_id is not None
+    return (curated, bool(row.selected), row.confidence or 0.0, -row.id)
+
+
+async def deduplicate(
+    db: AsyncSession,
+    threshold: float = 0.7,
+    action: str = "deselect",
+    dry_run: bool = True,
+    chapter_id: int | None = None,
+    selected_only: bool = False,
+) -> dict:
+    query = select(
+        Metaphor.id, Metaphor.exact_quote, Metaphor.meaning, Metaphor.selected,
+        Metaphor.user_notes, Metaphor.topic_id, Metaphor.subtopic_id, Metaphor.confidence,
+    )
+    if chapter_id is not None:
+        query = query.where(Metaphor.chapter_id == chapter_id)
+    if selected_only:
+        query = query.where(Metaphor.selected == True)
+    rows = {row.id: row for row in (await db.execute(query)).all()}
+
+    clusters = find_clusters(
+        [(row.id, f"{row.exact_quote} {row.meaning}") for row in rows.values()], threshold
+    )
+
+    report = []
+    for cluster in clusters:
+        keeper = max((rows[i] for i in cluster), key=_keeper_rank)
+        report.append({
+            "keep_id": keeper.id,
+            "duplicate_ids": [i for i in cluster if i != keeper.id],
+            "quote": keeper.exact_quote,
+        })
+
+    duplicate_ids = [i for entry in report for i in entry["duplicate_ids"]]
+    if not dry_run and duplicate_ids:
+        if action == "merge":
+            for entry in report:
+                await _merge_into(db, rows[entry["keep_id"]], [rows[i] for i in entry["duplicate_ids"]])
+            for start in range(0, len(duplicate_ids), ID_CHUNK):
+                chunk = duplicate_ids[start:start + ID_CHUNK]
+                await db.execute(delete(Metaphor).where(Metaphor.id.in_(chunk)))
+        else:
+            for start in range(0, len(duplicate_ids), ID_CHUNK):
+                chunk = duplicate_ids[start:start + ID_CHUNK]
+                await db.execute(update(Metaphor).where(Metaphor.id.in_(chunk)).values(selected=False))
+        await db.commit()
+
+    return {
+        "dry_run": dry_run,
+        "action": action,
+        "scanned": len(rows),
+        "clusters": len(report),
+        "duplicates": len(duplicate_ids),
+        "groups": report,
+    }
+
+
+async def _merge_into(db: AsyncSession, keeper, duplicates: list):
+    group = [keeper, *duplicates]
+    notes = []
+    for row in group:
+        if row.user_notes and row.user_notes not in notes:
+            notes.append(row.user_notes)
+    curated = next((row for row in group if row.topic_id is not None), keeper)
+
+    await db.execute(
+        update(Metaphor).where(Metaphor.id == keeper.id).values(
+            selected=any(row.selected for row in group),
+            user_notes="\n\n".join(notes) or None,
+            topic_id=curated.topic_id,
+            subtopic_id=curated.subtopic_id,
+            confidence=max(row.confidence or 0.0 for row in group),
+        )
+    )
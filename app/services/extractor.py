@@ -1,17 +1,34 @@
-from sqlalchemy import select, func
+import asyncio
+import hashlib
+import json
+import logging
+import re
+
+from sqlalchemy import delete, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import settings
+from app.models.database import async_session
 from app.models.metaphor import Chapter, Metaphor
-from app.schemas.llm import LLMRequest
-from app.services.llm_provider import get_provider
+from app.schemas.llm import LLMBatchItem, LLMBatchResult, LLMRequest
+from app.services import read_models
+from app.services.chapter_text import load_text, load_texts
+from app.services.llm_provider import StreamingProvider, TruncatedResponseError, get_provider
 from app.services.prompt_guard import sanitize_book_text
+from app.services.quote_index import QUOTE_EDGES, apply_location, load_index, normalize
+
+logger = logging.getLogger(__name__)
 
 SYSTEM_PROMPT = """You are a literary scholar specializing in American modernist literature \
 and F. Scott Fitzgerald. You identify metaphors with academic precision, considering the \
 historical context of 1920s America, the Jazz Age, and the novel's themes of the American \
 Dream, class, and moral decay."""
 
-EXTRACTION_PROMPT = """Analyze Chapter {number} of The Great Gatsby below. Extract every metaphor, including:
+# Kept free of per-chapter values. Even with the tool and system prompt it is
+# well below the minimum cacheable prompt length, and each window's text
+# differs, so extraction requests are not marked for prompt caching.
+EXTRACTION_INSTRUCTIONS = """Analyze the chapter of The Great Gatsby that follows these instructions. \
+Extract every metaphor, including:
 - Similes, extended metaphors, implied metaphors, symbolic imagery
 - Both obvious and subtle figurative language
 - Personification, metonymy, synecdoche where they function metaphorically
@@ -27,9 +44,9 @@ Known metaphor systems (use as guidance, not constraint — identify new systems
 - Nature Perverted: Valley of Ashes, corrupted natural imagery
 
 Be thorough. Include every instance even if the same metaphor system appears multiple times.
-Academic rigor matters — quote the exact text.
+Academic rigor matters — quote the exact text."""
 
-Chapter {number} text:
+EXTRACTION_PROMPT = """Chapter {number} text:
 ---
 {text}
 ---"""
@@ -70,57 +87,429 @@ TOOL_SCHEMA = {
     "required": ["metaphors"],
 }
 
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+|(?<=[.!?][\"'”’)])\s+")
 
-async def extract_chapter(db: AsyncSession, chapter: Chapter) -> list[Metaphor]:
-    sanitized_text = sanitize_book_text(chapter.text)
-    prompt = EXTRACTION_PROMPT.format(number=chapter.number, text=sanitized_text)
 
-    provider = get_provider()
-    result = await provider.complete_structured(
-        LLMRequest(system=SYSTEM_PROMPT, prompt=prompt, max_tokens=8192, temperature=0.2),
-        tool_name="record_metaphors",
-        tool_schema=TOOL_SCHEMA,
+def split_windows(text: str, window_words: int, overlap_words: int) -> list[str]:
+    paragraphs = [p.strip() for p in PARAGRAPH_BREAK.split(text) if p.strip()]
+    counts = [len(p.split()) for p in paragraphs]
+    if window_words <= 0 or sum(counts) <= window_words:
+        return [text]
+
+    windows = []
+    start = 0
+    while start < len(paragraphs):
+        end, words = start, 0
+        while end < len(paragraphs) and (end == start or words + counts[end] <= window_words):
+            words += counts[end]
+            end += 1
+        windows.append("\n\n".join(paragraphs[start:end]))
+        if end == len(paragraphs):
+            break
+
+        # Step back whole paragraphs so each window re-reads the tail of the
+        # previous one; metaphors straddling a boundary are then seen intact.
+        next_start, overlap = end, 0
+        while next_start - 1 > start and overlap < overlap_words:
+            next_start -= 1
+            overlap += counts[next_start]
+        start = next_start
+
+    return windows
+
+
+def halve_window(text: str) -> list[str]:
+    # Splits a window whose output was truncated. Paragraphs first; one long
+    # paragraph falls back to sentences, and a single run-on sentence to words.
+    # [text] only when there is nothing left to split.
+    total = len(text.split())
+    overlap = min(settings.extraction_window_overlap // 2, total // 4)
+    halves = split_windows(text, total // 2, overlap)
+    if len(halves) > 1:
+        return halves
+    sentences = [s for s in SENTENCE_END.split(text.strip()) if s]
+    if len(sentences) > 1:
+        return split_windows("\n\n".join(sentences), total // 2, overlap)
+    tokens = text.split()
+    if len(tokens) < 2:
+        return [text]
+    middle, reach = len(tokens) // 2, overlap // 2
+    return [" ".join(tokens[:middle + reach]), " ".join(tokens[middle - reach:])]
+
+
+def _quote_key(quote: str) -> str:
+    return normalize(quote)[0].strip(QUOTE_EDGES)
+
+
+def extraction_version() -> str:
+    # Anything that changes what extraction would produce for the same text.
+    parts = [
+        settings.claude_model,
+        SYSTEM_PROMPT,
+        EXTRACTION_INSTRUCTIONS,
+        EXTRACTION_PROMPT,
+        json.dumps(TOOL_SCHEMA, sort_keys=True),
+        str(settings.extraction_window_words),
+        str(settings.extraction_window_overlap),
+    ]
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(sanitize_book_text(text).encode("utf-8")).hexdigest()
+
+
+def is_stale(chapter: Chapter, version: str, text: str) -> bool:
+    return (
+        not chapter.processed
+        or chapter.extraction_version != version
+        or chapter.content_hash != content_hash(text)
     )
 
-    metaphors = []
-    for item in result.get("metaphors", []):
-        m = Metaphor(
-            chapter_id=chapter.id,
-            exact_quote=item["exact_quote"],
-            explanation=item["explanation"],
-            meaning=item["meaning"],
-            confidence=item.get("confidence", 0.0),
-            suggested_topic=item.get("suggested_topic", ""),
-            selected=True,
+
+def merge_windows(results: list[list[dict]]) -> list[dict]:
+    merged: dict[str, dict] = {}
+    for items in results:
+        for item in items:
+            key = _quote_key(item.get("exact_quote", ""))
+            if not key:
+                continue
+            existing = merged.get(key)
+            if existing is None or item.get("confidence", 0.0) > existing.get("confidence", 0.0):
+                merged[key] = item
+    return list(merged.values())
+
+
+def _window_request(number: str, text: str) -> LLMRequest:
+    return LLMRequest(
+        system=SYSTEM_PROMPT,
+        prefix=EXTRACTION_INSTRUCTIONS,
+        prompt=EXTRACTION_PROMPT.format(number=number, text=text),
+        max_tokens=8192,
+        temperature=0.2,
+    )
+
+
+def _chapter_windows(number: str, text: str) -> list[tuple[str, str]]:
+    sanitized_text = sanitize_book_text(text)
+    windows = split_windows(
+        sanitized_text, settings.extraction_window_words, settings.extraction_window_overlap
+    )
+    if len(windows) == 1:
+        return [(number, sanitized_text)]
+    return [
+        (f"{number} (part {i} of {len(windows)})", window)
+        for i, window in enumerate(windows, 1)
+    ]
+
+
+async def _extract_window(number: str, text: str) -> list[dict]:
+    provider = get_provider()
+    try:
+        result = await provider.complete_structured(
+            _window_request(number, text),
+            tool_name="record_metaphors",
+            tool_schema=TOOL_SCHEMA,
         )
-        db.add(m)
-        metaphors.append(m)
+    except TruncatedResponseError:
+        # The tool call ran out of output tokens; halve the window and retry
+        # both sides rather than keep a partial list.
+        halves = halve_window(text)
+        if len(halves) < 2:
+            raise
+        logger.info("Chapter %s output truncated, re-splitting into %d windows", number, len(halves))
+        parts = await asyncio.gather(*(_extract_window(number, half) for half in halves))
+        return merge_windows(parts)
+    return result.get("metaphors", [])
 
-    chapter.processed = True
-    await db.commit()
 
-    return metaphors
+async def _stream_window(number: str, text: str, emit):
+    provider = get_provider()
+    try:
+        async for item in provider.stream_structured(
+            _window_request(number, text),
+            tool_name="record_metaphors",
+            tool_schema=TOOL_SCHEMA,
+            item_key="metaphors",
+        ):
+            await emit(item)
+    except TruncatedResponseError:
+        # Items that closed before the cut-off are already stored; the halves
+        # re-find them and upsert keeps the more confident copy.
+        halves = halve_window(text)
+        if len(halves) < 2:
+            raise
+        logger.info("Chapter %s output truncated, re-splitting into %d windows", number, len(halves))
+        await asyncio.gather(*(_stream_window(number, half, emit) for half in halves))
 
 
-async def extract_all(db: AsyncSession):
-    chapters = await db.execute(
+class _ChapterSync:
+    # Reconciles extracted items with a chapter's existing rows. Rows whose
+    # quote survives a re-run are updated in place so the user's selection,
+    # notes and topic assignments carry over; the rest are replaced.
+
+    def __init__(self, db: AsyncSession, chapter: Chapter, text: str):
+        self.db = db
+        self.chapter = chapter
+        self.text = text
+        self.metaphors: list[Metaphor] = []
+        self.created: list[Metaphor] = []
+        self._items: dict[str, dict] = {}
+        self._rows: dict[str, Metaphor] = {}
+        self._deferred: set[str] = set()
+
+    async def load(self):
+        self.text_hash = content_hash(self.text)
+        self.index = await load_index(
+            self.db, self.chapter, rebuild=self.text_hash != self.chapter.content_hash, text=self.text
+        )
+        result = await self.db.execute(
+            select(Metaphor).where(Metaphor.chapter_id == self.chapter.id).order_by(Metaphor.id)
+        )
+        self.existing: dict[str, Metaphor] = {}
+        self.leftovers: list[Metaphor] = []
+        for m in result.scalars().all():
+            key = _quote_key(m.exact_quote)
+            if key in self.existing:
+                self.leftovers.append(m)
+            else:
+                self.existing[key] = m
+
+    def _fill(self, m: Metaphor, item: dict) -> Metaphor:
+        m.exact_quote = item["exact_quote"]
+        m.explanation = item["explanation"]
+        m.meaning = item["meaning"]
+        m.confidence = item.get("confidence", 0.0)
+        m.suggested_topic = item.get("suggested_topic", "")
+        apply_location(m, self.index)
+        return m
+
+    def upsert(self, item: dict) -> Metaphor | None:
+        # Returns the metaphor for a quote seen for the first time. A repeat
+        # (overlapping windows, re-split halves) replaces it only when more
+        # confident, the same rule as merge_windows.
+        key = _quote_key(item["exact_quote"])
+        if not key:
+            return None
+        current = self._items.get(key)
+        if current is not None and item.get("confidence", 0.0) <= current.get("confidence", 0.0):
+            return None
+        self._items[key] = item
+        if current is not None:
+            if key not in self._deferred:
+                self._fill(self._rows[key], item)
+            return None
+
+        m = self.existing.pop(key, None)
+        if m is None:
+            m = Metaphor(chapter_id=self.chapter.id, selected=True)
+            self.db.add(m)
+            self.created.append(m)
+            view = self._fill(m, item)
+        else:
+            # Existing rows keep their committed values until finish(), so a
+            # run that fails part way leaves them exactly as they were. The
+            # caller gets an unsaved copy carrying the new values.
+            self._deferred.add(key)
+            view = self._fill(Metaphor(id=m.id, chapter_id=m.chapter_id, selected=m.selected), item)
+        self._rows[key] = m
+        self.metaphors.append(m)
+        return view
+
+    async def finish(self) -> list[Metaphor]:
+        for key in self._deferred:
+            self._fill(self._rows[key], self._items[key])
+        for stale in [*self.existing.values(), *self.leftovers]:
+            await self.db.delete(stale)
+
+        self.chapter.processed = True
+        self.chapter.content_hash = self.text_hash
+        self.chapter.extraction_version = extraction_version()
+        await self.db.commit()
+        return self.metaphors
+
+
+async def _store_metaphors(db: AsyncSession, chapter: Chapter, text: str, items: list[dict]) -> list[Metaphor]:
+    sync = _ChapterSync(db, chapter, text)
+    await sync.load()
+    for item in items:
+        sync.upsert(item)
+    return await sync.finish()
+
+
+async def _stream_chapter(db: AsyncSession, chapter: Chapter, text: str, on_metaphor=None) -> list[Metaphor]:
+    sync = _ChapterSync(db, chapter, text)
+    await sync.load()
+    lock = asyncio.Lock()
+
+    async def emit(item: dict):
+        # Windows stream concurrently but share one session.
+        async with lock:
+            m = sync.upsert(item)
+            if m is None:
+                return
+            await db.commit()
+        if on_metaphor:
+            await on_metaphor(m)
+
+    try:
+        async with asyncio.TaskGroup() as tg:
+            for number, window in _chapter_windows(chapter.number, text):
+                tg.create_task(_stream_window(number, window, emit))
+    except BaseException:
+        # New rows were committed as they arrived; remove them again. Updates
+        # to existing rows are only applied in finish(), so together a failed
+        # chapter leaves nothing half-extracted behind.
+        created_ids = [m.id for m in sync.created if m.id is not None]
+        await db.rollback()
+        if created_ids:
+            await db.execute(delete(Metaphor).where(Metaphor.id.in_(created_ids)))
+            await db.commit()
+        raise
+
+    return await sync.finish()
+
+
+async def extract_chapter(db: AsyncSession, chapter: Chapter, on_metaphor=None) -> list[Metaphor]:
+    text = await load_text(db, chapter.id)
+    if settings.extraction_streaming and isinstance(get_provider(), StreamingProvider):
+        return await _stream_chapter(db, chapter, text, on_metaphor)
+
+    windows = _chapter_windows(chapter.number, text)
+    if len(windows) == 1:
+        items = await _extract_window(*windows[0])
+    else:
+        parts = await asyncio.gather(*(_extract_window(number, window) for number, window in windows))
+        items = merge_windows(parts)
+
+    return await _store_metaphors(db, chapter, text, items)
+
+
+async def build_batch(db: AsyncSession, exclude: set[int]) -> tuple[list[LLMBatchItem], dict]:
+    result = await db.execute(
         select(Chapter).where(Chapter.processed == False).order_by(Chapter.id)
     )
-    for chapter in chapters.scalars().all():
-        yield chapter.number, "processing"
-        await extract_chapter(db, chapter)
-        yield chapter.number, "complete"
+    chapters = [c for c in result.scalars().all() if c.id not in exclude]
+    texts = await load_texts(db, [c.id for c in chapters])
+    items, targets = [], {}
+    for chapter in chapters:
+        for i, (number, text) in enumerate(_chapter_windows(chapter.number, texts.get(chapter.id, ""))):
+            custom_id = f"ch{chapter.id}-w{i}"
+            items.append(LLMBatchItem(
+                custom_id=custom_id,
+                request=_window_request(number, text),
+                tool_name="record_metaphors",
+                tool_schema=TOOL_SCHEMA,
+            ))
+            targets[custom_id] = chapter.id
+    return items, targets
 
 
-async def get_extraction_stats(db: AsyncSession) -> dict:
-    total_chapters = await db.execute(select(func.count(Chapter.id)))
-    processed = await db.execute(
-        select(func.count(Chapter.id)).where(Chapter.processed == True)
-    )
-    total_metaphors = await db.execute(select(func.count(Metaphor.id)))
+async def store_batch_results(db: AsyncSession, targets: dict, results: list[LLMBatchResult]) -> list[str]:
+    by_chapter: dict[int, list[LLMBatchResult]] = {}
+    for r in results:
+        if r.custom_id in targets:
+            by_chapter.setdefault(targets[r.custom_id], []).append(r)
+
+    errors = []
+    for chapter_id, chapter_results in by_chapter.items():
+        chapter = await db.get(Chapter, chapter_id)
+        if chapter is None or chapter.processed:
+            continue
+        # A failed or truncated window leaves the whole chapter unprocessed so
+        # the next interactive run picks it up (and can re-split the window).
+        failed = [r for r in chapter_results if r.error or r.structured is None]
+        if failed:
+            errors.extend(f"{r.custom_id}: {r.error or 'missing tool output'}" for r in failed)
+            continue
+        if len(chapter_results) < sum(1 for t in targets.values() if t == chapter_id):
+            errors.append(f"chapter {chapter_id}: missing window results")
+            continue
+        items = merge_windows([r.structured.get("metaphors", []) for r in chapter_results])
+        await _store_metaphors(db, chapter, await load_text(db, chapter.id), items)
+    return errors
 
+
+def metaphor_event(m: Metaphor) -> dict:
     return {
-        "total_chapters": total_chapters.scalar() or 0,
-        "processed_chapters": processed.scalar() or 0,
-        "total_metaphors": total_metaphors.scalar() or 0,
+        "id": m.id,
+        "chapter_id": m.chapter_id,
+        "exact_quote": m.exact_quote,
+        "explanation": m.explanation,
+        "meaning": m.meaning,
+        "suggested_topic": m.suggested_topic,
+        "confidence": m.confidence,
+        "quote_verified": bool(m.quote_verified),
     }
+
+
+async def _extract_in_session(chapter_id: int, on_metaphor=None):
+    # AsyncSession is not safe for concurrent use, so every chapter gets its own
+    # session; a failure rolls back only that chapter's metaphors.
+    async with async_session() as db:
+        chapter = await db.get(Chapter, chapter_id)
+        await extract_chapter(db, chapter, on_metaphor)
+
+
+async def _run_chapters(pending: list[tuple[int, str]]):
+    if not pending:
+        return
+
+    semaphore = asyncio.Semaphore(max(1, settings.extraction_concurrency))
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def run(chapter_id: int, number: str):
+        async def on_metaphor(m: Metaphor):
+            await events.put((number, "metaphor", metaphor_event(m)))
+
+        async with semaphore:
+            await events.put((number, "processing", None))
+            try:
+                await _extract_in_session(chapter_id, on_metaphor)
+            except Exception:
+                logger.exception("Extraction failed for chapter %s", number)
+                await events.put((number, "error", None))
+            else:
+                await events.put((number, "complete", None))
+
+    tasks = [asyncio.create_task(run(chapter_id, number)) for chapter_id, number in pending]
+    try:
+        finished = 0
+        while finished < len(tasks):
+            number, status, data = await events.get()
+            if status in ("complete", "error"):
+                finished += 1
+            yield number, status, data
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def extract_all(db: AsyncSession):
+    result = await db.execute(
+        select(Chapter.id, Chapter.number).where(Chapter.processed == False).order_by(Chapter.id)
+    )
+    async for event in _run_chapters([tuple(row) for row in result.all()]):
+        yield event
+
+
+async def stale_chapters(db: AsyncSession) -> list[Chapter]:
+    version = extraction_version()
+    result = await db.execute(select(Chapter).order_by(Chapter.id))
+    chapters = result.scalars().all()
+    # Only chapters that look current need their text hashed.
+    current = [c for c in chapters if c.processed and c.extraction_version == version]
+    texts = await load_texts(db, [c.id for c in current])
+    return [c for c in chapters if is_stale(c, version, texts.get(c.id, ""))]
+
+
+async def reextract_stale(db: AsyncSession):
+    stale = await stale_chapters(db)
+    async for event in _run_chapters([(c.id, c.number) for c in stale]):
+        yield event
+
+
+async def get_extraction_stats(db: AsyncSession) -> dict:
+    return await read_models.extraction_stats.get(db)
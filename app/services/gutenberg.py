@@ -1,87 +1,260 @@
+import asyncio
+import gzip
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
 import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 
 import httpx
-from sqlalchemy import select
+from sqlalchemy import delete, insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import settings
-from app.models.metaphor import Chapter
+from app.models.metaphor import Book, Chapter, ChapterText, Metaphor
+from app.services.chapter_text import store_bodies
+from app.services.dedup import ID_CHUNK
+from app.services.quote_index import QuoteIndex
+from app.services.segmenter import iter_chapters, iter_lines
 
+logger = logging.getLogger(__name__)
 
-# Match centered Roman numerals (chapter markers in Gutenberg text)
-# The text has lines like "                                  I\r" (lots of leading spaces)
-CHAPTER_PATTERN = re.compile(
-    r"^\s{20,}(I{1,3}|IV|V|VI{1,3}|IX)\s*$",
-    re.MULTILINE,
-)
+GUTENBERG_ID = re.compile(r"/(?:ebooks|files|cache/epub)/(\d+)")
+HEADER_FIELD = re.compile(r"^(Title|Author):\s*(.+)$", re.MULTILINE)
+HEADER_BYTES = 5000
 
-ROMAN_TO_INT = {
-    "I": 1, "II": 2, "III": 3, "IV": 4, "V": 5,
-    "VI": 6, "VII": 7, "VIII": 8, "IX": 9,
-}
 
+class SourceCache:
+    # Downloaded sources are kept gzipped on disk next to a small JSON file
+    # holding their HTTP validators and hash. Within `ttl` a cached source is
+    # used without any request; after that it is revalidated conditionally.
 
-async def fetch_text() -> str:
-    async with httpx.AsyncClient(follow_redirects=True) as client:
-        resp = await client.get(settings.gutenberg_url, timeout=30)
+    def __init__(self, root: str | Path, ttl: float):
+        self.root = Path(root)
+        self.ttl = ttl
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def text_path(self, book_id: int) -> Path:
+        return self.root / f"{book_id}.txt.gz"
+
+    def _meta_path(self, book_id: int) -> Path:
+        return self.root / f"{book_id}.json"
+
+    def meta(self, book_id: int) -> dict | None:
+        path = self._meta_path(book_id)
+        if not path.exists() or not self.text_path(book_id).exists():
+            return None
+        return json.loads(path.read_text())
+
+    def write_meta(self, book_id: int, meta: dict):
+        self._meta_path(book_id).write_text(json.dumps(meta))
+
+    def is_fresh(self, meta: dict) -> bool:
+        return time.time() - meta.get("checked_at", 0) < self.ttl
+
+
+def source_url(book_id: int) -> str:
+    if book_id == default_book_id():
+        return settings.gutenberg_url
+    return settings.gutenberg_url_template.format(id=book_id)
+
+
+def default_book_id() -> int:
+    match = GUTENBERG_ID.search(settings.gutenberg_url)
+    return int(match.group(1)) if match else 0
+
+
+async def download(
+    client: httpx.AsyncClient, cache: SourceCache, book_id: int, url: str, refresh: bool = False
+) -> dict:
+    meta = cache.meta(book_id)
+    if meta and meta.get("url") == url and not refresh and cache.is_fresh(meta):
+        return meta
+
+    headers = {}
+    if meta and meta.get("url") == url:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    async with client.stream("GET", url, headers=headers) as resp:
+        if resp.status_code == 304 and meta:
+            meta["checked_at"] = time.time()
+            cache.write_meta(book_id, meta)
+            return meta
         resp.raise_for_status()
-    # Normalize line endings
-    return resp.text.replace('\r\n', '\n').replace('\r', '\n')
 
+        # Stream straight into the compressed cache file; the body is never
+        # held in memory as a whole.
+        digest = hashlib.sha256()
+        target = cache.text_path(book_id)
+        partial = target.with_name(target.name + ".part")
+        with gzip.open(partial, "wb", compresslevel=6) as f:
+            async for chunk in resp.aiter_bytes():
+                digest.update(chunk)
+                f.write(chunk)
+        os.replace(partial, target)
 
-def parse_chapters(text: str) -> list[dict]:
-    # Strip Gutenberg header/footer
-    start_markers = ["*** START OF THE PROJECT GUTENBERG EBOOK", "***START OF"]
-    end_markers = ["*** END OF THE PROJECT GUTENBERG EBOOK", "***END OF"]
-
-    body = text
-    for marker in start_markers:
-        if marker in body:
-            body = body.split(marker, 1)[1]
-            break
-    for marker in end_markers:
-        if marker in body:
-            body = body.rsplit(marker, 1)[0]
-            break
-
-    splits = CHAPTER_PATTERN.split(body)
-    chapters = []
+        meta = {
+            "url": url,
+            "etag": resp.headers.get("etag"),
+            "last_modified": resp.headers.get("last-modified"),
+            "sha256": digest.hexdigest(),
+            "checked_at": time.time(),
+        }
+    cache.write_meta(book_id, meta)
+    return meta
 
-    # splits alternates: [pre-text, "I", ch1_text, "II", ch2_text, ...]
-    i = 1
-    while i < len(splits) - 1:
-        roman = splits[i].strip()
-        chapter_text = splits[i + 1].strip()
-        if roman in ROMAN_TO_INT and chapter_text:
-            chapters.append({
-                "id": ROMAN_TO_INT[roman],
-                "number": roman,
-                "title": f"Chapter {roman}",
-                "text": chapter_text,
-                "word_count": len(chapter_text.split()),
-            })
-        i += 2
-
-    return chapters
-
-
-async def ingest(db: AsyncSession) -> list[Chapter]:
-    existing = await db.execute(select(Chapter))
-    if existing.scalars().first():
-        result = await db.execute(select(Chapter).order_by(Chapter.id))
-        return list(result.scalars().all())
-
-    raw_text = await fetch_text()
-    parsed = parse_chapters(raw_text)
+
+def header_fields(head: bytes) -> dict:
+    fields = {}
+    text = head.decode("utf-8", errors="replace").replace("\r\n", "\n")
+    for key, value in HEADER_FIELD.findall(text):
+        fields.setdefault(key.lower(), value.strip())
+    return fields
+
+
+def prepare_chapters(head: bytes, lines, reader) -> dict:
+    # CPU-bound part of ingestion (split, index, compress); callers run it in
+    # worker processes so several books are parsed in parallel.
+    fields = header_fields(head)
     chapters = []
+    for ch in iter_chapters(lines, reader):
+        text = ch.pop("text")
+        ch["quote_index"] = QuoteIndex.build(text).to_bytes()
+        ch["body"] = ChapterText.pack(text)
+        chapters.append(ch)
+    return {"title": fields.get("title", ""), "author": fields.get("author", ""), "chapters": chapters}
+
+
+def prepare_book(path: str) -> dict:
+    # The gzipped source is streamed twice in lockstep rather than
+    # decompressed into memory.
+    with gzip.open(path, "rb") as lines, gzip.open(path, "rb") as reader:
+        head = lines.peek(HEADER_BYTES)[:HEADER_BYTES]
+        return prepare_chapters(head, lines, reader)
 
-    for ch in parsed:
-        chapter = Chapter(**ch)
-        db.add(chapter)
-        chapters.append(chapter)
 
+def parse_pool() -> ProcessPoolExecutor:
+    # Workers start as fresh interpreters. Forking from inside the running
+    # event loop would copy the aiosqlite and anyio threads' locks mid-use
+    # into the children, which can deadlock them.
+    return ProcessPoolExecutor(
+        max_workers=max(1, settings.ingest_concurrency), mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+def parse_chapters(text: str) -> list[dict]:
+    data = text.encode("utf-8")
+    return list(iter_chapters(iter_lines(io.BytesIO(data)), io.BytesIO(data)))
+
+
+async def _chapter_ids(db: AsyncSession, book: Book) -> dict[str, int]:
+    result = await db.execute(select(Chapter.id, Chapter.number).where(Chapter.book_id == book.id))
+    return {number: chapter_id for chapter_id, number in result.all()}
+
+
+async def _remove_chapters(db: AsyncSession, chapter_ids: list[int]):
+    for start in range(0, len(chapter_ids), ID_CHUNK):
+        chunk = chapter_ids[start:start + ID_CHUNK]
+        await db.execute(delete(Metaphor).where(Metaphor.chapter_id.in_(chunk)))
+        await db.execute(delete(ChapterText).where(ChapterText.chapter_id.in_(chunk)))
+        await db.execute(delete(Chapter).where(Chapter.id.in_(chunk)))
+
+
+async def store_chapters(db: AsyncSession, book: Book, chapters: list[dict]):
+    # Does not commit: the caller commits together with the book's
+    # source_hash, so a failure never leaves a book marked as ingested.
+    existing = await _chapter_ids(db, book)
+    bodies = {ch["number"]: ch["body"] for ch in chapters}
+    rows = [{k: v for k, v in ch.items() if k != "body"} for ch in chapters]
+
+    # A changed source updates chapters in place (keeping their metaphors,
+    # which re-extraction then reconciles), bulk-inserts the new ones and
+    # removes those it no longer has. A source in which no chapter was found
+    # at all removes nothing.
+    updates = [{"id": existing[ch["number"]], **ch} for ch in rows if ch["number"] in existing]
+    inserts = [{"book_id": book.id, **ch} for ch in rows if ch["number"] not in existing]
+    removed = [chapter_id for number, chapter_id in existing.items() if number not in bodies]
+    if removed and chapters:
+        await _remove_chapters(db, removed)
+    if updates:
+        await db.execute(update(Chapter), updates)
+    if inserts:
+        await db.execute(insert(Chapter), inserts)
+        existing = await _chapter_ids(db, book)
+    await store_bodies(db, {existing[number]: body for number, body in bodies.items()})
+
+
+async def _store_book(db: AsyncSession, book_id: int, meta: dict, prepared: dict):
+    book = (await db.execute(select(Book).where(Book.gutenberg_id == book_id))).scalar()
+    if book is None:
+        book = Book(gutenberg_id=book_id)
+        db.add(book)
+        await db.flush()
+        if book_id == default_book_id():
+            # Chapters ingested before books existed belong to the default book.
+            await db.execute(update(Chapter).where(Chapter.book_id.is_(None)).values(book_id=book.id))
+
+    book.title = prepared["title"] or book.title
+    book.author = prepared["author"] or book.author
+    book.source_url = meta["url"]
+    await store_chapters(db, book, prepared["chapters"])
+    book.source_hash = meta["sha256"]
     await db.commit()
-    for ch in chapters:
-        await db.refresh(ch)
 
-    return chapters
+
+async def ingest(
+    db: AsyncSession, book_ids: list[int] | None = None, refresh: bool = False
+) -> tuple[list[Chapter], dict[int, str]]:
+    book_ids = list(dict.fromkeys(book_ids or [default_book_id()]))
+    cache = SourceCache(settings.gutenberg_cache_dir, settings.gutenberg_cache_ttl_hours * 3600)
+
+    result = await db.execute(select(Book.gutenberg_id, Book.source_hash).where(Book.gutenberg_id.in_(book_ids)))
+    stored = dict(result.all())
+
+    semaphore = asyncio.Semaphore(max(1, settings.ingest_concurrency))
+    db_lock = asyncio.Lock()
+    loop = asyncio.get_running_loop()
+    limits = httpx.Limits(max_connections=settings.ingest_concurrency)
+    errors: dict[int, str] = {}
+
+    with parse_pool() as pool:
+        async with httpx.AsyncClient(follow_redirects=True, timeout=30, limits=limits) as client:
+
+            async def ingest_one(book_id: int):
+                # One failing book is reported without aborting the others.
+                try:
+                    async with semaphore:
+                        meta = await download(client, cache, book_id, source_url(book_id), refresh)
+                        if stored.get(book_id) == meta["sha256"]:
+                            return
+                        prepared = await loop.run_in_executor(pool, prepare_book, str(cache.text_path(book_id)))
+                    if not prepared["chapters"]:
+                        logger.warning("No chapters found in Gutenberg book %s", book_id)
+                    async with db_lock:
+                        try:
+                            await _store_book(db, book_id, meta, prepared)
+                        except Exception:
+                            # The session is shared: discard this book's
+                            # pending rows before the next book commits.
+                            await db.rollback()
+                            raise
+                except Exception as e:
+                    logger.exception("Ingesting Gutenberg book %s failed", book_id)
+                    errors[book_id] = str(e)
+
+            async with asyncio.TaskGroup() as tg:
+                for book_id in book_ids:
+                    tg.create_task(ingest_one(book_id))
+
+    result = await db.execute(
+        select(Chapter).join(Book).where(Book.gutenberg_id.in_(book_ids)).order_by(Chapter.book_id, Chapter.id)
+    )
+    return list(result.scalars().all()), errors
@@ -0,0 +1,289 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.database import async_session
+from app.models.job import Job, JobEvent
+from app.services import extractor, translator, writer
+
+logger = logging.getLogger(__name__)
+
+ACTIVE = ("queued", "running")
+FINISHED = ("complete", "failed", "cancelled")
+FOLLOW_INTERVAL = 0.5
+# Seconds between sweeps of old job events.
+PRUNE_INTERVAL = 600
+
+_wakeup = asyncio.Event()
+_running: dict[int, asyncio.Task] = {}
+_pruned_at = 0.0
+
+
+class JobContext:
+    def __init__(self, job: Job):
+        self.job_id = job.id
+        self.params = dict(job.params or {})
+        self.progress = dict(job.progress or {})
+
+    async def emit(self, data: dict):
+        async with async_session() as db:
+            db.add(JobEvent(job_id=self.job_id, data=data))
+            await db.commit()
+
+    async def checkpoint(self, **values):
+        self.progress.update(values)
+        async with async_session() as db:
+            await db.execute(update(Job).where(Job.id == self.job_id).values(progress=self.progress))
+            await db.commit()
+
+
+async def _run_extraction(ctx: JobContext, events) -> str | None:
+    # Chapters are marked processed as they finish, so a resumed job simply
+    # picks up whichever chapters are still pending, failed ones included;
+    # only this run's failures are counted.
+    if ctx.progress.get("chapters_failed"):
+        await ctx.checkpoint(chapters_failed=0)
+    finished = failed = 0
+    async for number, status, metaphor in events:
+        event = {"chapter": number, "status": status}
+        if metaphor:
+            event["metaphor"] = metaphor
+        await ctx.emit(event)
+        if status == "complete":
+            finished += 1
+            await ctx.checkpoint(chapters_done=ctx.progress.get("chapters_done", 0) + 1)
+        elif status == "error":
+            finished += 1
+            failed += 1
+            await ctx.checkpoint(chapters_failed=failed)
+    if failed:
+        return f"{failed} of {finished} chapters failed"
+    return None
+
+
+async def _extract(ctx: JobContext) -> str | None:
+    async with async_session() as db:
+        return await _run_extraction(ctx, extractor.extract_all(db))
+
+
+async def _reextract(ctx: JobContext) -> str | None:
+    async with async_session() as db:
+        return await _run_extraction(ctx, extractor.reextract_stale(db))
+
+
+async def _paper(ctx: JobContext):
+    p = ctx.params
+    async with async_session() as db:
+        async for paper_id, section_name, status in writer.generate_paper(
+            db, p["title"], p["author"], p["target_pages"], paper_id=ctx.progress.get("paper_id")
+        ):
+            if ctx.progress.get("paper_id") != paper_id:
+                await ctx.checkpoint(paper_id=paper_id)
+            await ctx.emit({"paper_id": paper_id, "section": section_name, "status": status})
+
+
+async def _translate(ctx: JobContext):
+    paper_id, lang = ctx.params["paper_id"], ctx.params["lang"]
+    done = list(ctx.progress.get("sections_done", []))
+    async with async_session() as db:
+        async for section_id, title, status in translator.translate_paper(db, paper_id, lang, skip=set(done)):
+            await ctx.emit({"section": title, "status": status, "lang": lang})
+            if status == "complete":
+                done.append(section_id)
+                await ctx.checkpoint(sections_done=done)
+
+
+HANDLERS = {
+    "extract": _extract,
+    "reextract": _reextract,
+    "paper": _paper,
+    "translate": _translate,
+}
+
+
+async def enqueue(db: AsyncSession, kind: str, params: dict | None = None) -> Job:
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind {kind}")
+    params = params or {}
+
+    # Starting the same work twice would only race on the same rows; hand back
+    # the job that is already queued or running instead.
+    result = await db.execute(
+        select(Job).where(Job.kind == kind, Job.status.in_(ACTIVE)).order_by(Job.id)
+    )
+    for job in result.scalars().all():
+        if job.params == params:
+            return job
+
+    job = Job(kind=kind, params=params, progress={})
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+    _wakeup.set()
+    return job
+
+
+async def cancel(db: AsyncSession, job: Job) -> Job:
+    if job.status in FINISHED:
+        return job
+
+    job.status = "cancelled"
+    job.finished_at = datetime.now(timezone.utc)
+    await db.commit()
+
+    task = _running.get(job.id)
+    if task:
+        task.cancel()
+    return job
+
+
+async def _claim() -> Job | None:
+    async with async_session() as db:
+        result = await db.execute(
+            select(Job).where(Job.status == "queued").order_by(Job.id).limit(1)
+        )
+        job = result.scalar()
+        if job is None:
+            return None
+        claimed = await db.execute(
+            update(Job).where(Job.id == job.id, Job.status == "queued")
+            .values(status="running", started_at=datetime.now(timezone.utc), heartbeat_at=datetime.now(timezone.utc))
+        )
+        await db.commit()
+        return job if claimed.rowcount else None
+
+
+async def _requeue_stale():
+    # Jobs left "running" by a process that stopped (or was killed) go back to
+    # the queue once their heartbeat is older than job_stale_after.
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.job_stale_after)
+    async with async_session() as db:
+        await db.execute(
+            update(Job)
+            .where(Job.status == "running", or_(Job.heartbeat_at.is_(None), Job.heartbeat_at < cutoff))
+            .values(status="queued")
+        )
+        await db.commit()
+
+
+async def _prune_events():
+    # Progress events are only needed while a job can still be followed;
+    # those of jobs finished more than job_event_retention ago are deleted.
+    global _pruned_at
+    now = time.monotonic()
+    if now - _pruned_at < PRUNE_INTERVAL:
+        return
+    _pruned_at = now
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.job_event_retention)
+    finished = select(Job.id).where(Job.status.in_(FINISHED), Job.finished_at < cutoff)
+    async with async_session() as db:
+        await db.execute(delete(JobEvent).where(JobEvent.job_id.in_(finished)))
+        await db.commit()
+
+
+async def _heartbeat(job_id: int, task: asyncio.Task):
+    # Also how a cancel issued by another process reaches this one: once the
+    # job is no longer "running" the local task is stopped.
+    while True:
+        await asyncio.sleep(settings.job_heartbeat_interval)
+        async with async_session() as db:
+            result = await db.execute(
+                update(Job).where(Job.id == job_id, Job.status == "running")
+                .values(heartbeat_at=datetime.now(timezone.utc))
+            )
+            await db.commit()
+        if not result.rowcount:
+            task.cancel()
+            return
+
+
+async def _finish(job_id: int, status: str, error: str | None = None):
+    # Only a job still marked running is finalized, so a cancel that landed
+    # while the handler was wrapping up is not overwritten.
+    async with async_session() as db:
+        await db.execute(
+            update(Job).where(Job.id == job_id, Job.status == "running")
+            .values(status=status, error=error, finished_at=datetime.now(timezone.utc))
+        )
+        await db.commit()
+
+
+async def _execute(job: Job):
+    # A handler that ran to the end but could not do all of its work returns
+    # a message saying what failed; the job then finishes "failed" with it.
+    try:
+        error = await HANDLERS[job.kind](JobContext(job))
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.exception("Job %s (%s) failed", job.id, job.kind)
+        await _finish(job.id, "failed", str(e))
+    else:
+        if error:
+            logger.warning("Job %s (%s) failed: %s", job.id, job.kind, error)
+        await _finish(job.id, "failed" if error else "complete", error)
+
+
+async def _worker():
+    while True:
+        _wakeup.clear()
+        job = await _claim()
+        if job is None:
+            await _requeue_stale()
+            await _prune_events()
+            try:
+                await asyncio.wait_for(_wakeup.wait(), settings.job_poll_interval)
+            except TimeoutError:
+                pass
+            continue
+
+        task = asyncio.create_task(_execute(job))
+        heartbeat = asyncio.create_task(_heartbeat(job.id, task))
+        _running[job.id] = task
+        try:
+            await task
+        except asyncio.CancelledError:
+            # A cancelled job only stops its own task; a cancelled worker means
+            # shutdown; the job stays "running" and is taken over once its
+            # heartbeat goes stale.
+            if asyncio.current_task().cancelling():
+                raise
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+            _running.pop(job.id, None)
+
+
+async def run_workers():
+    # Other processes may be running jobs against the same database, so only
+    # jobs whose heartbeat has gone stale are taken over.
+    await _requeue_stale()
+
+    async with asyncio.TaskGroup() as tg:
+        for _ in range(max(1, settings.job_workers)):
+            tg.create_task(_worker())
+
+
+async def follow(job_id: int, after: int = 0):
+    # Yields (event id, data) for events past `after` until the job finishes.
+    # The status is read before the events so the last batch is never missed.
+    while True:
+        async with async_session() as db:
+            status = (await db.execute(select(Job.status).where(Job.id == job_id))).scalar()
+            result = await db.execute(
+                select(JobEvent).where(JobEvent.job_id == job_id, JobEvent.id > after).order_by(JobEvent.id)
+            )
+            events = result.scalars().all()
+
+        for event in events:
+            after = event.id
+            yield event.id, event.data
+
+        if status is None or status in FINISHED:
+            return
+        await asyncio.sleep(FOLLOW_INTERVAL)
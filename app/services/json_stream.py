@@ -0,0 +1,60 @@
+import json
+
+
+class ArrayItemParser:
+    # Incrementally scans a JSON object arriving in fragments and returns each
+    # object in its top-level `key` array as soon as that object closes, so
+    # callers can act on items long before the whole document is complete.
+
+    def __init__(self, key: str):
+        self.key = key
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string = ""
+        self._current_key = ""
+        self._array_depth = 0
+        self._item_start: int | None = None
+
+    def feed(self, chunk: str) -> list:
+        self._text += chunk
+        text = self._text
+        items = []
+
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_string = text[self._string_start + 1:i]
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch == ":" and self._depth == 1:
+                self._current_key = self._last_string
+            elif ch in "{[":
+                self._depth += 1
+                if ch == "[" and self._depth == 2 and self._current_key == self.key:
+                    self._array_depth = self._depth
+                elif self._array_depth and self._depth == self._array_depth + 1:
+                    self._item_start = i
+            elif ch in "}]":
+                if self._item_start is not None and self._depth == self._array_depth + 1:
+                    items.append(json.loads(text[self._item_start:i + 1]))
+                    self._item_start = None
+                elif ch == "]" and self._depth == self._array_depth:
+                    self._array_depth = 0
+                self._depth -= 1
+
+        self._pos = len(text)
+        return items
@@ -0,0 +1,215 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from app.schemas.llm import LLMRequest, LLMResponse
+from app.services.llm_provider import LLMProvider, answered_by
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_llm_cache_accessed_at ON llm_cache (accessed_at);
+"""
+
+
+def request_key(
+    model: str,
+    request: LLMRequest,
+    tool_name: str | None = None,
+    tool_schema: dict | None = None,
+) -> str:
+    payload = {
+        "model": model,
+        "system": request.system,
+        "prefix": request.prefix,
+        "prompt": request.prompt,
+        "max_tokens": request.max_tokens,
+        "temperature": request.temperature,
+        "tool_name": tool_name,
+        "tool_schema": tool_schema,
+    }
+    blob = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path: str | Path, max_bytes: int, max_age_seconds: float):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._purge_expired()
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+
+    def _purge_expired(self):
+        if self.max_age_seconds > 0:
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.max_age_seconds,)
+            )
+
+    def _get(self, key: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            now = time.time()
+            if row is None or (self.max_age_seconds > 0 and row[1] < now - self.max_age_seconds):
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def _put(self, key: str, value: str):
+        size = len(value.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._size += size - (old[0] if old else 0)
+            if self.max_bytes > 0 and self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Drop least recently used entries until we are back under 90% of the
+        # budget, so a full cache does not evict on every single put.
+        self._purge_expired()
+        target = int(self.max_bytes * 0.9)
+        rows = self._conn.execute("SELECT key, size FROM llm_cache ORDER BY accessed_at").fetchall()
+        total = sum(size for _, size in rows)
+        doomed = []
+        for key, size in rows:
+            if total <= target:
+                break
+            doomed.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM llm_cache WHERE key = ?", doomed)
+        self._size = total
+
+    def _clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._size = 0
+
+    async def get(self, key: str) -> str | None:
+        return await asyncio.to_thread(self._get, key)
+
+    async def put(self, key: str, value: str):
+        await asyncio.to_thread(self._put, key, value)
+
+    async def clear(self):
+        await asyncio.to_thread(self._clear)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": self._size,
+        }
+
+
+class CachedProvider:
+    def __init__(self, inner: LLMProvider, cache: ResponseCache):
+        self.inner = inner
+        self.cache = cache
+        self.model = getattr(inner, "model", "")
+
+    def __getattr__(self, name):
+        # Capabilities the cache does not wrap (batches, streaming, ...) fall
+        # through to the underlying provider.
+        return getattr(self.inner, name)
+
+    def _primary_answered(self) -> bool:
+        # Keys name self.model, so an answer from a fallback or hedge model
+        # must not be stored under them.
+        model = answered_by.get()
+        return model is None or model == self.model
+
+    async def complete(self, request: LLMRequest) -> LLMResponse:
+        if not request.use_cache:
+            return await self.inner.complete(request)
+
+        key = request_key(self.model, request)
+        cached = await self.cache.get(key)
+        if cached is not None:
+            return LLMResponse.model_validate_json(cached)
+
+        answered_by.set(None)
+        response = await self.inner.complete(request)
+        if response.stop_reason != "max_tokens" and self._primary_answered():
+            await self.cache.put(key, response.model_dump_json())
+        return response
+
+    async def complete_structured(
+        self,
+        request: LLMRequest,
+        tool_name: str,
+        tool_schema: dict,
+    ) -> dict:
+        if not request.use_cache:
+            return await self.inner.complete_structured(request, tool_name, tool_schema)
+
+        key = request_key(self.model, request, tool_name, tool_schema)
+        cached = await self.cache.get(key)
+        if cached is not None:
+            return json.loads(cached)
+
+        answered_by.set(None)
+        result = await self.inner.complete_structured(request, tool_name, tool_schema)
+        if self._primary_answered():
+            await self.cache.put(key, json.dumps(result, ensure_ascii=False))
+        return result
+
+    async def stream_structured(
+        self,
+        request: LLMRequest,
+        tool_name: str,
+        tool_schema: dict,
+        item_key: str,
+    ):
+        # Shares entries with complete_structured: a hit replays the stored
+        # items, a complete miss stores what was streamed.
+        key = request_key(self.model, request, tool_name, tool_schema)
+        if request.use_cache:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                for item in json.loads(cached).get(item_key, []):
+                    yield item
+                return
+
+        items = []
+        answered_by.set(None)
+        async for item in self.inner.stream_structured(request, tool_name, tool_schema, item_key):
+            items.append(item)
+            yield item
+        if request.use_cache and self._primary_answered():
+            await self.cache.put(key, json.dumps({item_key: items}, ensure_ascii=False))
+
+    def stats(self) -> dict:
+        inner_stats = getattr(self.inner, "stats", None)
+        return {**(inner_stats() if inner_stats else {}), "cache": self.cache.stats()}
@@ -0,0 +1,215 @@
+import asyncio
+import json
+import random
+import threading
+import time
+from pathlib import Path
+
+from app.schemas.llm import LLMRequest, LLMResponse
+from app.services.llm_cache import request_key
+from app.services.llm_provider import LLMProvider, TruncatedResponseError
+
+LATENCY_MODES = ("recorded", "synthetic", "none")
+
+
+class Cassette:
+    # Append-only JSONL file of recorded exchanges, one per line. On load the
+    # latest line for a key wins, so re-recording simply appends.
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.entries: dict[str, dict] = {}
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        self._lock = threading.Lock()
+
+        if self.path.exists():
+            with self.path.open(encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry["key"]] = entry
+
+    def get(self, key: str) -> dict | None:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def _append(self, entry: dict):
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(line)
+            self.entries[entry["key"]] = entry
+            self.recorded += 1
+
+    async def put(self, key: str, kind: str, result, latency: float):
+        entry = {
+            "key": key,
+            "kind": kind,
+            "result": result,
+            "latency": round(latency, 4),
+            "recorded_at": time.time(),
+        }
+        await asyncio.to_thread(self._append, entry)
+
+    def stats(self) -> dict:
+        return {
+            "path": str(self.path),
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "recorded": self.recorded,
+        }
+
+
+class RecordingProvider:
+    def __init__(self, inner: LLMProvider, cassette: Cassette):
+        self.inner = inner
+        self.cassette = cassette
+        self.model = getattr(inner, "model", "")
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+    async def complete(self, request: LLMRequest) -> LLMResponse:
+        key = request_key(self.model, request)
+        started = time.monotonic()
+        try:
+            response = await self.inner.complete(request)
+        except TruncatedResponseError as e:
+            await self.cassette.put(key, "truncated", {"error": str(e)}, time.monotonic() - started)
+            raise
+        await self.cassette.put(key, "complete", response.model_dump(), time.monotonic() - started)
+        return response
+
+    async def complete_structured(
+        self,
+        request: LLMRequest,
+        tool_name: str,
+        tool_schema: dict,
+    ) -> dict:
+        key = request_key(self.model, request, tool_name, tool_schema)
+        started = time.monotonic()
+        try:
+            result = await self.inner.complete_structured(request, tool_name, tool_schema)
+        except TruncatedResponseError as e:
+            # Recorded too: callers react to truncation (the extractor splits
+            # the window), and replay has to take the same path.
+            await self.cassette.put(key, "truncated", {"error": str(e)}, time.monotonic() - started)
+            raise
+        await self.cassette.put(key, "structured", result, time.monotonic() - started)
+        return result
+
+    async def stream_structured(
+        self,
+        request: LLMRequest,
+        tool_name: str,
+        tool_schema: dict,
+        item_key: str,
+    ):
+        # Recorded under the complete_structured key, so either call replays it.
+        key = request_key(self.model, request, tool_name, tool_schema)
+        started = time.monotonic()
+        items = []
+        try:
+            async for item in self.inner.stream_structured(request, tool_name, tool_schema, item_key):
+                items.append(item)
+                yield item
+        except TruncatedResponseError as e:
+            await self.cassette.put(
+                key, "truncated", {"error": str(e), item_key: items}, time.monotonic() - started
+            )
+            raise
+        await self.cassette.put(key, "structured", {item_key: items}, time.monotonic() - started)
+
+    def stats(self) -> dict:
+        inner_stats = getattr(self.inner, "stats", None)
+        return {**(inner_stats() if inner_stats else {}), "cassette": self.cassette.stats()}
+
+
+class ReplayProvider:
+    # Serves exchanges from a cassette without touching the network. Latency
+    # is the recorded one, a seeded log-normal draw, or none at all, and can
+    # be compressed with `speedup` to load-test faster than real time.
+
+    def __init__(
+        self,
+        cassette: Cassette,
+        model: str,
+        latency: str = "recorded",
+        median: float = 2.0,
+        sigma: float = 0.6,
+        speedup: float = 1.0,
+        seed: int = 0,
+    ):
+        if latency not in LATENCY_MODES:
+            raise ValueError(f"Unknown replay latency mode {latency}")
+        self.cassette = cassette
+        self.model = model
+        self.latency = latency
+        self.median = median
+        self.sigma = sigma
+        self.speedup = max(speedup, 1e-6)
+        self._rng = random.Random(seed)
+
+    def _delay(self, entry: dict) -> float:
+        if self.latency == "none":
+            return 0.0
+        if self.latency == "synthetic":
+            return self.median * self._rng.lognormvariate(0, self.sigma) / self.speedup
+        return entry.get("latency", 0.0) / self.speedup
+
+    def _lookup(self, key: str, kind: str) -> dict:
+        entry = self.cassette.get(key)
+        if entry is None or entry["kind"] not in (kind, "truncated"):
+            raise ValueError(f"No recorded {kind} exchange for request {key[:12]}")
+        return entry
+
+    @staticmethod
+    def _check_truncated(entry: dict):
+        if entry["kind"] == "truncated":
+            raise TruncatedResponseError(entry["result"]["error"])
+
+    async def complete(self, request: LLMRequest) -> LLMResponse:
+        entry = self._lookup(request_key(self.model, request), "complete")
+        await asyncio.sleep(self._delay(entry))
+        self._check_truncated(entry)
+        return LLMResponse.model_validate(entry["result"])
+
+    async def complete_structured(
+        self,
+        request: LLMRequest,
+        tool_name: str,
+        tool_schema: dict,
+    ) -> dict:
+        entry = self._lookup(request_key(self.model, request, tool_name, tool_schema), "structured")
+        await asyncio.sleep(self._delay(entry))
+        self._check_truncated(entry)
+        return entry["result"]
+
+    async def stream_structured(
+        self,
+        request: LLMRequest,
+        tool_name: str,
+        tool_schema: dict,
+        item_key: str,
+    ):
+        entry = self._lookup(request_key(self.model, request, tool_name, tool_schema), "structured")
+        items = entry["result"].get(item_key, [])
+        # Spread the items over the call's latency the way a live stream would.
+        step = self._delay(entry) / (len(items) + 1)
+        for item in items:
+            await asyncio.sleep(step)
+            yield item
+        await asyncio.sleep(step)
+        # A truncated stream yields what was recorded before the cut-off.
+        self._check_truncated(entry)
+
+    def stats(self) -> dict:
+        return {"cassette": self.cassette.stats(), "latency": self.latency}
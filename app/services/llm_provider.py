@@ -1,6 +1,17 @@
-from typing import Protocol, runtime_checkable
+from contextvars import ContextVar
+from typing import AsyncIterator, Protocol, runtime_checkable
 
-from app.schemas.llm import LLMRequest, LLMResponse
+from app.schemas.llm import LLMBatchItem, LLMBatchResult, LLMRequest, LLMResponse
+
+
+class TruncatedResponseError(ValueError):
+    """Raised when a structured response hit max_tokens before the tool input closed."""
+
+
+# Model that produced the last answer in this context, for providers whose
+# answer may come from a model other than their `model` (see RoutingProvider).
+# None when the provider does not report it.
+answered_by: ContextVar[str | None] = ContextVar("answered_by", default=None)
 
 
 @runtime_checkable
@@ -15,12 +26,88 @@ class LLMProvider(Protocol):
     ) -> dict: ...
 
 
+@runtime_checkable
+class BatchProvider(Protocol):
+    async def submit_batch(self, items: list[LLMBatchItem]) -> str: ...
+
+    # Returns None while the batch is still processing.
+    async def batch_results(self, batch_id: str) -> list[LLMBatchResult] | None: ...
+
+
+@runtime_checkable
+class StreamingProvider(Protocol):
+    # Yields each object of the tool input's `item_key` array as soon as it is
+    # complete; raises TruncatedResponseError afterwards if output was cut off.
+    def stream_structured(
+        self,
+        request: LLMRequest,
+        tool_name: str,
+        tool_schema: dict,
+        item_key: str,
+    ) -> AsyncIterator[dict]: ...
+
+
 _provider: LLMProvider | None = None
 
 
 def get_provider() -> LLMProvider:
     global _provider
     if _provider is None:
-        from app.services.claude_provider import ClaudeProvider
-        _provider = ClaudeProvider()
+        _provider = _build_provider()
     return _provider
+
+
+def _build_provider() -> LLMProvider:
+    from app.config import settings
+
+    if settings.llm_provider not in ("claude", "record", "replay"):
+        raise ValueError(f"Unknown LLM provider {settings.llm_provider}")
+
+    if settings.llm_provider == "replay":
+        from app.services.llm_cassette import Cassette, ReplayProvider
+
+        # Replay needs no API key or network; the cassette is the only source
+        # of answers.
+        return ReplayProvider(
+            Cassette(settings.llm_cassette_path),
+            model=settings.claude_model,
+            latency=settings.llm_replay_latency,
+            median=settings.llm_replay_latency_median,
+            sigma=settings.llm_replay_latency_sigma,
+            speedup=settings.llm_replay_speedup,
+            seed=settings.llm_replay_seed,
+        )
+
+    from app.services.claude_provider import ClaudeProvider
+
+    models = [settings.claude_model]
+    models += [m.strip() for m in settings.claude_fallback_models.split(",") if m.strip()]
+    providers = [ClaudeProvider(m) for m in models]
+    provider = providers[0]
+    if len(providers) > 1:
+        from app.services.llm_router import RoutingProvider
+
+        provider = RoutingProvider(
+            providers,
+            hedge_percentile=settings.llm_hedge_percentile,
+            hedge_min_samples=settings.llm_hedge_min_samples,
+            hedge_delay=settings.llm_hedge_delay,
+        )
+
+    if settings.llm_provider == "record":
+        from app.services.llm_cassette import Cassette, RecordingProvider
+
+        # Recording bypasses the response cache so every exchange reaches the
+        # cassette with its real latency.
+        return RecordingProvider(provider, Cassette(settings.llm_cassette_path))
+
+    if settings.llm_cache_enabled:
+        from app.services.llm_cache import CachedProvider, ResponseCache
+
+        cache = ResponseCache(
+            settings.llm_cache_path,
+            max_bytes=settings.llm_cache_max_mb * 1024 * 1024,
+            max_age_seconds=settings.llm_cache_max_age_days * 86400,
+        )
+        provider = CachedProvider(provider, cache)
+    return provider
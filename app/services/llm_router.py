@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from app.schemas.llm import LLMRequest, LLMResponse
+from app.services.llm_provider import LLMProvider, StreamingProvider, answered_by
+
+logger = logging.getLogger(__name__)
+
+LATENCY_WINDOW = 200
+
+
+class _Backend:
+    def __init__(self, provider: LLMProvider):
+        self.provider = provider
+        self.name = getattr(provider, "model", type(provider).__name__)
+        # Keyed by max_tokens: a short summary and a long translation take
+        # very different times, so each call type gets its own distribution.
+        self.latencies: dict[int, deque[float]] = {}
+        self.calls = 0
+        self.errors = 0
+
+    def samples(self, max_tokens: int) -> int:
+        return len(self.latencies.get(max_tokens, ()))
+
+    def percentile(self, pct: float, max_tokens: int) -> float | None:
+        latencies = self.latencies.get(max_tokens)
+        if not latencies:
+            return None
+        ordered = sorted(latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+    async def call(self, method: str, request: LLMRequest, *args):
+        self.calls += 1
+        started = time.monotonic()
+        try:
+            result = await getattr(self.provider, method)(request, *args)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.errors += 1
+            raise
+        latencies = self.latencies.setdefault(request.max_tokens, deque(maxlen=LATENCY_WINDOW))
+        latencies.append(time.monotonic() - started)
+        return result
+
+    def stats(self) -> dict:
+        inner = getattr(self.provider, "stats", None)
+        return {
+            "name": self.name,
+            "calls": self.calls,
+            "errors": self.errors,
+            "latency": {
+                max_tokens: {
+                    "samples": self.samples(max_tokens),
+                    "p50": self.percentile(50, max_tokens),
+                    "p95": self.percentile(95, max_tokens),
+                    "p99": self.percentile(99, max_tokens),
+                }
+                for max_tokens in sorted(self.latencies)
+            },
+            **(inner() if inner else {}),
+        }
+
+
+def _falls_back(error: Exception) -> bool:
+    # ValueError covers problems with the answer itself (truncation, missing
+    # tool use); another backend is no more likely to get those right.
+    return not isinstance(error, ValueError)
+
+
+class RoutingProvider:
+    # Sends each call to the first backend, falling back down the list when
+    # one fails. Requests marked `hedge` also get a duplicate on the next
+    # backend if the first has not answered within its own latency percentile
+    # for that max_tokens; whichever finishes first wins and the other is
+    # cancelled. The backend that answered is published in `answered_by`.
+
+    def __init__(
+        self,
+        providers: list[LLMProvider],
+        hedge_percentile: float = 95,
+        hedge_min_samples: int = 20,
+        hedge_delay: float = 30.0,
+    ):
+        if not providers:
+            raise ValueError("RoutingProvider needs at least one provider")
+        self.backends = [_Backend(p) for p in providers]
+        self.model = self.backends[0].name
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_delay = hedge_delay
+        self.fallbacks = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def __getattr__(self, name):
+        # Batches and other per-backend capabilities belong to the primary.
+        return getattr(self.backends[0].provider, name)
+
+    def _hedge_deadline(self, backend: _Backend, request: LLMRequest) -> float:
+        if backend.samples(request.max_tokens) < self.hedge_min_samples:
+            return self.hedge_delay
+        return backend.percentile(self.hedge_percentile, request.max_tokens)
+
+    async def _route(self, method: str, request: LLMRequest, *args):
+        last_error: Exception | None = None
+        for i, backend in enumerate(self.backends):
+            if i > 0:
+                self.fallbacks += 1
+                logger.warning("Falling back from %s to %s: %s", self.backends[i - 1].name, backend.name, last_error)
+            try:
+                if request.hedge and i + 1 < len(self.backends):
+                    winner, result = await self._hedged(method, backend, self.backends[i + 1], request, *args)
+                else:
+                    winner, result = backend, await backend.call(method, request, *args)
+                answered_by.set(winner.name)
+                return result
+            except Exception as e:
+                if not _falls_back(e):
+                    raise
+                last_error = e
+        raise last_error
+
+    async def _hedged(self, method: str, primary: _Backend, secondary: _Backend, request: LLMRequest, *args):
+        first = asyncio.create_task(primary.call(method, request, *args))
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self._hedge_deadline(primary, request))
+            if not done:
+                self.hedges += 1
+                tasks.add(asyncio.create_task(secondary.call(method, request, *args)))
+
+            while tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    tasks.discard(task)
+                    if task.exception() is None:
+                        if task is first:
+                            return primary, task.result()
+                        self.hedge_wins += 1
+                        return secondary, task.result()
+                    # Prefer the other request if it is still running.
+                    if not tasks:
+                        raise task.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def complete(self, request: LLMRequest) -> LLMResponse:
+        return await self._route("complete", request)
+
+    async def complete_structured(
+        self,
+        request: LLMRequest,
+        tool_name: str,
+        tool_schema: dict,
+    ) -> dict:
+        return await self._route("complete_structured", request, tool_name, tool_schema)
+
+    async def stream_structured(
+        self,
+        request: LLMRequest,
+        tool_name: str,
+        tool_schema: dict,
+        item_key: str,
+    ):
+        # Streams are never hedged, and only fall back if nothing was yielded.
+        backends = [b for b in self.backends if isinstance(b.provider, StreamingProvider)]
+        if not backends:
+            raise ValueError("No configured LLM provider supports streaming")
+        for i, backend in enumerate(backends):
+            yielded = False
+            backend.calls += 1
+            try:
+                async for item in backend.provider.stream_structured(request, tool_name, tool_schema, item_key):
+                    yielded = True
+                    yield item
+                answered_by.set(backend.name)
+                return
+            except Exception as e:
+                backend.errors += 1
+                if yielded or not _falls_back(e) or i + 1 == len(backends):
+                    raise
+                self.fallbacks += 1
+                logger.warning("Falling back from %s to %s: %s", backend.name, backends[i + 1].name, e)
+
+    def stats(self) -> dict:
+        return {
+            "routing": {
+                "fallbacks": self.fallbacks,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "backends": [b.stats() for b in self.backends],
+            },
+        }
@@ -0,0 +1,200 @@
+import asyncio
+import gzip
+import logging
+import mmap
+import os
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.metaphor import Book, Chapter
+from app.services.gutenberg import HEADER_BYTES, parse_pool, prepare_chapters, store_chapters
+from app.services.segmenter import iter_lines
+
+logger = logging.getLogger(__name__)
+
+TEXT_SUFFIXES = (".txt", ".txt.gz")
+SUFFIXES = (*TEXT_SUFFIXES, ".zip")
+
+
+@dataclass(frozen=True)
+class LocalSource:
+    key: str
+    path: str
+    member: str | None
+    fingerprint: str
+
+
+def import_root() -> Path:
+    return Path(settings.import_dir).resolve()
+
+
+def resolve(relative: str) -> Path:
+    # Paths come from API callers, so they must stay inside IMPORT_DIR.
+    root = import_root()
+    path = (root / relative).resolve()
+    if not path.is_relative_to(root):
+        raise ValueError(f"{relative} is outside the import directory")
+    if not path.exists():
+        raise ValueError(f"{relative} does not exist")
+    return path
+
+
+def _key(path: Path) -> str:
+    root = import_root()
+    return path.relative_to(root).as_posix() if path.is_relative_to(root) else str(path)
+
+
+def _sources(path: Path) -> list[LocalSource]:
+    name = path.name.lower()
+    if name.endswith(".zip"):
+        # Members are fingerprinted from the central directory, so an
+        # unchanged archive is skipped without decompressing anything.
+        with zipfile.ZipFile(path) as zf:
+            return [
+                LocalSource(f"{_key(path)}!{info.filename}", str(path), info.filename,
+                            f"{info.CRC:08x}:{info.file_size}")
+                for info in zf.infolist()
+                if not info.is_dir() and info.filename.lower().endswith(TEXT_SUFFIXES)
+            ]
+    if name.endswith(TEXT_SUFFIXES):
+        st = path.stat()
+        return [LocalSource(_key(path), str(path), None, f"{st.st_size}:{st.st_mtime_ns}")]
+    return []
+
+
+def discover(paths: list[Path] | None = None) -> tuple[list[LocalSource], dict[str, str]]:
+    sources, errors = [], {}
+    for path in paths or [import_root()]:
+        if path.is_dir():
+            files = sorted(p for p in path.rglob("*") if p.is_file())
+        else:
+            files = [path]
+        for file in files:
+            try:
+                sources.extend(_sources(file))
+            except (OSError, zipfile.BadZipFile) as e:
+                errors[_key(file)] = str(e)
+    return sources, errors
+
+
+def _title(name: str) -> str:
+    name = Path(name).name
+    for suffix in (".gz", ".txt"):
+        if name.lower().endswith(suffix):
+            name = name[: -len(suffix)]
+    return name.replace("_", " ").replace("-", " ").strip()
+
+
+class _Peekable:
+    # ZipExtFile.peek returns at most one buffer; the header needs HEADER_BYTES.
+    def __init__(self, f):
+        self._f = f
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+    def __iter__(self):
+        return iter(self._f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._f.close()
+
+    def peek(self, size: int) -> bytes:
+        pos = self._f.tell()
+        head = self._f.read(size)
+        self._f.seek(pos)
+        return head
+
+
+def _prepare_stream(opener) -> dict:
+    # Compressed streams cannot be mapped, so they are read twice in lockstep:
+    # one handle for segmentation and one for the chapter text.
+    with opener() as lines, opener() as reader:
+        head = lines.peek(HEADER_BYTES)[:HEADER_BYTES]
+        return prepare_chapters(head, lines, reader)
+
+
+def prepare_source(path: str, member: str | None) -> dict:
+    # Runs in a worker process.
+    if member is not None:
+        with zipfile.ZipFile(path) as zf:
+            if member.lower().endswith(".gz"):
+                prepared = _prepare_stream(lambda: gzip.GzipFile(fileobj=zf.open(member)))
+            else:
+                prepared = _prepare_stream(lambda: _Peekable(zf.open(member)))
+    elif path.lower().endswith(".gz"):
+        prepared = _prepare_stream(lambda: gzip.open(path, "rb"))
+    elif os.path.getsize(path) == 0:
+        prepared = {"title": "", "author": "", "chapters": []}
+    else:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            prepared = prepare_chapters(m[:HEADER_BYTES], iter_lines(m), m)
+    prepared["title"] = prepared["title"] or _title(member or path)
+    return prepared
+
+
+async def _store(db: AsyncSession, source: LocalSource, prepared: dict):
+    book = (await db.execute(select(Book).where(Book.source_key == source.key))).scalar()
+    if book is None:
+        book = Book(source_key=source.key)
+        db.add(book)
+        await db.flush()
+    book.title = prepared["title"] or book.title
+    book.author = prepared["author"] or book.author
+    book.source_url = source.key
+    await store_chapters(db, book, prepared["chapters"])
+    book.source_hash = source.fingerprint
+    await db.commit()
+
+
+async def import_local(
+    db: AsyncSession, paths: list[Path] | None = None, refresh: bool = False
+) -> tuple[list[Chapter], dict[str, str]]:
+    sources, errors = await asyncio.to_thread(discover, paths)
+    keys = [s.key for s in sources]
+    if not sources:
+        return [], errors
+
+    result = await db.execute(select(Book.source_key, Book.source_hash).where(Book.source_key.in_(keys)))
+    stored = dict(result.all())
+
+    db_lock = asyncio.Lock()
+    loop = asyncio.get_running_loop()
+
+    with parse_pool() as pool:
+
+        async def import_one(source: LocalSource):
+            try:
+                if not refresh and stored.get(source.key) == source.fingerprint:
+                    return
+                prepared = await loop.run_in_executor(pool, prepare_source, source.path, source.member)
+                if not prepared["chapters"]:
+                    logger.warning("No chapters found in %s", source.key)
+                async with db_lock:
+                    try:
+                        await _store(db, source, prepared)
+                    except Exception:
+                        # The session is shared: discard this source's
+                        # pending rows before the next source commits.
+                        await db.rollback()
+                        raise
+            except Exception as e:
+                logger.exception("Importing %s failed", source.key)
+                errors[source.key] = str(e)
+
+        async with asyncio.TaskGroup() as tg:
+            for source in sources:
+                tg.create_task(import_one(source))
+
+    result = await db.execute(
+        select(Chapter).join(Book).where(Book.source_key.in_(keys)).order_by(Chapter.book_id, Chapter.id)
+    )
+    return list(result.scalars().all()), errors
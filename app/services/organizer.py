@@ -1,10 +1,16 @@
+import asyncio
 import json
+from collections import Counter
 
-from sqlalchemy import select, func
+import numpy as np
+from sqlalchemy import delete, func, insert, or_, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import settings
 from app.models.metaphor import Metaphor, Topic, Subtopic
 from app.schemas.llm import LLMRequest
+from app.services.clustering import Cluster, cluster
+from app.services.dedup import ID_CHUNK
 from app.services.llm_provider import get_provider
 from app.services.prompt_guard import sanitize_user_input
 
@@ -16,11 +22,15 @@ ORGANIZE_PROMPT = """Organize the following metaphors into topics and subtopics
 10-page academic paper. Each topic should be a major thematic thread that can sustain \
 1-2 pages of analysis.
 
-Metaphors to organize:
-{metaphors_json}
+The {total} metaphors have been grouped into {count} clusters of similar metaphors. Each \
+cluster gives its size, its most distinctive terms, the topics suggested during extraction \
+and its most representative metaphors.
+
+Clusters to organize:
+{clusters_json}
 
 Return your organization using the tool provided. Create 4-7 topics, each with optional subtopics.
-Assign every metaphor to a topic by its ID."""
+Assign every cluster to a topic by its ID; a cluster's metaphors follow it."""
 
 ORGANIZE_SCHEMA = {
     "type": "object",
@@ -39,21 +49,21 @@ ORGANIZE_SCHEMA = {
                             "properties": {
                                 "name": {"type": "string"},
                                 "description": {"type": "string"},
-                                "metaphor_ids": {
+                                "cluster_ids": {
                                     "type": "array",
                                     "items": {"type": "integer"},
                                 },
                             },
-                            "required": ["name", "metaphor_ids"],
+                            "required": ["name", "cluster_ids"],
                         },
                     },
-                    "metaphor_ids": {
+                    "cluster_ids": {
                         "type": "array",
                         "items": {"type": "integer"},
-                        "description": "Metaphors that belong to this topic but no specific subtopic",
+                        "description": "Clusters that belong to this topic but no specific subtopic",
                     },
                 },
-                "required": ["name", "description", "metaphor_ids"],
+                "required": ["name", "description", "cluster_ids"],
             },
         }
     },
@@ -90,70 +100,143 @@ WORD_COUNT_SCHEMA = {
 }
 
 
-async def auto_organize(db: AsyncSession) -> list[Topic]:
-    result = await db.execute(select(Metaphor).where(Metaphor.selected == True))
-    metaphors = result.scalars().all()
+def _describe(clusters: list[Cluster], rows: dict) -> list[dict]:
+    described = []
+    for c in clusters:
+        suggested = Counter(rows[i].suggested_topic for i in c.member_ids if rows[i].suggested_topic)
+        described.append({
+            "id": c.id,
+            "size": len(c.member_ids),
+            "keywords": c.keywords,
+            "suggested_topics": [name for name, _ in suggested.most_common(3)],
+            "examples": [
+                {"quote": rows[i].exact_quote[:100], "meaning": rows[i].meaning[:100]} for i in c.example_ids
+            ],
+        })
+    return described
+
+
+def _expand(organized: dict, clusters: list[Cluster]) -> list[dict]:
+    # Back to per-metaphor assignments: every member goes where the model put
+    # its cluster. A cluster the model left out (or an unknown id) joins the
+    # topic whose clusters it is most similar to.
+    by_id = {c.id: c for c in clusters}
+    placed: set[int] = set()
+    topics = []
+    for topic_data in organized.get("topics", []):
+        def take(ids) -> list[Cluster]:
+            taken = [by_id[i] for i in ids if i in by_id and i not in placed]
+            placed.update(c.id for c in taken)
+            return taken
+
+        direct = take(topic_data.get("cluster_ids", []))
+        subtopics = [(sub, take(sub.get("cluster_ids", []))) for sub in topic_data.get("subtopics", [])]
+        topics.append((topic_data, direct, subtopics))
 
-    metaphors_data = [
-        {"id": m.id, "quote": m.exact_quote[:100], "meaning": m.meaning[:100], "suggested": m.suggested_topic}
-        for m in metaphors
+    if topics and clusters:
+        centroids = []
+        for _, direct, subtopics in topics:
+            members = direct + [c for _, cs in subtopics for c in cs]
+            total = sum((c.centroid * len(c.member_ids) for c in members), np.zeros_like(clusters[0].centroid))
+            centroids.append(total / (np.linalg.norm(total) or 1))
+        centroids = np.vstack(centroids)
+        for c in clusters:
+            if c.id not in placed:
+                topics[int((centroids @ c.centroid).argmax())][1].append(c)
+
+    return [
+        {
+            **topic_data,
+            "metaphor_ids": [i for c in direct for i in c.member_ids],
+            "subtopics": [
+                {**sub, "metaphor_ids": [i for c in cs for i in c.member_ids]} for sub, cs in subtopics
+            ],
+        }
+        for topic_data, direct, subtopics in topics
     ]
 
+
+async def auto_organize(db: AsyncSession) -> list[Topic]:
+    result = await db.execute(
+        select(
+            Metaphor.id, Metaphor.exact_quote, Metaphor.meaning, Metaphor.explanation, Metaphor.suggested_topic,
+        ).where(Metaphor.selected == True)
+    )
+    rows = {row.id: row for row in result.all()}
+
+    # The model sees a fixed number of cluster summaries rather than every
+    # metaphor, so the prompt (and the ids it must return) no longer grows
+    # with the corpus.
+    clusters = await asyncio.to_thread(
+        cluster,
+        [(r.id, f"{r.exact_quote} {r.meaning} {r.explanation} {r.suggested_topic}") for r in rows.values()],
+        settings.organize_clusters,
+        settings.organize_examples,
+    )
+
     provider = get_provider()
     organized = await provider.complete_structured(
         LLMRequest(
             system=ORGANIZE_SYSTEM,
-            prompt=ORGANIZE_PROMPT.format(metaphors_json=json.dumps(metaphors_data)),
+            prompt=ORGANIZE_PROMPT.format(
+                total=len(rows),
+                count=len(clusters),
+                clusters_json=json.dumps(_describe(clusters, rows)),
+            ),
             max_tokens=4096,
             temperature=0.2,
         ),
         tool_name="organize_metaphors",
         tool_schema=ORGANIZE_SCHEMA,
     )
+    organized_topics = _expand(organized, clusters)
 
-    # Clear existing topics
-    old_topics = await db.execute(select(Topic))
-    for t in old_topics.scalars().all():
-        await db.delete(t)
-    old_subtopics = await db.execute(select(Subtopic))
-    for s in old_subtopics.scalars().all():
-        await db.delete(s)
-    await db.flush()
+    # Swapped in within one transaction using set-based statements, so the
+    # write lock is held briefly however many metaphors are reassigned.
+    # Assignments to the old topics are cleared along with them.
+    await db.execute(
+        update(Metaphor)
+        .where(or_(Metaphor.topic_id.is_not(None), Metaphor.subtopic_id.is_not(None)))
+        .values(topic_id=None, subtopic_id=None)
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(delete(Subtopic))
+    await db.execute(delete(Topic))
 
     topics = []
-    for i, topic_data in enumerate(organized.get("topics", [])):
-        topic = Topic(
-            name=topic_data["name"],
-            description=topic_data.get("description", ""),
-            sort_order=i,
-        )
-        db.add(topic)
-        await db.flush()
-
-        # Assign direct metaphors
-        for mid in topic_data.get("metaphor_ids", []):
-            m = await db.get(Metaphor, mid)
-            if m:
-                m.topic_id = topic.id
-
-        # Handle subtopics
-        for j, sub_data in enumerate(topic_data.get("subtopics", [])):
-            subtopic = Subtopic(
-                topic_id=topic.id,
-                name=sub_data["name"],
-                description=sub_data.get("description", ""),
-                sort_order=j,
-            )
-            db.add(subtopic)
-            await db.flush()
+    if organized_topics:
+        result = await db.scalars(insert(Topic).returning(Topic), [
+            {"name": t["name"], "description": t.get("description", ""), "sort_order": i}
+            for i, t in enumerate(organized_topics)
+        ])
+        # Matched back by sort_order rather than relying on RETURNING order.
+        topics = sorted(result.all(), key=lambda t: t.sort_order)
 
-            for mid in sub_data.get("metaphor_ids", []):
-                m = await db.get(Metaphor, mid)
-                if m:
-                    m.topic_id = topic.id
-                    m.subtopic_id = subtopic.id
+    subtopic_rows = [
+        {"topic_id": topic.id, "name": sub["name"], "description": sub.get("description", ""), "sort_order": j}
+        for topic, topic_data in zip(topics, organized_topics)
+        for j, sub in enumerate(topic_data.get("subtopics", []))
+    ]
+    subtopic_ids = {}
+    if subtopic_rows:
+        result = await db.execute(
+            insert(Subtopic).returning(Subtopic.id, Subtopic.topic_id, Subtopic.sort_order), subtopic_rows
+        )
+        subtopic_ids = {(topic_id, order): sub_id for sub_id, topic_id, order in result.all()}
 
-        topics.append(topic)
+    assignments: dict[tuple[int, int | None], list[int]] = {}
+    for topic, topic_data in zip(topics, organized_topics):
+        assignments.setdefault((topic.id, None), []).extend(topic_data.get("metaphor_ids", []))
+        for j, sub in enumerate(topic_data.get("subtopics", [])):
+            assignments.setdefault((topic.id, subtopic_ids[(topic.id, j)]), []).extend(sub["metaphor_ids"])
+    for (topic_id, subtopic_id), ids in assignments.items():
+        for start in range(0, len(ids), ID_CHUNK):
+            await db.execute(
+                update(Metaphor)
+                .where(Metaphor.id.in_(ids[start:start + ID_CHUNK]))
+                .values(topic_id=topic_id, subtopic_id=subtopic_id)
+                .execution_options(synchronize_session=False)
+            )
 
     await db.commit()
     return topics
@@ -0,0 +1,146 @@
+import struct
+import zlib
+from array import array
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.metaphor import Chapter, Metaphor
+from app.services.chapter_text import load_text
+
+CHAR_MAP = {
+    "‘": "'", "’": "'", "‚": "'", "‛": "'", "′": "'",
+    "“": '"', "”": '"', "„": '"', "‟": '"', "″": '"',
+    "‒": "-", "–": "-", "—": "-", "―": "-", "−": "-",
+}
+
+QUOTE_EDGES = " \"'.,;:!?"
+
+
+def normalize(text: str) -> tuple[str, array]:
+    # Produces the comparison form of `text` plus, for every output character,
+    # the offset of the source character it came from. Whitespace runs collapse
+    # to one space, curly quotes straighten, dashes (including "--") collapse to
+    # a single "-" that swallows surrounding spaces, and "…" becomes "...".
+    out: list[str] = []
+    offsets = array("I")
+    pending_space = -1
+
+    for i, ch in enumerate(text):
+        if ch.isspace():
+            if out and pending_space < 0:
+                pending_space = i
+            continue
+
+        ch = CHAR_MAP.get(ch, ch)
+        if ch == "-":
+            if out and out[-1] == "-":
+                pending_space = -1
+                continue
+            pending_space = -1
+        elif pending_space >= 0 and out and out[-1] != "-":
+            out.append(" ")
+            offsets.append(pending_space)
+        pending_space = -1
+
+        if ch == "…":
+            out.extend("...")
+            offsets.extend((i, i, i))
+        else:
+            # lower() can expand a character ("İ" -> "i̇"); every output
+            # character needs its own offset.
+            lowered = ch.lower()
+            out.extend(lowered)
+            offsets.extend([i] * len(lowered))
+
+    return "".join(out), offsets
+
+
+class QuoteIndex:
+    def __init__(self, text: str, offsets: array):
+        self.text = text
+        self.offsets = offsets
+
+    @classmethod
+    def build(cls, source: str) -> "QuoteIndex":
+        return cls(*normalize(source))
+
+    def to_bytes(self) -> bytes:
+        encoded = self.text.encode("utf-8")
+        return zlib.compress(struct.pack("<I", len(encoded)) + encoded + self.offsets.tobytes())
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> "QuoteIndex":
+        raw = zlib.decompress(blob)
+        (length,) = struct.unpack_from("<I", raw)
+        text = raw[4:4 + length].decode("utf-8")
+        offsets = array("I")
+        offsets.frombytes(raw[4 + length:])
+        return cls(text, offsets)
+
+    def locate(self, quote: str) -> tuple[int, int] | None:
+        # Elided quotes ("he said ... and left") match when every fragment
+        # appears in order; str.find keeps each lookup linear in chapter size.
+        normalized, _ = normalize(quote)
+        segments = [s.strip(QUOTE_EDGES) for s in normalized.split("...")]
+        segments = [s for s in segments if s]
+        if not segments:
+            return None
+
+        start, pos = None, 0
+        for segment in segments:
+            found = self.text.find(segment, pos)
+            if found < 0:
+                return None
+            if start is None:
+                start = found
+            pos = found + len(segment)
+
+        return self.offsets[start], self.offsets[pos - 1] + 1
+
+
+async def load_index(
+    db: AsyncSession, chapter: Chapter, rebuild: bool = False, text: str | None = None
+) -> QuoteIndex:
+    if not rebuild:
+        result = await db.execute(select(Chapter.quote_index).where(Chapter.id == chapter.id))
+        blob = result.scalar()
+        if blob:
+            return QuoteIndex.from_bytes(blob)
+
+    # Built on first use for chapters ingested before the index existed, and
+    # rebuilt when the chapter text has changed since it was stored.
+    if text is None:
+        text = await load_text(db, chapter.id)
+    index = QuoteIndex.build(text)
+    chapter.quote_index = index.to_bytes()
+    return index
+
+
+def apply_location(metaphor: Metaphor, index: QuoteIndex):
+    span = index.locate(metaphor.exact_quote)
+    metaphor.quote_start, metaphor.quote_end = span if span else (None, None)
+    metaphor.quote_verified = span is not None
+
+
+async def verify_metaphors(db: AsyncSession, chapter_id: int | None = None) -> dict:
+    query = select(Chapter).order_by(Chapter.id)
+    if chapter_id is not None:
+        query = query.where(Chapter.id == chapter_id)
+    chapters = (await db.execute(query)).scalars().all()
+
+    verified = unverified = 0
+    for chapter in chapters:
+        # Rebuilt rather than loaded, so indexes stored by an older
+        # normalize() are corrected along the way.
+        index = await load_index(db, chapter, rebuild=True)
+        result = await db.execute(select(Metaphor).where(Metaphor.chapter_id == chapter.id))
+        for m in result.scalars().all():
+            apply_location(m, index)
+            if m.quote_verified:
+                verified += 1
+            else:
+                unverified += 1
+        await db.commit()
+
+    return {"verified": verified, "unverified": unverified}
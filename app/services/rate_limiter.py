@@ -0,0 +1,229 @@
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+BUCKETS = ("requests", "input_tokens", "output_tokens")
+
+
+class TokenBucket:
+    # Refills continuously at `per_minute / 60` per second up to `per_minute`.
+    # A capacity of 0 means the limit is unknown and nothing is throttled.
+
+    def __init__(self, per_minute: float = 0):
+        self.capacity = 0.0
+        self.level = 0.0
+        self.updated = time.monotonic()
+        self.set_limit(per_minute)
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def set_limit(self, per_minute: float):
+        self._refill()
+        if per_minute > 0 and not self.enabled:
+            self.level = per_minute
+        self.capacity = float(per_minute)
+        self.level = min(self.level, self.capacity)
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.enabled:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        if not self.enabled:
+            return 0.0
+        self._refill()
+        # A request larger than the whole bucket goes once the bucket is full
+        # rather than waiting forever.
+        needed = min(amount, self.capacity)
+        if self.level >= needed:
+            return 0.0
+        return (needed - self.level) * 60 / self.capacity
+
+    def take(self, amount: float):
+        if self.enabled:
+            self.level -= amount
+
+    def give(self, amount: float):
+        if self.enabled:
+            self._refill()
+            self.level = min(self.capacity, self.level + amount)
+
+    def sync(self, remaining: float):
+        if self.enabled:
+            self._refill()
+            self.level = min(self.level, remaining)
+
+
+class Reservation:
+    def __init__(self, input_tokens: int, output_tokens: int):
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.settled = False
+
+
+class RateLimiter:
+    # Admits calls in FIFO order once the request, input-token and output-token
+    # budgets all have room. Output is reserved at max_tokens and the unused
+    # part refunded when the call returns. Limits left at 0 are learned from
+    # the API's rate-limit response headers.
+
+    def __init__(
+        self,
+        requests_per_minute: int = 0,
+        input_tokens_per_minute: int = 0,
+        output_tokens_per_minute: int = 0,
+        max_retries: int = 6,
+        max_backoff: float = 60.0,
+    ):
+        self.configured = {
+            "requests": requests_per_minute,
+            "input_tokens": input_tokens_per_minute,
+            "output_tokens": output_tokens_per_minute,
+        }
+        self.buckets = {name: TokenBucket(limit) for name, limit in self.configured.items()}
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        self._lock = asyncio.Lock()
+        self._refunded = asyncio.Event()
+        self._resume_at = 0.0
+
+        self.queued = 0
+        self.in_flight = 0
+        self.admitted = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.retries = 0
+        self.throttled = 0
+
+    async def acquire(self, input_tokens: int, output_tokens: int) -> Reservation:
+        amounts = {"requests": 1, "input_tokens": input_tokens, "output_tokens": output_tokens}
+        started = time.monotonic()
+        self.queued += 1
+        try:
+            # asyncio.Lock wakes waiters in arrival order, so a large request at
+            # the head of the queue is not starved by smaller ones behind it.
+            async with self._lock:
+                while True:
+                    delay = max(
+                        self._resume_at - time.monotonic(),
+                        *(self.buckets[name].wait_time(amounts[name]) for name in BUCKETS),
+                    )
+                    if delay <= 0:
+                        break
+                    # Refunds from finished calls can free room long before
+                    # the bucket would refill on its own.
+                    self._refunded.clear()
+                    try:
+                        await asyncio.wait_for(self._refunded.wait(), delay)
+                    except TimeoutError:
+                        pass
+                for name in BUCKETS:
+                    self.buckets[name].take(amounts[name])
+        finally:
+            self.queued -= 1
+
+        waited = time.monotonic() - started
+        self.admitted += 1
+        self.in_flight += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        return Reservation(input_tokens, output_tokens)
+
+    def release(
+        self,
+        reservation: Reservation,
+        input_tokens: int | None = None,
+        output_tokens: int | None = None,
+    ):
+        # Without usage the call never ran (or was rejected), so the token
+        # reservation is returned in full; the request slot stays spent.
+        if reservation.settled:
+            return
+        reservation.settled = True
+        self.in_flight -= 1
+
+        used_input = 0 if input_tokens is None else input_tokens
+        used_output = 0 if output_tokens is None else output_tokens
+        self._adjust("input_tokens", reservation.input_tokens - used_input)
+        self._adjust("output_tokens", reservation.output_tokens - used_output)
+        self._refunded.set()
+
+    def _adjust(self, name: str, delta: float):
+        if delta > 0:
+            self.buckets[name].give(delta)
+        elif delta < 0:
+            self.buckets[name].take(-delta)
+
+    def observe(self, headers):
+        # Keep local buckets in line with the server's view: learn limits that
+        # were not configured and never believe we have more than it reports.
+        for name in BUCKETS:
+            header = f"anthropic-ratelimit-{name.replace('_', '-')}"
+            limit = _number(headers.get(f"{header}-limit"))
+            remaining = _number(headers.get(f"{header}-remaining"))
+            bucket = self.buckets[name]
+            if limit and not self.configured[name] and bucket.capacity != limit:
+                bucket.set_limit(limit)
+            if remaining is not None:
+                bucket.sync(remaining)
+
+    def backoff(self, attempt: int, retry_after: float | None, throttled: bool) -> float | None:
+        if attempt >= self.max_retries:
+            return None
+        self.retries += 1
+
+        if retry_after is not None:
+            delay = min(retry_after, self.max_backoff) + random.uniform(0, 1)
+        else:
+            delay = random.uniform(0, min(self.max_backoff, 2 ** attempt))
+
+        if throttled:
+            # A 429 means the shared budget is spent: hold every queued call,
+            # not just the one that was rejected.
+            self.throttled += 1
+            self._resume_at = max(self._resume_at, time.monotonic() + delay)
+        return delay
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "admitted": self.admitted,
+            "wait_seconds_total": round(self.wait_total, 3),
+            "wait_seconds_avg": round(self.wait_total / self.admitted, 3) if self.admitted else 0.0,
+            "wait_seconds_max": round(self.wait_max, 3),
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "limits": {name: self.buckets[name].capacity for name in BUCKETS},
+            "available": {name: round(self.buckets[name].level, 1) for name in BUCKETS},
+        }
+
+
+def _number(value: str | None) -> float | None:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def retry_after(headers) -> float | None:
+    if headers is None:
+        return None
+    ms = _number(headers.get("retry-after-ms"))
+    if ms is not None:
+        return ms / 1000
+    value = headers.get("retry-after")
+    seconds = _number(value)
+    if seconds is not None:
+        return seconds
+    if value:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+    return None
@@ -0,0 +1,131 @@
+import asyncio
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable
+
+from sqlalchemy import case, event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.metaphor import Chapter, Metaphor
+from app.models.paper import PaperSection
+
+# Per-table write counters, bumped when a session that wrote to the table
+# commits. A read model is current while the counters of the tables it reads
+# are unchanged. This only sees writes made by this process; the TTL bounds
+# staleness when other processes share the database.
+_versions: dict[str, int] = defaultdict(int)
+
+
+def _pending(session: Session) -> set[str]:
+    return session.info.setdefault("read_model_tables", set())
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session, _flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        table = getattr(obj, "__tablename__", None)
+        if table:
+            _pending(session).add(table)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk(state):
+    # insert()/update()/delete() statements bypass the unit of work.
+    if state.is_insert or state.is_update or state.is_delete:
+        table = getattr(state.statement, "table", None)
+        if table is not None:
+            _pending(state.session).add(table.name)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish(session):
+    for table in session.info.pop("read_model_tables", ()):
+        _versions[table] += 1
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard(session):
+    session.info.pop("read_model_tables", None)
+
+
+class ReadModel:
+    # A query result kept in memory until one of `tables` is written to.
+    # Concurrent readers of a stale model share a single rebuild.
+
+    def __init__(self, tables: tuple[str, ...], build: Callable[[AsyncSession], Awaitable]):
+        self.tables = tables
+        self.build = build
+        self._value = None
+        self._stamp: tuple[int, ...] | None = None
+        self._built_at = 0.0
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.builds = 0
+
+    def _current(self) -> tuple[int, ...]:
+        return tuple(_versions[t] for t in self.tables)
+
+    def _fresh(self) -> bool:
+        return (
+            self._stamp == self._current()
+            and time.monotonic() - self._built_at < settings.read_model_ttl
+        )
+
+    async def get(self, db: AsyncSession):
+        if self._fresh():
+            self.hits += 1
+            return self._value
+        async with self._lock:
+            if self._fresh():
+                self.hits += 1
+                return self._value
+            # Stamped before building, so a write that lands mid-build makes
+            # the next read rebuild again.
+            stamp = self._current()
+            self._value = await self.build(db)
+            self._stamp = stamp
+            self._built_at = time.monotonic()
+            self.builds += 1
+            return self._value
+
+
+async def _extraction_stats(db: AsyncSession) -> dict:
+    chapters = select(
+        func.count(Chapter.id),
+        func.coalesce(func.sum(case((Chapter.processed == True, 1), else_=0)), 0),
+    )
+    total, processed = (await db.execute(chapters)).one()
+    metaphors = (await db.execute(select(func.count(Metaphor.id)))).scalar()
+    return {"total_chapters": total, "processed_chapters": processed, "total_metaphors": metaphors or 0}
+
+
+async def _count_by(db: AsyncSession, column) -> dict[int, int]:
+    result = await db.execute(
+        select(column, func.count(Metaphor.id)).where(column.is_not(None)).group_by(column)
+    )
+    return dict(result.all())
+
+
+def _translated(col):
+    return func.sum(case((func.coalesce(col, "") != "", 1), else_=0))
+
+
+async def _translation_coverage(db: AsyncSession) -> dict[int, dict]:
+    result = await db.execute(
+        select(
+            PaperSection.paper_id, func.count(PaperSection.id),
+            _translated(PaperSection.content_es), _translated(PaperSection.content_zh),
+        ).group_by(PaperSection.paper_id)
+    )
+    return {
+        paper_id: {"sections": sections, "es": es, "zh": zh}
+        for paper_id, sections, es, zh in result.all()
+    }
+
+
+extraction_stats = ReadModel(("chapters", "metaphors"), _extraction_stats)
+metaphors_per_topic = ReadModel(("metaphors",), lambda db: _count_by(db, Metaphor.topic_id))
+metaphors_per_chapter = ReadModel(("metaphors",), lambda db: _count_by(db, Metaphor.chapter_id))
+translation_coverage = ReadModel(("paper_sections",), _translation_coverage)
@@ -0,0 +1,107 @@
+import html
+import re
+
+from sqlalchemy import Select, column, func, inspect, literal_column, table
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.metaphor import Metaphor
+
+metaphors_fts = table("metaphors_fts", column("rowid"))
+
+# bm25 weights for exact_quote, explanation, meaning, user_notes.
+WEIGHTS = (4.0, 1.0, 2.0, 1.0)
+TERM = re.compile(r'"([^"]*)"|(\S+)')
+# Matches come back wrapped in these control characters; the snippet is
+# HTML-escaped before they are turned into <mark> tags.
+MARK_START, MARK_END = "\x02", "\x03"
+SNIPPET_WORDS = 16
+# Inlined rather than bound: PostgreSQL only uses an expression index when the
+# query repeats the expression with the same constants.
+ENGLISH = literal_column("'english'::regconfig")
+
+_fts_table: bool | None = None
+
+
+def fts_query(q: str) -> str:
+    # Free text from the search box is turned into quoted FTS5 terms, so
+    # punctuation and operators in it can never be a syntax error. "phrases"
+    # stay phrases and a trailing * keeps prefix matching (eye* -> eyes).
+    terms = []
+    for phrase, word in TERM.findall(q):
+        if phrase:
+            terms.append('"' + phrase.replace('"', "") + '"')
+        elif word:
+            prefix = word.endswith("*")
+            word = word.rstrip("*").replace('"', "")
+            if word:
+                terms.append(f'"{word}"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+def pg_document():
+    # Weighted like WEIGHTS above. Must stay identical to the expression of
+    # the GIN index created in migrations.py, or the index is not used.
+    def weighted(col, weight: str):
+        return func.setweight(
+            func.to_tsvector(ENGLISH, func.coalesce(col, literal_column("''"))), literal_column(f"'{weight}'")
+        )
+
+    return (
+        weighted(Metaphor.exact_quote, "A")
+        .op("||")(weighted(Metaphor.meaning, "B"))
+        .op("||")(weighted(Metaphor.explanation, "C"))
+        .op("||")(weighted(Metaphor.user_notes, "C"))
+    )
+
+
+async def _has_fts_table(db: AsyncSession) -> bool:
+    # metaphors_fts exists only on SQLite builds with FTS5 (see migrations.py).
+    global _fts_table
+    if _fts_table is None:
+        conn = await db.connection()
+        _fts_table = await conn.run_sync(lambda sync_conn: inspect(sync_conn).has_table("metaphors_fts"))
+    return _fts_table
+
+
+def _sqlite_search(query: Select, q: str) -> Select:
+    fts = literal_column("metaphors_fts")
+    return (
+        query.add_columns(
+            func.bm25(fts, *WEIGHTS).label("rank"),
+            # -1 lets FTS5 pick the column with the best match.
+            func.snippet(fts, -1, MARK_START, MARK_END, "…", SNIPPET_WORDS).label("snippet"),
+        )
+        .join(metaphors_fts, metaphors_fts.c.rowid == Metaphor.id)
+        .where(fts.match(fts_query(q)))
+    )
+
+
+def _postgres_search(query: Select, q: str) -> Select:
+    tsquery = func.websearch_to_tsquery(ENGLISH, q)
+    body = func.concat_ws(" … ", Metaphor.exact_quote, Metaphor.meaning, Metaphor.explanation, Metaphor.user_notes)
+    options = f"StartSel={MARK_START}, StopSel={MARK_END}, MaxWords={SNIPPET_WORDS}, MinWords=6"
+    return (
+        query.add_columns(
+            # Negated so that, as with bm25, better matches sort first.
+            (-func.ts_rank_cd(pg_document(), tsquery)).label("rank"),
+            func.ts_headline(ENGLISH, body, tsquery, options).label("snippet"),
+        )
+        .where(pg_document().op("@@")(tsquery))
+    )
+
+
+async def search_query(db: AsyncSession, query: Select, q: str) -> Select | None:
+    # Adds the match condition and rank/snippet columns to a metaphor query,
+    # best matches first. None when the database has no full-text index.
+    dialect = (await db.connection()).dialect.name
+    if dialect == "postgresql":
+        query = _postgres_search(query, q)
+    elif dialect == "sqlite" and await _has_fts_table(db):
+        query = _sqlite_search(query, q)
+    else:
+        return None
+    return query.order_by(literal_column("rank"), Metaphor.id)
+
+
+def highlight_html(raw: str | None) -> str:
+    return html.escape(raw or "").replace(MARK_START, "<mark>").replace(MARK_END, "</mark>")
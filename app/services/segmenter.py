@@ -0,0 +1,255 @@
+import mmap
+import re
+from dataclasses import dataclass, replace
+from typing import BinaryIO, Iterable, Iterator
+
+START_MARKERS = (b"*** START OF THE PROJECT GUTENBERG", b"***START OF")
+END_MARKERS = (b"*** END OF THE PROJECT GUTENBERG", b"***END OF")
+
+# Headings are short; longer lines are never decoded or matched.
+MAX_HEADING_BYTES = 120
+
+ROMAN_VALUES = {"I": 1, "V": 5, "X": 10, "L": 50, "C": 100, "D": 500, "M": 1000}
+ROMAN = re.compile(r"^M{0,4}(CM|CD|D?C{0,3})(XC|XL|L?X{0,3})(IX|IV|V?I{0,3})$")
+
+WORD_NUMBERS = {
+    w: i for i, w in enumerate(
+        "zero one two three four five six seven eight nine ten eleven twelve thirteen "
+        "fourteen fifteen sixteen seventeen eighteen nineteen".split()
+    )
+}
+WORD_TENS = {"twenty": 20, "thirty": 30, "forty": 40, "fifty": 50, "sixty": 60, "seventy": 70, "eighty": 80, "ninety": 90}
+
+LABEL = r"([IVXLCDM]+|\d{1,4}|[A-Za-z]+(?:-[A-Za-z]+)?)"
+
+
+def roman_to_int(label: str) -> int | None:
+    if not label or not ROMAN.match(label):
+        return None
+    total = 0
+    for i, ch in enumerate(label):
+        value = ROMAN_VALUES[ch]
+        if i + 1 < len(label) and ROMAN_VALUES[label[i + 1]] > value:
+            total -= value
+        else:
+            total += value
+    return total
+
+
+def word_to_int(label: str) -> int | None:
+    parts = label.lower().split("-")
+    if len(parts) == 1:
+        return WORD_NUMBERS.get(parts[0], WORD_TENS.get(parts[0]))
+    if len(parts) == 2 and parts[0] in WORD_TENS and parts[1] in WORD_NUMBERS and WORD_NUMBERS[parts[1]] < 10:
+        return WORD_TENS[parts[0]] + WORD_NUMBERS[parts[1]]
+    return None
+
+
+def label_value(label: str) -> int | None:
+    if label.isdigit():
+        return int(label)
+    value = roman_to_int(label) if label.isupper() else None
+    return value if value is not None else word_to_int(label)
+
+
+@dataclass(frozen=True)
+class HeadingRule:
+    kind: str  # "part" or "chapter"
+    pattern: re.Pattern
+    max_length: int = MAX_HEADING_BYTES
+    # Bare labels also occur in prose ("I" alone on a line), so they only
+    # count when a blank line follows and the numbering moves forward.
+    standalone: bool = False
+
+
+DEFAULT_RULES = (
+    HeadingRule("part", re.compile(rf"^(?:BOOK|PART|VOLUME)\s+{LABEL}\b[.:]?\s*(.*)$")),
+    HeadingRule("chapter", re.compile(rf"^CHAPTER\s+{LABEL}\b[.:]?\s*(.*)$")),
+    # Mixed-case keywords also open ordinary sentences ("Chapter 5 of the
+    # Act..."), so only short lines count as headings.
+    HeadingRule("part", re.compile(rf"^(?:Book|Part|Volume)\s+{LABEL}\b[.:]?\s*(.*)$"), max_length=50),
+    HeadingRule("chapter", re.compile(rf"^Chapter\s+{LABEL}\b[.:]?\s*(.*)$"), max_length=50),
+    # A bare numeral on its own line, as in "                   IV".
+    HeadingRule("chapter", re.compile(r"^([IVXLCDM]+|\d{1,3})\.?()$"), standalone=True),
+)
+
+
+@dataclass(frozen=True)
+class Span:
+    # Byte offsets of a chapter body in the source; the heading is excluded.
+    start: int
+    end: int
+    number: str
+    title: str
+    part: str | None
+    word_count: int
+
+
+class _Open:
+    def __init__(self, number: str, title: str, part: str | None, heading_words: int):
+        self.number = number
+        self.title = title
+        self.part = part
+        self.heading_words = heading_words
+        self.start: int | None = None
+        self.end = 0
+        self.words = 0
+
+
+class Segmenter:
+    # One pass over the lines of a source, tracking byte offsets. Headings must
+    # follow a blank line. A chapter with fewer than `min_words` words, or one
+    # repeating an earlier number, is not a chapter: its heading and text are
+    # folded back into the chapter before it, or dropped when nothing precedes
+    # it (table of contents entries, for instance). Only the Gutenberg body
+    # between the START/END markers is segmented when those markers exist.
+
+    def __init__(self, rules: Iterable[HeadingRule] = DEFAULT_RULES, min_words: int = 20):
+        self.rules = tuple(rules)
+        self.min_words = min_words
+
+    def _heading(self, line: bytes) -> tuple[HeadingRule, str, str] | None:
+        stripped = line.strip()
+        if not stripped or len(stripped) > MAX_HEADING_BYTES:
+            return None
+        text = stripped.decode("utf-8", errors="replace")
+        for rule in self.rules:
+            if len(stripped) > rule.max_length:
+                continue
+            match = rule.pattern.match(text)
+            if match and label_value(match.group(1)) is not None:
+                return rule, match.group(1), match.group(2).strip()
+        return None
+
+    def segment(self, lines: Iterable[bytes]) -> Iterator[Span]:
+        offset = 0
+        seen_start = False
+        prev_blank = True
+        part: str | None = None
+        parts_seen = 0
+        current: _Open | None = None
+        # The last complete chapter is held back so a short fragment after it
+        # can still be folded in.
+        last: Span | None = None
+        numbers: set[str] = set()
+        last_value: int | None = None
+        # A standalone heading waiting for the blank line that confirms it.
+        pending: tuple[int, bytes, tuple] | None = None
+
+        def close(chapter: _Open | None) -> Iterator[Span]:
+            nonlocal last
+            if chapter is None or chapter.start is None:
+                return
+            if chapter.words < self.min_words or chapter.number in numbers:
+                if last is not None and last.part == chapter.part:
+                    last = replace(
+                        last, end=chapter.end,
+                        word_count=last.word_count + chapter.heading_words + chapter.words,
+                    )
+                return
+            if last is not None:
+                yield last
+            numbers.add(chapter.number)
+            last = Span(chapter.start, chapter.end, chapter.number, chapter.title, chapter.part, chapter.words)
+
+        def add_text(line_start: int, line: bytes):
+            if current is not None and line.strip():
+                if current.start is None:
+                    current.start = line_start
+                current.end = line_start + len(line.rstrip(b"\r\n"))
+                current.words += len(line.split())
+
+        def open_heading(line: bytes, heading: tuple) -> Iterator[Span]:
+            nonlocal current, part, parts_seen, last_value
+            rule, label, title = heading
+            yield from close(current)
+            current = None
+            if rule.kind == "part":
+                parts_seen += 1
+                part = f"{parts_seen}"
+                last_value = None
+            else:
+                number = label if part is None else f"{part}.{label}"
+                current = _Open(number, title or f"Chapter {label}", part, len(line.split()))
+                last_value = label_value(label)
+
+        for line in lines:
+            line_start, offset = offset, offset + len(line)
+
+            if not seen_start and line.startswith(START_MARKERS):
+                # Everything before the START marker is licence boilerplate.
+                seen_start, current, last, part, parts_seen = True, None, None, None, 0
+                numbers, last_value, pending = set(), None, None
+                prev_blank = True
+                continue
+            if line.startswith(END_MARKERS):
+                break
+
+            blank = not line.strip()
+            if pending:
+                if blank:
+                    yield from open_heading(pending[1], pending[2])
+                    pending = None
+                    prev_blank = True
+                    continue
+                # Not followed by a blank line: it was text after all.
+                add_text(pending[0], pending[1])
+                pending = None
+
+            heading = self._heading(line) if prev_blank else None
+            prev_blank = blank
+            if heading and heading[0].standalone:
+                value = label_value(heading[1])
+                if last_value is None or value > last_value:
+                    pending = (line_start, line, heading)
+                    continue
+                heading = None
+
+            if heading:
+                yield from open_heading(line, heading)
+                # A heading may be followed directly by another one (tables of
+                # contents); the empty chapters that produces are dropped.
+                prev_blank = True
+                continue
+
+            add_text(line_start, line)
+
+        if pending:
+            add_text(pending[0], pending[1])
+        yield from close(current)
+        if last is not None:
+            yield last
+
+
+def iter_lines(source: BinaryIO | mmap.mmap) -> Iterator[bytes]:
+    # File objects (including gzip streams) iterate line by line; mmap needs
+    # readline. Either way only one line is held at a time.
+    if isinstance(source, mmap.mmap):
+        return iter(source.readline, b"")
+    return iter(source)
+
+
+def read_span(source: BinaryIO | mmap.mmap, span: Span) -> str:
+    if isinstance(source, mmap.mmap):
+        raw = source[span.start:span.end]
+    else:
+        # Spans come out in order, so this only ever seeks forward on
+        # streams that cannot seek backwards cheaply (gzip).
+        source.seek(span.start)
+        raw = source.read(span.end - span.start)
+    return raw.decode("utf-8", errors="replace").replace("\r\n", "\n").replace("\r", "\n")
+
+
+def iter_chapters(
+    lines: Iterable[bytes], reader: BinaryIO | mmap.mmap, segmenter: Segmenter | None = None
+) -> Iterator[dict]:
+    # `lines` drives segmentation and `reader` supplies the text of each span
+    # as it closes, so only one chapter is ever materialized at a time. For an
+    # mmap both can be the same object; streams need two handles.
+    for span in (segmenter or Segmenter()).segment(lines):
+        yield {
+            "number": span.number,
+            "title": span.title,
+            "text": read_span(reader, span),
+            "word_count": span.word_count,
+        }
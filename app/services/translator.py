@@ -2,7 +2,7 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.paper import Paper, PaperSection
-from app.schemas.llm import LLMRequest
+from app.schemas.llm import LLMBatchItem, LLMBatchResult, LLMRequest
 from app.services.llm_provider import get_provider
 
 LANG_NAMES = {"es": "Spanish", "zh": "Simplified Mandarin Chinese"}
@@ -10,7 +10,10 @@ LANG_NAMES = {"es": "Spanish", "zh": "Simplified Mandarin Chinese"}
 SYSTEM = """You are a professional academic translator specializing in literary analysis. \
 Translate with precision, maintaining the academic register and formal tone of the original."""
 
-TRANSLATE_PROMPT = """Translate the following academic paper section from English to {lang_name}.
+# Everything except the section itself is fixed for a given language. The
+# rules are far below the minimum cacheable prompt length, so they are not
+# marked for prompt caching.
+TRANSLATE_RULES = """Translate the academic paper section that follows from English to {lang_name}.
 
 Rules:
 - Maintain academic register and formal tone
@@ -19,9 +22,9 @@ original English in brackets: "translation" ["original English"]
 - Preserve all formatting (headings, paragraphs, block quotes)
 - For literary terms with no direct equivalent, use the closest term and add a brief \
 parenthetical explanation
-{extra_rules}
+{extra_rules}"""
 
-Section title: {title}
+TRANSLATE_PROMPT = """Section title: {title}
 
 Text to translate:
 ---
@@ -29,7 +32,33 @@ Text to translate:
 ---"""
 
 
-async def translate_paper(db: AsyncSession, paper_id: int, lang: str):
+def _rules(lang: str) -> str:
+    lang_name = LANG_NAMES.get(lang, lang)
+    extra_rules = ""
+    if lang == "zh":
+        extra_rules = "- Use Simplified Chinese characters throughout"
+    return TRANSLATE_RULES.format(lang_name=lang_name, extra_rules=extra_rules)
+
+
+def _section_request(rules: str, section: PaperSection) -> LLMRequest:
+    return LLMRequest(
+        system=SYSTEM,
+        prefix=rules,
+        prompt=TRANSLATE_PROMPT.format(title=section.title, text=section.content_en),
+        max_tokens=8192,
+        temperature=0.2,
+        hedge=True,
+    )
+
+
+def _set_content(section: PaperSection, lang: str, content: str):
+    if lang == "es":
+        section.content_es = content
+    elif lang == "zh":
+        section.content_zh = content
+
+
+async def _paper_sections(db: AsyncSession, paper_id: int) -> list[PaperSection]:
     paper = await db.get(Paper, paper_id)
     if not paper:
         raise ValueError(f"Paper {paper_id} not found")
@@ -37,36 +66,55 @@ async def translate_paper(db: AsyncSession, paper_id: int, lang: str):
     result = await db.execute(
         select(PaperSection).where(PaperSection.paper_id == paper_id).order_by(PaperSection.sort_order)
     )
-    sections = result.scalars().all()
+    return list(result.scalars().all())
 
-    lang_name = LANG_NAMES.get(lang, lang)
-    extra_rules = ""
-    if lang == "zh":
-        extra_rules = "- Use Simplified Chinese characters throughout"
 
+async def translate_paper(db: AsyncSession, paper_id: int, lang: str, skip: set[int] | None = None):
+    # `skip` holds ids of sections already translated by an interrupted run.
+    sections = await _paper_sections(db, paper_id)
+    rules = _rules(lang)
     provider = get_provider()
+    skip = skip or set()
 
     for section in sections:
-        if not section.content_en:
+        if not section.content_en or section.id in skip:
             continue
 
-        yield section.title, "translating"
+        yield section.id, section.title, "translating"
 
-        prompt = TRANSLATE_PROMPT.format(
-            lang_name=lang_name,
-            extra_rules=extra_rules,
-            title=section.title,
-            text=section.content_en,
-        )
+        resp = await provider.complete(_section_request(rules, section))
+        _set_content(section, lang, resp.content)
 
-        resp = await provider.complete(
-            LLMRequest(system=SYSTEM, prompt=prompt, max_tokens=8192, temperature=0.2)
-        )
+        await db.commit()
+        yield section.id, section.title, "complete"
 
-        if lang == "es":
-            section.content_es = resp.content
-        elif lang == "zh":
-            section.content_zh = resp.content
 
-        await db.commit()
-        yield section.title, "complete"
+async def build_batch(db: AsyncSession, paper_id: int, lang: str) -> tuple[list[LLMBatchItem], dict]:
+    sections = await _paper_sections(db, paper_id)
+    rules = _rules(lang)
+
+    items, targets = [], {}
+    for section in sections:
+        if not section.content_en:
+            continue
+        custom_id = f"sec{section.id}"
+        items.append(LLMBatchItem(custom_id=custom_id, request=_section_request(rules, section)))
+        targets[custom_id] = section.id
+    return items, targets
+
+
+async def store_batch_results(
+    db: AsyncSession, lang: str, targets: dict, results: list[LLMBatchResult]
+) -> list[str]:
+    errors = []
+    for r in results:
+        section_id = targets.get(r.custom_id)
+        section = await db.get(PaperSection, section_id) if section_id else None
+        if section is None:
+            continue
+        if r.error or r.response is None:
+            errors.append(f"{r.custom_id}: {r.error or 'missing response'}")
+            continue
+        _set_content(section, lang, r.response.content)
+    await db.commit()
+    return errors
@@ -1,4 +1,5 @@
 import json
+from functools import partial
 
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -13,50 +14,76 @@ F. Scott Fitzgerald's The Great Gatsby. Write in formal academic register with p
 literary analysis. Reference specific passages. Connect literary analysis to broader \
 cultural significance in 1920s America. Use MLA citation style for references to the novel."""
 
+# Shared by every section of a paper and sent as a cached prefix. It holds
+# only the topic names and descriptions, so its size does not grow with the
+# number of selected metaphors; each body section gets its own topic's
+# metaphors in the prompt.
+PAPER_BRIEF = """The paper "{title}" analyzes these metaphor systems in The Great Gatsby:
 
-async def generate_paper(db: AsyncSession, title: str, author: str, target_pages: int = 10):
-    paper = Paper(title=title, author=author, status="generating", target_pages=target_pages)
-    db.add(paper)
-    await db.commit()
-    await db.refresh(paper)
+{topics}"""
+
+
+async def generate_paper(
+    db: AsyncSession, title: str, author: str, target_pages: int = 10, paper_id: int | None = None
+):
+    # Passing paper_id resumes an interrupted run: sections that were already
+    # written (each is committed on its own) are skipped.
+    paper = await db.get(Paper, paper_id) if paper_id else None
+    if paper is None:
+        paper = Paper(title=title, author=author, status="generating", target_pages=target_pages)
+        db.add(paper)
+        await db.commit()
+        await db.refresh(paper)
 
     topics_result = await db.execute(select(Topic).order_by(Topic.sort_order))
     topics = list(topics_result.scalars().all())
-    topic_names = [t.name for t in topics]
+    brief = _paper_brief(paper, topics)
 
-    yield paper.id, "exec_summary", "generating"
-    await _generate_exec_summary(db, paper, topics)
-    yield paper.id, "exec_summary", "complete"
-
-    yield paper.id, "introduction", "generating"
-    await _generate_introduction(db, paper, topics)
-    yield paper.id, "introduction", "complete"
+    written = await db.execute(
+        select(PaperSection.section_type, PaperSection.topic_id).where(PaperSection.paper_id == paper.id)
+    )
+    done = {tuple(row) for row in written.all()}
 
+    steps = [
+        (("exec_summary", None), "exec_summary", partial(_generate_exec_summary, db, paper, brief)),
+        (("introduction", None), "introduction", partial(_generate_introduction, db, paper, brief)),
+    ]
     for i, topic in enumerate(topics):
-        yield paper.id, topic.name, "generating"
         prev_topic = topics[i - 1].name if i > 0 else None
         next_topic = topics[i + 1].name if i < len(topics) - 1 else None
-        await _generate_body_section(db, paper, topic, i + 2, prev_topic, next_topic)
-        yield paper.id, topic.name, "complete"
-
-    yield paper.id, "conclusion", "generating"
-    await _generate_conclusion(db, paper, topics)
-    yield paper.id, "conclusion", "complete"
-
-    yield paper.id, "index", "generating"
-    await _generate_index(db, paper)
-    yield paper.id, "index", "complete"
+        steps.append((
+            ("body", topic.id), topic.name,
+            partial(_generate_body_section, db, paper, brief, topic, i + 2, prev_topic, next_topic),
+        ))
+    steps += [
+        (("conclusion", None), "conclusion", partial(_generate_conclusion, db, paper, brief)),
+        (("index", None), "index", partial(_generate_index, db, paper)),
+    ]
+
+    for key, section_name, generate in steps:
+        if key in done:
+            continue
+        yield paper.id, section_name, "generating"
+        await generate()
+        yield paper.id, section_name, "complete"
 
     paper.status = "complete"
     await db.commit()
 
 
-async def _generate_exec_summary(db: AsyncSession, paper: Paper, topics: list[Topic]):
+def _paper_brief(paper: Paper, topics: list[Topic]) -> str:
     topic_desc = "\n".join(f"- {t.name}: {t.description}" for t in topics)
-    prompt = f"""Write a 200-word executive summary of an academic paper titled "{paper.title}".
+    return PAPER_BRIEF.format(title=paper.title, topics=topic_desc)
+
+
+def _section_request(brief: str, prompt: str, max_tokens: int) -> LLMRequest:
+    return LLMRequest(
+        system=SYSTEM, prefix=brief, prompt=prompt, max_tokens=max_tokens, cache_prefix=True, hedge=True,
+    )
 
-The paper analyzes these metaphor systems in The Great Gatsby:
-{topic_desc}
+
+async def _generate_exec_summary(db: AsyncSession, paper: Paper, brief: str):
+    prompt = f"""Write a 200-word executive summary of the academic paper titled "{paper.title}".
 
 Requirements:
 - Exactly 200 words (±5)
@@ -65,7 +92,7 @@ Requirements:
 - End with why this analysis matters"""
 
     provider = get_provider()
-    resp = await provider.complete(LLMRequest(system=SYSTEM, prompt=prompt, max_tokens=1024))
+    resp = await provider.complete(_section_request(brief, prompt, max_tokens=1024))
 
     section = PaperSection(
         paper_id=paper.id, section_type="exec_summary", title="Executive Summary",
@@ -76,13 +103,10 @@ Requirements:
     await db.commit()
 
 
-async def _generate_introduction(db: AsyncSession, paper: Paper, topics: list[Topic]):
-    topic_names = ", ".join(t.name for t in topics)
+async def _generate_introduction(db: AsyncSession, paper: Paper, brief: str):
     target = 300
 
-    prompt = f"""Write the introduction (~{target} words) for an academic paper titled "{paper.title}".
-
-The paper will analyze these metaphor systems: {topic_names}
+    prompt = f"""Write the introduction (~{target} words) for the academic paper titled "{paper.title}".
 
 Requirements:
 - State the thesis clearly
@@ -92,7 +116,7 @@ Requirements:
 - Approximately {target} words"""
 
     provider = get_provider()
-    resp = await provider.complete(LLMRequest(system=SYSTEM, prompt=prompt, max_tokens=2048))
+    resp = await provider.complete(_section_request(brief, prompt, max_tokens=2048))
 
     section = PaperSection(
         paper_id=paper.id, section_type="introduction", title="Introduction",
@@ -104,7 +128,7 @@ Requirements:
 
 
 async def _generate_body_section(
-    db: AsyncSession, paper: Paper, topic: Topic,
+    db: AsyncSession, paper: Paper, brief: str, topic: Topic,
     sort_order: int, prev_topic: str | None, next_topic: str | None,
 ):
     result = await db.execute(
@@ -142,7 +166,7 @@ Requirements:
 - Approximately {target} words{transitions}"""
 
     provider = get_provider()
-    resp = await provider.complete(LLMRequest(system=SYSTEM, prompt=prompt, max_tokens=4096))
+    resp = await provider.complete(_section_request(brief, prompt, max_tokens=4096))
 
     section = PaperSection(
         paper_id=paper.id, section_type="body", topic_id=topic.id,
@@ -153,14 +177,11 @@ Requirements:
     await db.commit()
 
 
-async def _generate_conclusion(db: AsyncSession, paper: Paper, topics: list[Topic]):
-    topic_names = ", ".join(t.name for t in topics)
+async def _generate_conclusion(db: AsyncSession, paper: Paper, brief: str):
     target = 300
 
     prompt = f"""Write the conclusion (~{target} words) for the paper "{paper.title}".
 
-Topics analyzed: {topic_names}
-
 Requirements:
 - Synthesize insights (don't just repeat)
 - Address Fitzgerald's craft with metaphor
@@ -169,7 +190,7 @@ Requirements:
 - Approximately {target} words"""
 
     provider = get_provider()
-    resp = await provider.complete(LLMRequest(system=SYSTEM, prompt=prompt, max_tokens=2048))
+    resp = await provider.complete(_section_request(brief, prompt, max_tokens=2048))
 
     section = PaperSection(
         paper_id=paper.id, section_type="conclusion", title="Conclusion",
@@ -2,3 +2,31 @@
 document.body.addEventListener('htmx:afterSwap', function(event) {
     // Re-initialize any dynamic elements after HTMX swaps
 });
+
+// Long-running work runs as a background job: POST to start it, then follow
+// its progress events. Closing the page does not stop the job.
+function startJob(url, body) {
+    const options = {method: 'POST'};
+    if (body !== undefined) {
+        options.headers = {'Content-Type': 'application/json'};
+        options.body = JSON.stringify(body);
+    }
+    return fetch(url, options).then(response => response.json()).then(data => {
+        if (data.error) throw new Error(data.error);
+        return data.job_id;
+    });
+}
+
+function followJob(jobId, onEvent, onDone) {
+    const source = new EventSource(`/api/jobs/${jobId}/events`);
+    source.onmessage = function(event) {
+        const data = JSON.parse(event.data);
+        if (data.status === 'done') {
+            source.close();
+            onDone(data);
+        } else {
+            onEvent(data);
+        }
+    };
+    return source;
+}
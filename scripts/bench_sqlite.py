@@ -0,0 +1,181 @@
+"""Compare the stock SQLite setup with the tuned profile and indexes.
+
+    python scripts/bench_sqlite.py --metaphors 100000
+
+Each profile gets a fresh database file seeded with the same synthetic data,
+then runs the list/filter queries the API issues and a mixed read/write load
+similar to job workers writing while pages are being served.
+"""
+import argparse
+import asyncio
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import func, insert, select, text, update  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+
+from app.models.database import Base, configure_sqlite, sqlite_pragmas  # noqa: E402
+from app.models.metaphor import Book, Chapter, Metaphor, Subtopic, Topic  # noqa: E402
+from app.models.migrations import MIGRATIONS  # noqa: E402
+from app.models.paper import Paper, PaperSection  # noqa: E402
+
+SECONDARY_INDEXES = [
+    index.name
+    for table in Base.metadata.sorted_tables
+    for index in table.indexes
+    if table.name in ("metaphors", "subtopics", "paper_sections")
+]
+
+
+async def seed(session_factory, metaphors: int, rng: random.Random) -> float:
+    chapters, topics, papers = 60, 40, 100
+    started = time.perf_counter()
+    async with session_factory() as db:
+        db.add(Book(title="Bench"))
+        await db.flush()
+        await db.execute(insert(Chapter), [
+            {"book_id": 1, "number": str(i), "title": f"Chapter {i}", "word_count": 5000} for i in range(chapters)
+        ])
+        await db.execute(insert(Topic), [{"name": f"Topic {i}", "sort_order": i} for i in range(topics)])
+        await db.execute(insert(Subtopic), [
+            {"topic_id": t + 1, "name": f"Sub {t}.{s}", "sort_order": s} for t in range(topics) for s in range(4)
+        ])
+        await db.execute(insert(Paper), [{"title": f"Paper {i}"} for i in range(papers)])
+        await db.execute(insert(PaperSection), [
+            {"paper_id": p + 1, "section_type": "body", "title": f"S{s}", "sort_order": s}
+            for p in range(papers) for s in range(20)
+        ])
+        await db.commit()
+
+        # Committed in small batches, the way extraction stores a window at a
+        # time, so journal and sync settings show up in the timing.
+        for start in range(0, metaphors, 500):
+            rows = []
+            for _ in range(min(500, metaphors - start)):
+                topic = rng.randrange(topics + 10)
+                rows.append({
+                    "chapter_id": rng.randrange(chapters) + 1,
+                    "exact_quote": "a quote " * rng.randrange(3, 12),
+                    "explanation": "explanation " * 20,
+                    "meaning": "meaning " * 10,
+                    "topic_id": topic + 1 if topic < topics else None,
+                    "subtopic_id": topic * 4 + rng.randrange(4) + 1 if topic < topics else None,
+                    "selected": rng.random() < 0.7,
+                    "confidence": rng.random(),
+                    "quote_start": rng.randrange(200_000),
+                })
+            await db.execute(insert(Metaphor), rows)
+            await db.commit()
+    return time.perf_counter() - started
+
+
+async def timed(session_factory, queries, repeat: int) -> float:
+    started = time.perf_counter()
+    async with session_factory() as db:
+        for i in range(repeat):
+            for query in queries(i):
+                (await db.execute(query)).all()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+async def mixed(session_factory, rng: random.Random, seconds: float) -> dict:
+    # Readers serve topic pages while a writer updates selections one commit at
+    # a time; counts completed operations and lock errors.
+    stop = time.perf_counter() + seconds
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+
+    async def reader():
+        async with session_factory() as db:
+            while time.perf_counter() < stop:
+                try:
+                    topic = rng.randrange(40) + 1
+                    (await db.execute(
+                        select(Metaphor.id).where(Metaphor.topic_id == topic, Metaphor.selected == True)
+                    )).all()
+                    await db.commit()
+                    counts["reads"] += 1
+                except Exception:
+                    counts["errors"] += 1
+                    await db.rollback()
+
+    async def writer():
+        async with session_factory() as db:
+            while time.perf_counter() < stop:
+                try:
+                    await db.execute(
+                        update(Metaphor).where(Metaphor.id == rng.randrange(1000) + 1).values(selected=rng.random() < 0.5)
+                    )
+                    await db.commit()
+                    counts["writes"] += 1
+                except Exception:
+                    counts["errors"] += 1
+                    await db.rollback()
+
+    await asyncio.gather(*(reader() for _ in range(4)), writer())
+    return counts
+
+
+async def run_profile(name: str, path: Path, metaphors: int, seconds: float) -> dict:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    if name == "tuned":
+        configure_sqlite(engine, sqlite_pragmas())
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        if name == "stock":
+            # The schema as it was before the index migration.
+            for index in SECONDARY_INDEXES:
+                await conn.execute(text(f"DROP INDEX IF EXISTS {index}"))
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    rng = random.Random(0)
+
+    results = {"seed_s": await seed(session_factory, metaphors, rng)}
+    results["by_chapter_ms"] = await timed(session_factory, lambda i: [
+        select(Metaphor).where(Metaphor.chapter_id == i % 60 + 1)
+        .order_by(Metaphor.chapter_id, Metaphor.quote_start, Metaphor.id)
+    ], 60)
+    results["topic_selected_ms"] = await timed(session_factory, lambda i: [
+        select(Metaphor).where(Metaphor.topic_id == i % 40 + 1, Metaphor.selected == True)
+    ], 200)
+    results["subtopic_ms"] = await timed(session_factory, lambda i: [
+        select(Metaphor.id).where(Metaphor.subtopic_id == i % 160 + 1)
+    ], 200)
+    results["min_confidence_ms"] = await timed(session_factory, lambda i: [
+        select(Metaphor.id).where(Metaphor.selected == True, Metaphor.confidence >= 0.95)
+    ], 50)
+    results["topic_counts_ms"] = await timed(session_factory, lambda i: [
+        select(func.count(Metaphor.id)).where(Metaphor.topic_id == t + 1) for t in range(40)
+    ], 10)
+    results["paper_sections_ms"] = await timed(session_factory, lambda i: [
+        select(PaperSection).where(PaperSection.paper_id == i % 100 + 1).order_by(PaperSection.sort_order)
+    ], 200)
+    results.update(await mixed(session_factory, rng, seconds))
+    await engine.dispose()
+    return results
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--metaphors", type=int, default=100_000)
+    parser.add_argument("--mixed-seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"schema migrations: {[v for v, _, _ in MIGRATIONS]}; pragmas: {sqlite_pragmas()}")
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for name in ("stock", "tuned"):
+            results[name] = await run_profile(name, Path(tmp) / f"{name}.db", args.metaphors, args.mixed_seconds)
+
+    print(f"\n{'metric':<20}{'stock':>12}{'tuned':>12}")
+    for metric in results["stock"]:
+        stock, tuned = results["stock"][metric], results["tuned"][metric]
+        fmt = "{:>12.2f}" if isinstance(stock, float) else "{:>12}"
+        print(f"{metric:<20}" + fmt.format(stock) + fmt.format(tuned))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
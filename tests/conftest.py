@@ -0,0 +1,60 @@
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Set before any app module is imported: the engine is built from settings at
+# import time. Each test that takes `db` gets this file recreated from scratch.
+DB_PATH = Path(tempfile.mkdtemp()) / "test.db"
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{DB_PATH}"
+
+
+async def reset_database():
+    from app.models.database import Base, engine
+    from app.services import read_models, search
+
+    await engine.dispose()
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{DB_PATH}{suffix}").unlink(missing_ok=True)
+    search._fts_table = None
+    # Cached read models from an earlier test describe another database.
+    for table in Base.metadata.tables:
+        read_models._versions[table] += 1
+
+
+@pytest.fixture
+async def db():
+    from app.models.database import async_session, create_tables, engine
+
+    await reset_database()
+    await create_tables()
+    async with async_session() as session:
+        yield session
+    await engine.dispose()
+
+
+@pytest.fixture
+def use_provider(monkeypatch):
+    # Installs a fake as the provider every service gets from get_provider().
+    from app.services import llm_provider
+
+    def install(provider):
+        monkeypatch.setattr(llm_provider, "_provider", provider)
+        return provider
+
+    return install
+
+
+@pytest.fixture
+async def client(db):
+    import httpx
+    from fastapi import FastAPI
+
+    from app.routers import metaphors
+
+    # Only the router under test; app.main also loads the PDF exporter.
+    app = FastAPI()
+    app.include_router(metaphors.router)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as c:
+        yield c
@@ -0,0 +1,78 @@
+import pytest
+from sqlalchemy import select
+
+from app.models.metaphor import Chapter, Metaphor, Subtopic, Topic
+
+
+@pytest.fixture
+async def metaphors(db):
+    chapters = [Chapter(number="1"), Chapter(number="2")]
+    db.add_all(chapters)
+    await db.flush()
+    rows = [
+        Metaphor(chapter_id=chapter.id, exact_quote=f"q{i}", explanation="e", meaning="m", confidence=c)
+        for i, (chapter, c) in enumerate([(chapters[0], 0.9), (chapters[0], 0.2), (chapters[1], 0.8)])
+    ]
+    db.add_all(rows)
+    await db.commit()
+    return rows
+
+
+async def selected(db) -> list[bool]:
+    result = await db.execute(
+        select(Metaphor.selected).order_by(Metaphor.id).execution_options(populate_existing=True)
+    )
+    return list(result.scalars())
+
+
+async def bulk(client, body: dict) -> dict:
+    return (await client.post("/api/metaphors/bulk", json=body)).json()
+
+
+@pytest.mark.parametrize("filter", [{}, {"unassigned": False}, {"chapter_id": None, "selected": None}])
+async def test_empty_filter_is_refused(client, db, metaphors, filter):
+    result = await bulk(client, {"filter": filter, "selected": False})
+
+    assert "filter.all" in result["error"]
+    assert await selected(db) == [True, True, True]
+
+
+async def test_empty_filter_updates_everything_when_asked(client, db, metaphors):
+    assert await bulk(client, {"filter": {"all": True}, "selected": False}) == {"status": "ok", "updated": 3}
+    assert await selected(db) == [False, False, False]
+
+
+async def test_filter_conditions_narrow_the_update(client, db, metaphors):
+    body = {"filter": {"chapter_id": metaphors[0].chapter_id, "min_confidence": 0.5}, "selected": False}
+
+    assert await bulk(client, body) == {"status": "ok", "updated": 1}
+    assert await selected(db) == [False, True, True]
+
+
+async def test_ids_and_filter_are_exclusive(client, db, metaphors):
+    assert await bulk(client, {"selected": False}) == {"error": "Give either ids or filter"}
+    assert await bulk(client, {"ids": [metaphors[0].id], "filter": {"all": True}, "selected": False}) == {
+        "error": "Give either ids or filter",
+    }
+    assert await bulk(client, {"ids": [metaphors[0].id]}) == {"error": "Nothing to update"}
+
+
+async def test_subtopic_sets_its_topic(client, db, metaphors):
+    topic, other = Topic(name="Money"), Topic(name="Eyes")
+    db.add_all([topic, other])
+    await db.flush()
+    subtopic = Subtopic(topic_id=topic.id, name="Voice")
+    db.add(subtopic)
+    await db.commit()
+    ids = [m.id for m in metaphors[:2]]
+
+    assert await bulk(client, {"ids": ids, "topic_id": other.id, "subtopic_id": subtopic.id}) == {
+        "error": "Subtopic belongs to another topic",
+    }
+    assert await bulk(client, {"ids": ids, "subtopic_id": subtopic.id}) == {"status": "ok", "updated": 2}
+
+    result = await db.execute(
+        select(Metaphor.topic_id, Metaphor.subtopic_id).order_by(Metaphor.id)
+        .execution_options(populate_existing=True)
+    )
+    assert result.all() == [(topic.id, subtopic.id), (topic.id, subtopic.id), (None, None)]
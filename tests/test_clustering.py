@@ -0,0 +1,41 @@
+from app.services.clustering import cluster, tokens
+
+WATER = [
+    "the dark water of the bay shone under the moon",
+    "moon light on the water of the bay",
+    "water lapped at the dock on the moonlit bay",
+]
+MONEY = [
+    "her voice was full of money and gold",
+    "the jingle of money and coins in her voice",
+    "gold and money rang in that voice",
+]
+
+
+def test_tokens_drop_stopwords_short_words_and_numbers():
+    assert tokens("The 1922 party at his house was on a Saturday") == ["party", "house", "saturday"]
+
+
+def test_cluster_separates_topics():
+    docs = list(enumerate(WATER + MONEY, start=1))
+    clusters = cluster(docs, k=2, examples=2, keywords=3)
+    assert sorted(sorted(c.member_ids) for c in clusters) == [[1, 2, 3], [4, 5, 6]]
+    for c in clusters:
+        assert len(c.example_ids) == 2
+        assert set(c.example_ids) <= set(c.member_ids)
+        assert {"water", "money"} & set(c.keywords)
+    assert [c.id for c in clusters] == [1, 2]
+
+
+def test_cluster_is_deterministic():
+    docs = list(enumerate(WATER + MONEY, start=1))
+    first = [(c.member_ids, c.example_ids, c.keywords) for c in cluster(docs, k=3)]
+    second = [(c.member_ids, c.example_ids, c.keywords) for c in cluster(docs, k=3)]
+    assert first == second
+
+
+def test_cluster_edge_cases():
+    assert cluster([], k=5) == []
+    clusters = cluster([(7, "the"), (8, "of and")], k=5)
+    assert sum(len(c.member_ids) for c in clusters) == 2
+    assert all(c.keywords == [] for c in clusters)
@@ -0,0 +1,49 @@
+import numpy as np
+
+from app.services import dedup
+from app.services.dedup import _bands_for, find_clusters, shingles, words
+
+QUOTE = "the green light at the end of the dock burned all night across the bay"
+
+
+def test_words_fold_quotes_dashes_and_punctuation():
+    assert words("“Old sport”—he said, ‘dreamily’…") == ["old", "sport", "he", "said", "dreamily"]
+
+
+def test_shingles_of_short_text_is_one_hash():
+    assert len(shingles("green light")) == 1
+    assert shingles("") == set()
+    assert shingles("Green, light!") == shingles("green light")
+
+
+def test_bands_for_tracks_threshold():
+    low_bands, low_rows = _bands_for(0.3)
+    high_bands, high_rows = _bands_for(0.9)
+    assert low_bands * low_rows == high_bands * high_rows == 128
+    assert low_rows < high_rows
+
+
+def test_find_clusters_groups_near_duplicates():
+    docs = [
+        (1, QUOTE),
+        (2, QUOTE.replace("all night", "all the night")),
+        (3, "so we beat on, boats against the current, borne back ceaselessly into the past"),
+    ]
+    assert find_clusters(docs, 0.5) == [[1, 2]]
+
+
+def test_find_clusters_compares_pairs_without_first_bucket_member(monkeypatch):
+    # Identical signatures put all three documents in one bucket in every
+    # band, headed by 1. Only 2 and 3 are similar, and that pair must still be
+    # checked.
+    monkeypatch.setattr(dedup, "signature", lambda hashes: np.zeros(dedup.NUM_PERM, dtype=np.uint64))
+    docs = [
+        (1, "so we beat on, boats against the current, borne back ceaselessly into the past"),
+        (2, QUOTE),
+        (3, QUOTE.replace("all night", "all the night")),
+    ]
+    assert find_clusters(docs, 0.5) == [[2, 3]]
+
+
+def test_find_clusters_ignores_empty_docs():
+    assert find_clusters([(1, ""), (2, "...")], 0.5) == []
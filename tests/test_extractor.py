@@ -0,0 +1,138 @@
+import pytest
+from sqlalchemy import select
+
+from app.models.metaphor import Chapter, ChapterText, Metaphor
+from app.services import extractor
+
+TEXT = (
+    "His heart beat faster and faster as Daisy's white face came up to his own. "
+    "Her voice is full of money, he said suddenly. "
+    "They were careless people, Tom and Daisy."
+)
+
+
+def item(quote: str, confidence: float = 0.5, explanation: str = "new") -> dict:
+    return {"exact_quote": quote, "explanation": explanation, "meaning": "m", "confidence": confidence}
+
+
+class StreamingFake:
+    def __init__(self, items: list[dict], fail: bool = False):
+        self.items = items
+        self.fail = fail
+
+    async def complete(self, request):
+        raise AssertionError("not used")
+
+    async def complete_structured(self, request, tool_name, tool_schema):
+        return {"metaphors": self.items}
+
+    async def stream_structured(self, request, tool_name, tool_schema, item_key):
+        for i in self.items:
+            yield i
+        if self.fail:
+            raise RuntimeError("connection lost")
+
+
+class PlainFake:
+    def __init__(self, items: list[dict]):
+        self.items = items
+
+    async def complete(self, request):
+        raise AssertionError("not used")
+
+    async def complete_structured(self, request, tool_name, tool_schema):
+        return {"metaphors": self.items}
+
+
+async def make_chapter(db) -> Chapter:
+    chapter = Chapter(number="1", title="One")
+    db.add(chapter)
+    await db.flush()
+    db.add(ChapterText(chapter_id=chapter.id, data=ChapterText.pack(TEXT)))
+    await db.commit()
+    return chapter
+
+
+async def rows(db) -> dict[str, Metaphor]:
+    result = await db.execute(
+        select(Metaphor).order_by(Metaphor.id).execution_options(populate_existing=True)
+    )
+    return {m.exact_quote: m for m in result.scalars().all()}
+
+
+async def test_stream_keeps_the_most_confident_duplicate(db, use_provider):
+    use_provider(StreamingFake([
+        item("full of money", 0.5, "first"),
+        item("Full of money.", 0.9, "second"),
+        item("full of money", 0.7, "third"),
+        item("careless people"),
+    ]))
+    chapter = await make_chapter(db)
+    emitted = []
+
+    async def on_metaphor(m):
+        emitted.append(m.exact_quote)
+
+    await extractor.extract_chapter(db, chapter, on_metaphor)
+
+    stored = await rows(db)
+    assert sorted(stored) == ["Full of money.", "careless people"]
+    assert stored["Full of money."].explanation == "second"
+    assert stored["Full of money."].confidence == 0.9
+    assert stored["Full of money."].quote_verified
+    # Only first sightings are reported as they stream in.
+    assert emitted == ["full of money", "careless people"]
+    await db.refresh(chapter)
+    assert chapter.processed
+
+
+async def test_failed_stream_leaves_previous_result_untouched(db, use_provider):
+    chapter = await make_chapter(db)
+    db.add(Metaphor(
+        chapter_id=chapter.id, exact_quote="full of money", explanation="old", meaning="m",
+        confidence=0.4, selected=False, user_notes="mine",
+    ))
+    await db.commit()
+
+    use_provider(StreamingFake([item("full of money", 0.9), item("careless people")], fail=True))
+    with pytest.raises(ExceptionGroup):
+        await extractor.extract_chapter(db, chapter)
+
+    stored = await rows(db)
+    assert list(stored) == ["full of money"]
+    kept = stored["full of money"]
+    assert (kept.explanation, kept.confidence, kept.selected, kept.user_notes) == ("old", 0.4, False, "mine")
+    await db.refresh(chapter)
+    assert not chapter.processed
+
+
+async def test_rerun_updates_surviving_rows_in_place(db, use_provider):
+    chapter = await make_chapter(db)
+    survivor = Metaphor(
+        chapter_id=chapter.id, exact_quote="full of money", explanation="old", meaning="m",
+        selected=False, user_notes="mine",
+    )
+    stale = Metaphor(chapter_id=chapter.id, exact_quote="white face", explanation="old", meaning="m")
+    db.add_all([survivor, stale])
+    await db.commit()
+    survivor_id = survivor.id
+
+    use_provider(StreamingFake([item("full of money", 0.8), item("careless people")]))
+    await extractor.extract_chapter(db, chapter)
+
+    stored = await rows(db)
+    assert sorted(stored) == ["careless people", "full of money"]
+    updated = stored["full of money"]
+    assert updated.id == survivor_id
+    assert (updated.explanation, updated.selected, updated.user_notes) == ("new", False, "mine")
+
+
+async def test_non_streaming_provider_uses_the_same_rules(db, use_provider):
+    use_provider(PlainFake([item("full of money", 0.3, "low"), item("full of money", 0.6, "high")]))
+    chapter = await make_chapter(db)
+
+    await extractor.extract_chapter(db, chapter)
+
+    stored = await rows(db)
+    assert list(stored) == ["full of money"]
+    assert stored["full of money"].explanation == "high"
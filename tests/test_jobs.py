@@ -0,0 +1,178 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select
+
+from app.models.job import Job
+from app.services import extractor, jobs
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    # The event binds to the loop it is first awaited in; every test gets its own.
+    monkeypatch.setattr(jobs, "_wakeup", asyncio.Event())
+    monkeypatch.setattr(jobs, "_running", {})
+
+
+def extraction(*events):
+    async def extract_all(db):
+        for event in events:
+            yield event
+
+    return extract_all
+
+
+async def reload(db, job: Job) -> Job:
+    result = await db.execute(select(Job).where(Job.id == job.id).execution_options(populate_existing=True))
+    return result.scalar_one()
+
+
+async def run(db, kind: str) -> Job:
+    await jobs.enqueue(db, kind)
+    job = await jobs._claim()
+    await jobs._execute(job)
+    return await reload(db, job)
+
+
+async def test_extraction_with_failed_chapters_finishes_failed(db, monkeypatch):
+    monkeypatch.setattr(extractor, "extract_all", extraction(
+        ("1", "processing", None),
+        ("2", "processing", None),
+        ("1", "complete", None),
+        ("2", "error", None),
+    ))
+
+    job = await run(db, "extract")
+
+    assert job.status == "failed"
+    assert job.error == "1 of 2 chapters failed"
+    assert job.progress == {"chapters_done": 1, "chapters_failed": 1}
+
+
+async def test_extraction_without_failures_completes(db, monkeypatch):
+    monkeypatch.setattr(extractor, "extract_all", extraction(("1", "processing", None), ("1", "complete", None)))
+
+    job = await run(db, "extract")
+
+    assert (job.status, job.error) == ("complete", None)
+    assert job.progress == {"chapters_done": 1}
+
+
+async def test_resumed_extraction_counts_only_its_own_failures(db, monkeypatch):
+    db.add(Job(kind="extract", params={}, progress={"chapters_done": 3, "chapters_failed": 2}))
+    await db.commit()
+    monkeypatch.setattr(extractor, "extract_all", extraction(("4", "complete", None), ("5", "complete", None)))
+
+    job = await jobs._claim()
+    await jobs._execute(job)
+    job = await reload(db, job)
+
+    assert job.status == "complete"
+    assert job.progress == {"chapters_done": 5, "chapters_failed": 0}
+
+
+async def test_enqueue_reuses_an_active_job_with_the_same_params(db):
+    first = await jobs.enqueue(db, "translate", {"paper_id": 1, "lang": "de"})
+
+    assert (await jobs.enqueue(db, "translate", {"paper_id": 1, "lang": "de"})).id == first.id
+    assert (await jobs.enqueue(db, "translate", {"paper_id": 1, "lang": "fr"})).id != first.id
+    with pytest.raises(ValueError):
+        await jobs.enqueue(db, "nope")
+
+
+async def test_claim_takes_each_queued_job_once_in_order(db):
+    first = await jobs.enqueue(db, "extract")
+    second = await jobs.enqueue(db, "reextract")
+
+    assert (await jobs._claim()).id == first.id
+    assert (await jobs._claim()).id == second.id
+    assert await jobs._claim() is None
+
+    claimed = await reload(db, first)
+    assert claimed.status == "running"
+    assert claimed.started_at is not None and claimed.heartbeat_at is not None
+
+
+async def test_heartbeat_refreshes_a_running_job(db, monkeypatch):
+    monkeypatch.setattr(jobs.settings, "job_heartbeat_interval", 0.01)
+    job = await jobs.enqueue(db, "extract")
+    await jobs._claim()
+    claimed_at = (await reload(db, job)).heartbeat_at
+    work = asyncio.create_task(asyncio.sleep(10))
+
+    heartbeat = asyncio.create_task(jobs._heartbeat(job.id, work))
+    await asyncio.sleep(0.05)
+    heartbeat.cancel()
+    await asyncio.gather(heartbeat, return_exceptions=True)
+
+    assert (await reload(db, job)).heartbeat_at > claimed_at
+    assert not work.cancelled()
+    work.cancel()
+
+
+async def test_heartbeat_stops_the_task_once_the_job_is_cancelled(db, monkeypatch):
+    monkeypatch.setattr(jobs.settings, "job_heartbeat_interval", 0.01)
+    job = await jobs.enqueue(db, "extract")
+    await jobs._claim()
+    work = asyncio.create_task(asyncio.sleep(10))
+
+    # Cancelled from "another process": nothing local is registered in _running.
+    await jobs.cancel(db, await reload(db, job))
+    await asyncio.wait_for(jobs._heartbeat(job.id, work), 1)
+
+    await asyncio.gather(work, return_exceptions=True)
+    assert work.cancelled()
+
+
+async def test_requeue_stale_only_takes_over_dead_jobs(db, monkeypatch):
+    monkeypatch.setattr(jobs.settings, "job_stale_after", 60)
+    now = datetime.now(timezone.utc)
+    stale = Job(kind="extract", status="running", heartbeat_at=now - timedelta(minutes=5))
+    silent = Job(kind="reextract", status="running", heartbeat_at=None)
+    alive = Job(kind="paper", status="running", heartbeat_at=now)
+    done = Job(kind="translate", status="complete", heartbeat_at=now - timedelta(minutes=5))
+    db.add_all([stale, silent, alive, done])
+    await db.commit()
+
+    await jobs._requeue_stale()
+
+    assert [(await reload(db, j)).status for j in (stale, silent, alive, done)] == [
+        "queued", "queued", "running", "complete",
+    ]
+
+
+async def test_cancel_is_not_overwritten_by_finish(db):
+    job = await jobs.enqueue(db, "extract")
+    await jobs._claim()
+
+    job = await jobs.cancel(db, await reload(db, job))
+    await jobs._finish(job.id, "complete")
+
+    job = await reload(db, job)
+    assert job.status == "cancelled" and job.finished_at is not None
+    # Cancelling a finished job changes nothing.
+    assert (await jobs.cancel(db, job)).status == "cancelled"
+
+
+async def test_worker_stops_a_running_job_on_cancel(db, monkeypatch):
+    started = asyncio.Event()
+
+    async def slow(ctx):
+        started.set()
+        await asyncio.sleep(10)
+
+    monkeypatch.setitem(jobs.HANDLERS, "slow", slow)
+    job = await jobs.enqueue(db, "slow")
+    worker = asyncio.create_task(jobs._worker())
+    try:
+        await asyncio.wait_for(started.wait(), 1)
+        task = jobs._running[job.id]
+        await jobs.cancel(db, await reload(db, job))
+        await asyncio.gather(task, return_exceptions=True)
+        assert task.cancelled()
+    finally:
+        worker.cancel()
+        await asyncio.gather(worker, return_exceptions=True)
+
+    assert (await reload(db, job)).status == "cancelled"
@@ -0,0 +1,33 @@
+import json
+
+from app.services.json_stream import ArrayItemParser
+
+DOCUMENT = json.dumps({
+    "notes": [{"metaphors": "not this one"}],
+    "metaphors": [
+        {"quote": "a {brace} and a \"quote\"", "tags": ["x", {"y": 1}]},
+        {"quote": "second ]}", "confidence": 0.5},
+    ],
+    "after": [{"ignored": True}],
+})
+
+
+def test_items_come_out_in_order_whatever_the_chunking():
+    expected = json.loads(DOCUMENT)["metaphors"]
+    for size in (1, 3, 7, len(DOCUMENT)):
+        parser = ArrayItemParser("metaphors")
+        items = []
+        for start in range(0, len(DOCUMENT), size):
+            items.extend(parser.feed(DOCUMENT[start:start + size]))
+        assert items == expected
+
+
+def test_item_is_returned_as_soon_as_it_closes():
+    parser = ArrayItemParser("metaphors")
+    assert parser.feed('{"metaphors": [{"quote": "one"}, {"quote": "tw') == [{"quote": "one"}]
+    assert parser.feed('o"}') == [{"quote": "two"}]
+
+
+def test_other_keys_and_nested_arrays_are_ignored():
+    parser = ArrayItemParser("metaphors")
+    assert parser.feed('{"other": [{"metaphors": [{"a": 1}]}], "metaphors": []}') == []
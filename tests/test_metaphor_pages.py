@@ -0,0 +1,90 @@
+import pytest
+
+from app.models.metaphor import Chapter, Metaphor
+from app.routers.metaphors import SORTS
+
+# (chapter, quote_start, confidence); None where the quote was not located or
+# the metaphor predates confidence scores.
+ROWS = [
+    (2, 10, 0.5),
+    (1, None, 0.9),
+    (1, 40, None),
+    (2, None, 0.5),
+    (1, 5, 0.9),
+    (1, None, None),
+    (2, 3, 0.1),
+]
+
+
+def expected_order(metaphors: list[Metaphor], sort: str) -> list[int]:
+    # NULLs first ascending and last descending, as the endpoint documents.
+    def key(m):
+        parts = []
+        for col, desc in SORTS[sort]:
+            value = getattr(m, col.key)
+            parts.append((value is None, -(value or 0)) if desc else (value is not None, value or 0))
+        return parts
+
+    return [m.id for m in sorted(metaphors, key=key)]
+
+
+@pytest.fixture
+async def metaphors(db):
+    chapters = [Chapter(number=str(n)) for n in (1, 2)]
+    db.add_all(chapters)
+    await db.flush()
+    rows = [
+        Metaphor(
+            chapter_id=chapters[chapter - 1].id, exact_quote=f"quote {i}", explanation="e", meaning="m",
+            quote_start=start, confidence=confidence,
+        )
+        for i, (chapter, start, confidence) in enumerate(ROWS)
+    ]
+    db.add_all(rows)
+    await db.commit()
+    return rows
+
+
+async def walk(client, sort: str, limit: int) -> list[int]:
+    ids, after = [], None
+    while True:
+        params = {"sort": sort, "limit": limit}
+        if after is not None:
+            params["after_id"] = after
+        page = (await client.get("/api/metaphors", params=params)).json()
+        assert len(page["items"]) <= limit
+        ids += [item["id"] for item in page["items"]]
+        after = page["next_after_id"]
+        if after is None:
+            return ids
+
+
+@pytest.mark.parametrize("sort", list(SORTS))
+@pytest.mark.parametrize("limit", [1, 2, 3, 7])
+async def test_pages_cover_every_row_once_in_order(client, metaphors, sort, limit):
+    assert await walk(client, sort, limit) == expected_order(metaphors, sort)
+
+
+@pytest.mark.parametrize("sort", list(SORTS))
+async def test_stream_from_cursor_continues_the_order(client, metaphors, sort):
+    order = expected_order(metaphors, sort)
+    streamed = (await client.get("/api/metaphors", params={"sort": sort})).json()
+    assert [item["id"] for item in streamed] == order
+
+    # Every position as a cursor, NULL-keyed rows included.
+    for i, cursor in enumerate(order):
+        rest = (await client.get("/api/metaphors", params={"sort": sort, "after_id": cursor})).json()
+        assert [item["id"] for item in rest] == order[i + 1:]
+
+
+async def test_filters_apply_to_pages(client, metaphors):
+    chapter_id = metaphors[1].chapter_id
+    ids = [m.id for m in metaphors if m.chapter_id == chapter_id]
+    page = (await client.get("/api/metaphors", params={"chapter_id": chapter_id, "sort": "id", "limit": 10})).json()
+    assert [item["id"] for item in page["items"]] == sorted(ids)
+    assert page["next_after_id"] is None
+
+
+async def test_bad_cursor_and_sort_are_reported(client, metaphors):
+    assert (await client.get("/api/metaphors", params={"after_id": 999})).json() == {"error": "after_id not found"}
+    assert "sort must be one of" in (await client.get("/api/metaphors", params={"sort": "nope"})).json()["error"]
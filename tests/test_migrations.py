@@ -0,0 +1,82 @@
+from sqlalchemy import inspect, select, text
+
+from app.models.database import create_tables, engine
+from app.models.metaphor import ChapterText
+from app.models.migrations import MIGRATIONS, run_migrations, schema_migrations
+
+from conftest import reset_database
+
+VERSIONS = [version for version, _, _ in MIGRATIONS]
+MIGRATED_INDEXES = {
+    "ix_metaphors_chapter_position", "ix_metaphors_topic_selected", "ix_metaphors_selected_confidence",
+    "ix_metaphors_confidence", "ix_metaphors_subtopic_id", "ix_subtopics_topic_id",
+    "ix_paper_sections_paper_order",
+}
+
+# The schema as it was before versioned migrations: chapter bodies inline,
+# none of the later columns or indexes, no schema_migrations table.
+BASELINE = [
+    "CREATE TABLE chapters (id INTEGER PRIMARY KEY, number VARCHAR(10) NOT NULL, title VARCHAR(200), "
+    "text TEXT NOT NULL, word_count INTEGER, processed BOOLEAN)",
+    "CREATE TABLE metaphors (id INTEGER PRIMARY KEY, chapter_id INTEGER NOT NULL REFERENCES chapters(id), "
+    "exact_quote TEXT NOT NULL, explanation TEXT NOT NULL, meaning TEXT NOT NULL, suggested_topic VARCHAR(200), "
+    "topic_id INTEGER, selected BOOLEAN, user_notes TEXT)",
+    "INSERT INTO chapters (id, number, title, text, word_count, processed) VALUES "
+    "(1, '1', 'One', 'In my younger and more vulnerable years', 7, 1), (2, '2', 'Two', '', 0, 0)",
+    "INSERT INTO metaphors (id, chapter_id, exact_quote, explanation, meaning, selected) VALUES "
+    "(1, 1, 'valley of ashes', 'a wasteland', 'decay', 1)",
+]
+
+
+def schema(conn) -> dict:
+    inspector = inspect(conn)
+    versions = select(schema_migrations.c.version).order_by(schema_migrations.c.version)
+    return {
+        "versions": list(conn.execute(versions).scalars()),
+        "chapter_columns": {c["name"] for c in inspector.get_columns("chapters")},
+        "indexes": {
+            index["name"] for table in inspector.get_table_names() for index in inspector.get_indexes(table)
+        },
+        "fts": inspector.has_table("metaphors_fts"),
+    }
+
+
+async def test_fresh_database_records_every_migration(db):
+    async with engine.begin() as conn:
+        state = await conn.run_sync(schema)
+        # Everything is recorded, so running again does nothing.
+        assert await conn.run_sync(run_migrations) == []
+
+    assert state["versions"] == VERSIONS
+    assert "text" not in state["chapter_columns"]
+    assert MIGRATED_INDEXES <= state["indexes"]
+    assert state["fts"]
+
+
+async def test_baseline_database_is_migrated_in_place():
+    await reset_database()
+    async with engine.begin() as conn:
+        for statement in BASELINE:
+            await conn.execute(text(statement))
+
+    await create_tables()
+    # A second start-up finds nothing left to do.
+    await create_tables()
+
+    async with engine.begin() as conn:
+        state = await conn.run_sync(schema)
+        bodies = dict((await conn.execute(select(ChapterText.chapter_id, ChapterText.data))).all())
+        found = (await conn.execute(text(
+            "SELECT rowid FROM metaphors_fts WHERE metaphors_fts MATCH 'wasteland'"
+        ))).scalars().all()
+    await engine.dispose()
+
+    assert state["versions"] == VERSIONS
+    assert "text" not in state["chapter_columns"]
+    assert {"book_id", "content_hash", "extraction_version"} <= state["chapter_columns"]
+    assert MIGRATED_INDEXES <= state["indexes"]
+    assert {chapter_id: ChapterText.unpack(data) for chapter_id, data in bodies.items()} == {
+        1: "In my younger and more vulnerable years", 2: "",
+    }
+    # Rows that predate the index are found too.
+    assert found == [1]
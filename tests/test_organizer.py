@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+from sqlalchemy import select
+
+from app.models.metaphor import Chapter, Metaphor, Subtopic, Topic
+from app.services import organizer
+from app.services.clustering import Cluster
+
+# Clusters keyed by each metaphor's suggested topic. "glasses" is left out of
+# the model's answer and has to join the topic nearest to it ("Sight").
+CENTROIDS = {
+    "money": (0, [1.0, 0.0, 0.0]),
+    "eyes": (1, [0.0, 1.0, 0.0]),
+    "glasses": (2, [0.1, 0.9, 0.1]),
+}
+ORGANIZED = {"topics": [
+    {"name": "Wealth", "description": "What money buys", "cluster_ids": [0]},
+    {"name": "Sight", "description": "Who is watching", "cluster_ids": [],
+     "subtopics": [{"name": "Eyes", "cluster_ids": [1, 7]}]},
+]}
+
+
+def fake_cluster(docs, k, examples):
+    groups: dict[str, list[int]] = {}
+    for doc_id, text in docs:
+        groups.setdefault(text.rsplit(" ", 1)[-1], []).append(doc_id)
+    return [
+        Cluster(
+            id=CENTROIDS[name][0], member_ids=ids, example_ids=ids[:examples], keywords=[name],
+            centroid=np.array(CENTROIDS[name][1]) / np.linalg.norm(CENTROIDS[name][1]),
+        )
+        for name, ids in groups.items()
+    ]
+
+
+class Organizer:
+    def __init__(self, organized: dict):
+        self.organized = organized
+        self.requests = []
+
+    async def complete(self, request):
+        raise AssertionError("not used")
+
+    async def complete_structured(self, request, tool_name, tool_schema):
+        self.requests.append(request)
+        return self.organized
+
+
+@pytest.fixture
+async def library(db, monkeypatch):
+    monkeypatch.setattr(organizer, "cluster", fake_cluster)
+    chapter = Chapter(number="1")
+    old = Topic(name="Old", sort_order=0)
+    db.add_all([chapter, old])
+    await db.flush()
+    old_sub = Subtopic(topic_id=old.id, name="Old sub")
+    db.add(old_sub)
+    await db.flush()
+    suggested = ["money", "money", "eyes", "glasses", "eyes"]
+    rows = [
+        Metaphor(
+            chapter_id=chapter.id, exact_quote=f"quote {i}", explanation="e", meaning="m",
+            suggested_topic=topic, topic_id=old.id, subtopic_id=old_sub.id,
+        )
+        for i, topic in enumerate(suggested)
+    ]
+    # Not selected: never organized, but its stale assignment is cleared too.
+    rows.append(Metaphor(
+        chapter_id=chapter.id, exact_quote="dropped", explanation="e", meaning="m", suggested_topic="money",
+        selected=False, topic_id=old.id,
+    ))
+    db.add_all(rows)
+    await db.commit()
+    return rows
+
+
+async def assignments(db) -> list[tuple[str | None, str | None]]:
+    result = await db.execute(
+        select(Topic.name, Subtopic.name)
+        .select_from(Metaphor)
+        .outerjoin(Topic, Topic.id == Metaphor.topic_id)
+        .outerjoin(Subtopic, Subtopic.id == Metaphor.subtopic_id)
+        .order_by(Metaphor.id)
+    )
+    return [tuple(row) for row in result.all()]
+
+
+async def test_rebuild_replaces_topics_and_assignments(db, library, use_provider):
+    provider = use_provider(Organizer(ORGANIZED))
+
+    topics = await organizer.auto_organize(db)
+
+    assert [(t.name, t.description, t.sort_order) for t in topics] == [
+        ("Wealth", "What money buys", 0), ("Sight", "Who is watching", 1),
+    ]
+    assert (await db.execute(select(Topic.name).order_by(Topic.sort_order))).scalars().all() == ["Wealth", "Sight"]
+    assert (await db.execute(select(Subtopic.name))).scalars().all() == ["Eyes"]
+    assert await assignments(db) == [
+        ("Wealth", None), ("Wealth", None), ("Sight", "Eyes"), ("Sight", None), ("Sight", "Eyes"), (None, None),
+    ]
+    prompt = provider.requests[0].prompt
+    assert "The 5 metaphors have been grouped into 3 clusters" in prompt
+    assert "dropped" not in prompt
+
+
+async def test_empty_answer_clears_everything(db, library, use_provider):
+    use_provider(Organizer({"topics": []}))
+
+    assert await organizer.auto_organize(db) == []
+
+    assert (await db.execute(select(Topic))).scalars().all() == []
+    assert (await db.execute(select(Subtopic))).scalars().all() == []
+    assert set(await assignments(db)) == {(None, None)}
+
+
+async def test_rebuild_is_repeatable(db, library, use_provider):
+    use_provider(Organizer(ORGANIZED))
+
+    await organizer.auto_organize(db)
+    first = await assignments(db)
+    await organizer.auto_organize(db)
+
+    assert await assignments(db) == first
+    assert (await db.execute(select(Topic.name).order_by(Topic.sort_order))).scalars().all() == ["Wealth", "Sight"]
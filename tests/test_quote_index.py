@@ -0,0 +1,46 @@
+from app.services.quote_index import QuoteIndex, normalize
+
+SOURCE = "He stretched out his arms toward the dark water in a curious way—and, far as I was from him, I could have sworn he was trembling… “Old  sport,” he said."
+
+
+def test_normalize_maps_every_character_to_its_source():
+    text, offsets = normalize("A  “B” -- c…")
+    assert text == 'a "b"-c...'
+    assert len(offsets) == len(text)
+    assert list(offsets) == [0, 1, 3, 4, 5, 7, 10, 11, 11, 11]
+
+
+def test_normalize_keeps_offsets_aligned_when_lowercase_expands():
+    text, offsets = normalize("İstanbul harbor")
+    assert len(offsets) == len(text)
+    index = QuoteIndex.build("İstanbul harbor lights")
+    start, end = index.locate("harbor lights")
+    assert "İstanbul harbor lights"[start:end] == "harbor lights"
+
+
+def test_locate_returns_source_offsets():
+    index = QuoteIndex.build(SOURCE)
+    start, end = index.locate("toward the dark water")
+    assert SOURCE[start:end] == "toward the dark water"
+
+
+def test_locate_ignores_quote_style_dashes_and_case():
+    index = QuoteIndex.build(SOURCE)
+    start, end = index.locate('curious way - and, far as I was from him')
+    assert SOURCE[start:end] == "curious way—and, far as I was from him"
+    start, end = index.locate('"old sport," HE SAID')
+    assert SOURCE[start:end] == "Old  sport,” he said"
+
+
+def test_locate_elided_quote_spans_all_fragments():
+    index = QuoteIndex.build(SOURCE)
+    start, end = index.locate("He stretched out ... he was trembling")
+    assert SOURCE[start:end] == SOURCE[:SOURCE.index("…")]
+    assert index.locate("trembling ... He stretched out") is None
+
+
+def test_round_trip_through_bytes():
+    index = QuoteIndex.build(SOURCE)
+    restored = QuoteIndex.from_bytes(index.to_bytes())
+    assert restored.text == index.text
+    assert restored.offsets == index.offsets
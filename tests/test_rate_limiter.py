@@ -0,0 +1,94 @@
+import pytest
+
+from app.services import rate_limiter
+from app.services.rate_limiter import RateLimiter, TokenBucket, retry_after
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", clock)
+    return clock
+
+
+def test_bucket_without_limit_never_waits(clock):
+    bucket = TokenBucket()
+    bucket.take(10_000)
+    assert not bucket.enabled
+    assert bucket.wait_time(10_000) == 0.0
+
+
+def test_bucket_refills_per_second(clock):
+    bucket = TokenBucket(60)
+    bucket.take(60)
+    assert bucket.wait_time(30) == pytest.approx(30)
+    clock.now += 10
+    assert bucket.wait_time(30) == pytest.approx(20)
+    clock.now += 1000
+    assert bucket.wait_time(60) == 0
+    assert bucket.level == 60
+
+
+def test_oversized_request_waits_for_full_bucket_only(clock):
+    bucket = TokenBucket(60)
+    bucket.take(30)
+    assert bucket.wait_time(1000) == pytest.approx(30)
+
+
+def test_sync_never_raises_level(clock):
+    bucket = TokenBucket(100)
+    bucket.sync(40)
+    assert bucket.level == 40
+    bucket.sync(90)
+    assert bucket.level == 40
+
+
+async def test_release_refunds_unused_output(clock):
+    limiter = RateLimiter(output_tokens_per_minute=1000)
+    reservation = await limiter.acquire(input_tokens=10, output_tokens=800)
+    assert limiter.buckets["output_tokens"].level == 200
+    limiter.release(reservation, input_tokens=10, output_tokens=100)
+    assert limiter.buckets["output_tokens"].level == 900
+    # A second release of the same reservation is ignored.
+    limiter.release(reservation)
+    assert limiter.buckets["output_tokens"].level == 900
+    assert limiter.stats()["in_flight"] == 0
+
+
+def test_observe_learns_unconfigured_limits(clock):
+    limiter = RateLimiter(requests_per_minute=50)
+    limiter.observe({
+        "anthropic-ratelimit-requests-limit": "4000",
+        "anthropic-ratelimit-requests-remaining": "10",
+        "anthropic-ratelimit-input-tokens-limit": "400000",
+        "anthropic-ratelimit-input-tokens-remaining": "1000",
+    })
+    assert limiter.buckets["requests"].capacity == 50
+    assert limiter.buckets["requests"].level == 10
+    assert limiter.buckets["input_tokens"].capacity == 400000
+    assert limiter.buckets["input_tokens"].level == 1000
+    assert not limiter.buckets["output_tokens"].enabled
+
+
+def test_backoff_gives_up_after_max_retries(clock):
+    limiter = RateLimiter(max_retries=2, max_backoff=5)
+    assert 0 <= limiter.backoff(0, None, throttled=False) <= 1
+    assert 5 <= limiter.backoff(1, 30, throttled=True) <= 6
+    assert limiter.backoff(2, None, throttled=False) is None
+    assert limiter.stats()["throttled"] == 1
+
+
+def test_retry_after_headers():
+    assert retry_after(None) is None
+    assert retry_after({"retry-after-ms": "1500", "retry-after": "9"}) == 1.5
+    assert retry_after({"retry-after": "3"}) == 3.0
+    assert retry_after({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}) == 0.0
+    assert retry_after({"retry-after": "soon"}) is None
@@ -0,0 +1,101 @@
+import pytest
+from sqlalchemy import delete, insert, select, update
+
+from app.models.metaphor import Chapter, Metaphor
+from app.services import search
+
+
+@pytest.mark.parametrize("q, expected", [
+    ("green light", '"green" "light"'),
+    ('"old sport" eye*', '"old sport" "eye"*'),
+    ('AND OR NOT ( ) "', '"AND" "OR" "NOT" "(" ")"'),
+    ("*  ", ""),
+])
+def test_fts_query_quotes_every_term(q, expected):
+    assert search.fts_query(q) == expected
+
+
+def test_highlight_escapes_before_marking():
+    assert search.highlight_html("<b>\x02eyes\x03</b>") == "&lt;b&gt;<mark>eyes</mark>&lt;/b&gt;"
+
+
+@pytest.fixture
+async def chapter(db):
+    chapter = Chapter(number="1")
+    db.add(chapter)
+    await db.commit()
+    return chapter
+
+
+def metaphor(chapter, quote: str, explanation: str = "", **kwargs) -> Metaphor:
+    return Metaphor(chapter_id=chapter.id, exact_quote=quote, explanation=explanation, meaning="", **kwargs)
+
+
+async def matches(db, q: str) -> list[int]:
+    query = await search.search_query(db, select(Metaphor.id), q)
+    return list((await db.execute(query)).scalars())
+
+
+async def test_triggers_keep_the_index_in_step(db, chapter):
+    m = metaphor(chapter, "the green light", "hope across the bay")
+    db.add(m)
+    await db.commit()
+    assert await matches(db, "hope") == [m.id]
+
+    # Bulk statements go through the same triggers as ORM writes.
+    await db.execute(update(Metaphor).where(Metaphor.id == m.id).values(explanation="longing for Daisy"))
+    await db.commit()
+    assert await matches(db, "hope") == []
+    assert await matches(db, "daisy") == [m.id]
+
+    # Columns outside the index leave it alone.
+    await db.execute(update(Metaphor).where(Metaphor.id == m.id).values(selected=False, confidence=0.3))
+    await db.commit()
+    assert await matches(db, "daisy") == [m.id]
+
+    await db.execute(insert(Metaphor).values(
+        chapter_id=chapter.id, exact_quote="valley of ashes", explanation="", meaning="", user_notes="daisy too",
+    ))
+    await db.commit()
+    assert len(await matches(db, "daisy")) == 2
+
+    await db.execute(delete(Metaphor).where(Metaphor.id == m.id))
+    await db.commit()
+    assert await matches(db, "green") == []
+    assert len(await matches(db, "daisy")) == 1
+
+
+async def test_stemming_and_prefixes(db, chapter):
+    m = metaphor(chapter, "her eyes were dreaming")
+    db.add(m)
+    await db.commit()
+
+    assert await matches(db, "dream") == [m.id]
+    assert await matches(db, "ey*") == [m.id]
+    assert await matches(db, '"eyes dreaming"') == []
+
+
+async def test_endpoint_ranks_quotes_first_and_marks_snippets(client, db, chapter):
+    in_quote = metaphor(chapter, "a <careless> eye", "watching")
+    in_explanation = metaphor(chapter, "billboard", "an eye over the valley")
+    unrelated = metaphor(chapter, "green light", "hope")
+    db.add_all([in_explanation, in_quote, unrelated])
+    await db.commit()
+
+    page = (await client.get("/api/metaphors/search", params={"q": "eye"})).json()
+
+    assert [item["id"] for item in page["items"]] == [in_quote.id, in_explanation.id]
+    assert page["items"][0]["snippet"] == "a &lt;careless&gt; <mark>eye</mark>"
+    assert page["next_offset"] is None
+
+
+async def test_endpoint_applies_filters_and_rejects_empty_queries(client, db, chapter):
+    db.add_all([metaphor(chapter, "eye one", selected=True), metaphor(chapter, "eye two", selected=False)])
+    await db.commit()
+
+    page = (await client.get("/api/metaphors/search", params={"q": "eye", "selected": "false"})).json()
+    assert [item["exact_quote"] for item in page["items"]] == ["eye two"]
+
+    assert (await client.get("/api/metaphors/search", params={"q": '" *'})).json() == {
+        "error": "Search query is empty",
+    }
@@ -0,0 +1,84 @@
+import io
+
+from app.services.segmenter import Segmenter, iter_chapters, label_value, roman_to_int, word_to_int
+
+PROSE = "In my younger and more vulnerable years my father gave me some advice that I have been turning over in my mind ever since."
+
+
+def book(*blocks: str) -> bytes:
+    return "\n\n".join(blocks).encode("utf-8") + b"\n"
+
+
+def chapters(raw: bytes, **kwargs) -> list[dict]:
+    return list(iter_chapters(io.BytesIO(raw), io.BytesIO(raw), Segmenter(**kwargs)))
+
+
+def test_label_values():
+    assert roman_to_int("XIV") == 14
+    assert roman_to_int("IIII") is None
+    assert word_to_int("Twenty-One") == 21
+    assert word_to_int("twenty-ten") is None
+    assert label_value("12") == 12
+    assert label_value("IX") == 9
+    assert label_value("Seven") == 7
+    assert label_value("Gatsby") is None
+
+
+def test_chapter_headings_split_text():
+    result = chapters(book("CHAPTER I", PROSE, "CHAPTER II. The Valley", PROSE, PROSE))
+    assert [(c["number"], c["title"]) for c in result] == [("I", "Chapter I"), ("II", "The Valley")]
+    assert result[0]["text"] == PROSE
+    assert result[1]["word_count"] == 2 * len(PROSE.split())
+
+
+def test_only_body_between_gutenberg_markers():
+    raw = book(
+        "CHAPTER I", "licence text " * 20,
+        "*** START OF THE PROJECT GUTENBERG EBOOK ***",
+        "CHAPTER I", PROSE,
+        "*** END OF THE PROJECT GUTENBERG EBOOK ***",
+        "CHAPTER II", PROSE,
+    )
+    result = chapters(raw)
+    assert [c["number"] for c in result] == ["I"]
+    assert result[0]["text"] == PROSE
+
+
+def test_parts_prefix_chapter_numbers():
+    raw = book("BOOK ONE", "CHAPTER 1", PROSE, "BOOK TWO", "CHAPTER 1", PROSE)
+    assert [c["number"] for c in chapters(raw)] == ["1.1", "2.1"]
+
+
+def test_standalone_numeral_needs_blank_line_after():
+    raw = book("I", PROSE, "II", PROSE).replace(b"II\n\n", b"II\n")
+    result = chapters(raw)
+    assert [c["number"] for c in result] == ["I"]
+    assert result[0]["word_count"] == 2 * len(PROSE.split()) + 1
+
+
+def test_standalone_numeral_must_move_forward():
+    # A later "I" alone on a line inside chapter II is prose, not a heading.
+    raw = book("I", PROSE, "II", PROSE, "I", PROSE)
+    result = chapters(raw)
+    assert [c["number"] for c in result] == ["I", "II"]
+    assert result[1]["word_count"] == 2 * len(PROSE.split()) + 1
+
+
+def test_short_chapter_folds_into_previous():
+    raw = book("CHAPTER I", PROSE, "CHAPTER II", "Too short.", "CHAPTER III", PROSE)
+    result = chapters(raw)
+    assert [c["number"] for c in result] == ["I", "III"]
+    assert result[0]["text"].endswith("CHAPTER II\n\nToo short.")
+    assert result[0]["word_count"] == len(PROSE.split()) + 4
+
+
+def test_table_of_contents_is_dropped():
+    raw = book("CHAPTER I", "CHAPTER II", "CHAPTER I", PROSE, "CHAPTER II", PROSE)
+    assert [c["number"] for c in chapters(raw)] == ["I", "II"]
+
+
+def test_repeated_number_is_not_a_new_chapter():
+    raw = book("CHAPTER 1", PROSE, "CHAPTER 2", PROSE, "CHAPTER 2", PROSE)
+    result = chapters(raw)
+    assert [c["number"] for c in result] == ["1", "2"]
+    assert len({c["number"] for c in result}) == len(result)